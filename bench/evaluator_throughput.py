@@ -0,0 +1,66 @@
+import sys
+import os
+import json
+import time
+import argparse
+
+# Add base directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from eval.local_runner import LocalRun, LocalExample, DEFAULT_EVALUATORS
+from src.graph.trace import TraceIndex
+
+# --- Evaluator throughput benchmark ---
+# Scores synthetic traces with every default evaluator and reports runs/s, once with the
+# index recorded during execution and once indexing each run tree from scratch.
+
+PLAN = ["Architect", "Developer", "Tester"]
+
+def synthetic_run(rounds: int, padding: int) -> LocalRun:
+    """A run with `rounds` PM -> worker cycles and `padding` filler words per message."""
+    filler = " ".join(["lorem"] * padding)
+    run = LocalRun(name="SoftwareDevTeam", inputs={}, trace_index=TraceIndex())
+    hops = [("MemoryExtractor", {"user_info": {}})]
+    for i in range(rounds):
+        worker = PLAN[i % len(PLAN)]
+        decision = json.dumps({"next_agent": worker, "instruction": filler})
+        hops.append(("ProjectManager", {"messages": [AIMessage(content=decision)]}))
+        body = f"```python\ndef add(a, b):\n    return a + b\n```\n{filler}" if worker == "Developer" else filler
+        hops.append((worker, {"messages": [AIMessage(content=f"[{worker}] {body}")]}))
+    hops.append(("ProjectManager", {"messages": [AIMessage(content=json.dumps({"next_agent": "FINISH", "instruction": "done"}))]}))
+    for node_name, update in hops:
+        run.trace_index.record(node_name, update)
+        run.child_runs.append(LocalRun(name=node_name, inputs={}, outputs=update))
+    run.outputs = {"messages": [HumanMessage(content="Write add(a, b)")] + [m for _, u in hops for m in u.get("messages", [])]}
+    return run
+
+def time_evaluators(runs, example, use_index: bool) -> float:
+    """Scores every run with every default evaluator and returns runs per second."""
+    if not use_index:
+        for run in runs:
+            run.trace_index = None
+    start = time.perf_counter()
+    for run in runs:
+        if not use_index:
+            # Fresh ids so every run is indexed from its tree instead of from the cache
+            run.id = f"{run.id}-x"
+        for evaluator in DEFAULT_EVALUATORS:
+            evaluator(run, example)
+    elapsed = time.perf_counter() - start
+    return len(runs) / elapsed if elapsed else 0.0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the trace-index evaluators.")
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=12, help="PM -> worker cycles per run.")
+    parser.add_argument("--padding", type=int, default=400, help="Filler words per message.")
+    args = parser.parse_args()
+
+    example = LocalExample(id="bench", inputs={"user_request": "Write a Python function add(a, b)."})
+    runs = [synthetic_run(args.rounds, args.padding) for _ in range(args.runs)]
+    indexed = time_evaluators(runs, example, use_index=True)
+    from_tree = time_evaluators(runs, example, use_index=False)
+    print(f"{len(DEFAULT_EVALUATORS)} evaluators, {args.runs} runs of {2 * args.rounds + 2} hops")
+    print(f"recorded index : {indexed:10.0f} runs/s")
+    print(f"indexed on read: {from_tree:10.0f} runs/s")
@@ -0,0 +1,57 @@
+import sys
+import os
+import time
+import uuid
+import statistics
+
+# Add base directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import src.llm_config as llm_config
+
+# --- Time-to-first-PM-token benchmark ---
+# Compares the serial MemoryExtractor -> ProjectManager wiring with the parallel branch.
+# The LLMs are replaced with fixed-latency fake models through llm_config.set_models.
+
+EXTRACTOR_LATENCY = float(os.getenv("BENCH_EXTRACTOR_LATENCY", "0.3"))
+PM_TOKEN_LATENCY = float(os.getenv("BENCH_PM_TOKEN_LATENCY", "0.01"))
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+
+llm_config.set_models(
+    llm=FakeListChatModel(responses=['{"next_agent": "FINISH", "instruction": "done"}'], sleep=PM_TOKEN_LATENCY),
+    # disable_streaming makes the extractor sleep once per call rather than once per character
+    utility_llm=FakeListChatModel(responses=['{"name": "Sam"}'], sleep=EXTRACTOR_LATENCY, disable_streaming=True),
+)
+
+from src.graph.builder import build_graph
+from src.graph.session import create_initial_state, DEFAULT_RUN_CONFIG
+
+def time_to_first_pm_token(app, user_input: str) -> float:
+    """Runs one session and returns seconds until the first ProjectManager token is streamed."""
+    # A fresh user every run, so the memory store never skips the extraction call
+    initial_state = create_initial_state(user_input, user_id=f"bench-{uuid.uuid4()}")
+    start = time.perf_counter()
+    first_token = None
+    for chunk, metadata in app.stream(initial_state, DEFAULT_RUN_CONFIG, stream_mode="messages"):
+        if first_token is None and metadata.get("langgraph_node") == "ProjectManager" and chunk.content:
+            first_token = time.perf_counter() - start
+    return first_token
+
+def run_benchmark():
+    """Measures median time-to-first-PM-token for serial vs parallel extraction."""
+    # A message with first-person cues, so the extractor really calls the LLM
+    user_input = "My name is Sam and I prefer type hints. Write an add(a, b) function."
+    results = {}
+    for label, parallel in (("serial", False), ("parallel", True)):
+        app = build_graph(parallel_extraction=parallel)
+        samples = [time_to_first_pm_token(app, user_input) for _ in range(RUNS)]
+        results[label] = statistics.median(samples)
+    return results
+
+if __name__ == "__main__":
+    results = run_benchmark()
+    print("\n--- Time to first ProjectManager token (median) ---")
+    for label, seconds in results.items():
+        print(f"{label:>8}: {seconds * 1000:.1f} ms")
+    print(f"   saved: {(results['serial'] - results['parallel']) * 1000:.1f} ms (extractor latency {EXTRACTOR_LATENCY * 1000:.0f} ms)")
@@ -0,0 +1,243 @@
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Add base directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Benchmarks run against the offline scripted backend unless told otherwise
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "50")
+os.environ.setdefault("FAKE_LLM_LATENCY_JITTER_MS", "10")
+os.environ.setdefault("FAKE_LLM_TOKEN_LATENCY_MS", "1")
+os.environ.setdefault("FAKE_LLM_TOKENS", "120")
+os.environ.setdefault("FAKE_LLM_TOKENS_JITTER", "30")
+os.environ.setdefault("FAKE_LLM_SEED", "7")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from src import config
+from src.instrumentation import metrics
+from src.graph.builder import compiled_app
+from src.graph.session import run_session, create_initial_state, DEFAULT_RUN_CONFIG
+
+# --- End-to-end graph benchmark ---
+# Runs N sessions through compiled_app at several concurrency levels and reports per-node
+# latency and time-to-first-token, LLM time vs graph overhead, messages/tokens per session
+# and throughput as JSON. Sessions stream tokens like the interactive CLI unless --no-stream.
+
+DEFAULT_REQUEST = "Please design and implement a simple Python function that adds two numbers. Then test it."
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers (0.0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize(values) -> dict:
+    """Mean/p50/p95/p99/max summary of a list of numbers."""
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+def union_duration(intervals) -> float:
+    """Total time covered by a set of (start, end) intervals, counting overlaps once."""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+class SessionProfiler(BaseCallbackHandler):
+    """Collects node timings, time-to-first-token, LLM call intervals and token usage for one session."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.node_starts = {}
+        self.node_durations = defaultdict(list)
+        self.step_starts = {}
+        self.llm_nodes = {}
+        self.node_ttft = defaultdict(list)
+        self.llm_starts = {}
+        self.llm_intervals = []
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        # Node runs are the chain runs named after their graph node
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            start = time.perf_counter()
+            with self.lock:
+                self.node_starts[run_id] = (node, start)
+                self.step_starts[(node, metadata.get("langgraph_step"))] = start
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self.lock:
+            started = self.node_starts.pop(run_id, None)
+            if started:
+                node, start = started
+                self.node_durations[node].append(time.perf_counter() - start)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        with self.lock:
+            self.llm_starts[run_id] = time.perf_counter()
+            # Remembered until the call's first token arrives
+            self.llm_nodes[run_id] = (metadata.get("langgraph_node"), metadata.get("langgraph_step"))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        now = time.perf_counter()
+        with self.lock:
+            key = self.llm_nodes.pop(run_id, None)
+            node_start = self.step_starts.get(key) if key else None
+            if node_start is not None:
+                # Time from the node starting to its first streamed token
+                self.node_ttft[key[0]].append(now - node_start)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        end = time.perf_counter()
+        with self.lock:
+            self.llm_nodes.pop(run_id, None)
+            start = self.llm_starts.pop(run_id, None)
+            if start is not None:
+                self.llm_intervals.append((start, end))
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    self.input_tokens += usage.get("input_tokens", 0)
+                    self.output_tokens += usage.get("output_tokens", 0)
+
+def run_profiled_session(user_input: str, stream: bool = True) -> dict:
+    """Runs one session and returns its timing, message and token measurements."""
+    profiler = SessionProfiler()
+    run_config = {**DEFAULT_RUN_CONFIG, "callbacks": [profiler]}
+    on_token = (lambda node, delta: None) if stream else None
+    start = time.perf_counter()
+    final_state = run_session(create_initial_state(user_input), run_config, app=compiled_app, on_token=on_token)
+    wall = time.perf_counter() - start
+    llm_time = union_duration(profiler.llm_intervals)
+    return {
+        "wall": wall,
+        "llm_time": llm_time,
+        "graph_overhead": max(0.0, wall - llm_time),
+        "llm_calls": len(profiler.llm_intervals),
+        "messages": len(final_state.get("messages", [])) if final_state else 0,
+        "input_tokens": profiler.input_tokens,
+        "output_tokens": profiler.output_tokens,
+        "node_durations": dict(profiler.node_durations),
+        "node_ttft": dict(profiler.node_ttft),
+    }
+
+def run_level(sessions: int, concurrency: int, user_input: str, stream: bool = True) -> dict:
+    """Runs `sessions` sessions with `concurrency` worker threads and aggregates the results."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: run_profiled_session(user_input, stream), range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    node_latency = defaultdict(list)
+    node_ttft = defaultdict(list)
+    for result in results:
+        for node, durations in result["node_durations"].items():
+            node_latency[node].extend(durations)
+        for node, ttfts in result["node_ttft"].items():
+            node_ttft[node].extend(ttfts)
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "throughput_sessions_per_s": sessions / elapsed if elapsed else 0.0,
+        "session_latency_s": summarize([r["wall"] for r in results]),
+        "llm_time_s": summarize([r["llm_time"] for r in results]),
+        "graph_overhead_s": summarize([r["graph_overhead"] for r in results]),
+        "llm_calls_per_session": summarize([r["llm_calls"] for r in results]),
+        "messages_per_session": summarize([r["messages"] for r in results]),
+        "input_tokens_per_session": summarize([r["input_tokens"] for r in results]),
+        "output_tokens_per_session": summarize([r["output_tokens"] for r in results]),
+        "node_latency_s": {node: summarize(values) for node, values in sorted(node_latency.items())},
+        "node_ttft_s": {node: summarize(values) for node, values in sorted(node_ttft.items())},
+    }
+
+def git_commit() -> str:
+    """Returns the current git commit hash, so results can be compared across commits."""
+    try:
+        repo_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=repo_dir, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_benchmark(sessions: int, concurrency_levels, user_input: str = DEFAULT_REQUEST, stream: bool = True) -> dict:
+    """Runs every concurrency level (after one warm-up session) and returns the report."""
+    run_profiled_session(user_input, stream) # Warm-up
+    metrics.reset()
+    levels = [run_level(sessions, concurrency, user_input, stream) for concurrency in concurrency_levels]
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "backend": {
+            "name": config.LLM_BACKEND,
+            "latency_ms": config.FAKE_LLM_LATENCY_MS,
+            "latency_jitter_ms": config.FAKE_LLM_LATENCY_JITTER_MS,
+            "token_latency_ms": config.FAKE_LLM_TOKEN_LATENCY_MS,
+            "tokens": config.FAKE_LLM_TOKENS,
+            "tokens_jitter": config.FAKE_LLM_TOKENS_JITTER,
+        },
+        "request": user_input,
+        "stream": stream,
+        "levels": levels,
+        "metrics": metrics.to_json(), # Instrumentation counters/histograms over all levels
+    }
+
+def print_report(report: dict):
+    """Prints a short human-readable view of the report."""
+    print(f"\n--- Graph benchmark ({report['backend']['name']} backend, commit {report['commit'][:8]}) ---")
+    for level in report["levels"]:
+        print(
+            f"concurrency {level['concurrency']:>3}: "
+            f"{level['throughput_sessions_per_s']:.2f} sessions/s, "
+            f"p50 {level['session_latency_s']['p50'] * 1000:.0f} ms, "
+            f"p99 {level['session_latency_s']['p99'] * 1000:.0f} ms, "
+            f"overhead p50 {level['graph_overhead_s']['p50'] * 1000:.1f} ms, "
+            f"{level['messages_per_session']['mean']:.1f} msgs, "
+            f"{level['input_tokens_per_session']['mean'] + level['output_tokens_per_session']['mean']:.0f} tokens/session"
+        )
+        for node, stats in level["node_latency_s"].items():
+            ttft = level["node_ttft_s"].get(node)
+            ttft_text = f"  ttft p50 {ttft['p50'] * 1000:7.1f} ms  p95 {ttft['p95'] * 1000:7.1f} ms" if ttft else ""
+            print(f"    {node:<16} p50 {stats['p50'] * 1000:7.1f} ms  p95 {stats['p95'] * 1000:7.1f} ms{ttft_text}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the agent graph.")
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions per concurrency level.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels.")
+    parser.add_argument("--request", default=DEFAULT_REQUEST, help="User request sent in every session.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON report.")
+    parser.add_argument("--no-stream", action="store_true", help="Run sessions without token streaming (no TTFT).")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.sessions, [int(c) for c in args.concurrency.split(",")], args.request, not args.no_stream)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nReport written to {args.output}")
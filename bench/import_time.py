@@ -0,0 +1,39 @@
+import sys
+import os
+import re
+import json
+import subprocess
+
+# --- Import-time benchmark ---
+# Imports each module in a fresh interpreter with `python -X importtime` and reports the
+# cumulative import time, so startup cost can be compared across commits.
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODULES = ["src.llm_config", "src.graph.builder", "src.graph.session", "eval.runner"]
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)")
+
+def import_time_us(module: str) -> int:
+    """Returns the cumulative import time of module in microseconds (one fresh interpreter)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(2) == module:
+            return int(match.group(1))
+    raise RuntimeError(f"No importtime entry for {module}")
+
+if __name__ == "__main__":
+    report = {}
+    for module in MODULES:
+        samples = sorted(import_time_us(module) for _ in range(RUNS))
+        report[module] = {"median_ms": samples[len(samples) // 2] / 1000, "min_ms": samples[0] / 1000}
+        print(f"{module:<20} median {report[module]['median_ms']:8.1f} ms   min {report[module]['min_ms']:8.1f} ms")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,162 @@
+import sys
+import os
+import re
+import json
+import time
+import random
+import argparse
+
+# Add base directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.json_extract import extract_json, JSONStreamParser, matches_schema
+from src.graph.nodes import EXTRACTION_SCHEMA
+from src.graph.routing import PM_DECISION_SCHEMA
+from src.sandbox import TEST_RESULTS_SCHEMA
+
+# --- Structured output parsing fuzz benchmark ---
+# Generates extractor outputs, PM decisions and sandbox test results, wraps them the way
+# models (and killed processes) do - code fences, prose before/after, stray braces,
+# truncation - and reports per-mutation parse success and throughput of extract_json
+# against the fence-slicing/regex parsing it replaced.
+
+WORDS = "the user wants a small tested function that adds numbers and handles edge cases".split()
+
+def random_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def extraction_value(rng):
+    value = {"name": rng.choice(["Ada", "Grace", "Linus"]), "location": random_text(rng, 2)}
+    if rng.random() < 0.5:
+        value["preferences"] = [random_text(rng, 1) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.3:
+        value["explicit_requests"] = random_text(rng, 6) + ' with "quotes" and {braces}'
+    return value
+
+def decision_value(rng):
+    return {"next_agent": rng.choice(["Architect", "Developer", "Tester", "FINISH"]), "instruction": random_text(rng, 20)}
+
+def results_value(rng):
+    return [{"name": f"test_{i}", "status": rng.choice(["passed", "failed"]), "duration_s": rng.random(), "error": None}
+            for i in range(rng.randint(1, 6))]
+
+KINDS = {
+    "extraction": (extraction_value, EXTRACTION_SCHEMA),
+    "pm_decision": (decision_value, PM_DECISION_SCHEMA),
+    "test_results": (results_value, TEST_RESULTS_SCHEMA),
+}
+
+# name -> (text from the serialized value, whether the full value is still recoverable)
+MUTATIONS = {
+    "plain": (lambda s, rng: s, True),
+    "pretty": (lambda s, rng: json.dumps(json.loads(s), indent=2), True),
+    "json_fence": (lambda s, rng: f"```json\n{s}\n```", True),
+    "bare_fence": (lambda s, rng: f"```\n{s}\n```", True),
+    "fence_with_prose": (lambda s, rng: f"Here is the result:\n```json\n{s}\n```\nLet me know if you need more.", True),
+    "leading_prose": (lambda s, rng: f"Sure! {random_text(rng, 8)}: {s}", True),
+    "trailing_prose": (lambda s, rng: f"{s}\nThat covers {random_text(rng, 8)}.", True),
+    "prose_with_braces": (lambda s, rng: f"Use {{name}} or [x] here. {s} Then {{done}}.", True),
+    "two_values": (lambda s, rng: f"{s}\nor alternatively\n{s}", True),
+    "truncated": (lambda s, rng: s[:rng.randint(len(s) // 2, len(s) - 1)], False),
+    "fenced_truncated": (lambda s, rng: "```json\n" + s[:rng.randint(len(s) // 2, len(s) - 1)], False),
+}
+
+def legacy_parse(text: str, kind: str):
+    """The parsing the project used before extract_json, per kind of output."""
+    try:
+        if kind == "pm_decision":
+            text = text.strip()
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                match = re.search(r"\{.*\}", text, re.DOTALL)
+                return json.loads(match.group(0)) if match else None
+        if kind == "extraction":
+            if text.startswith("```json"):
+                text = text[7:-3].strip()
+            elif text.startswith("```"):
+                text = text[3:-3].strip()
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+def is_success(parsed, original, schema, complete: bool) -> bool:
+    """Complete inputs must round-trip exactly; truncated ones must give a schema-valid prefix."""
+    if parsed is None:
+        return False
+    if complete:
+        return parsed == original
+    return matches_schema(parsed, schema)
+
+def streamed_parse(text: str, schema: dict, chunk_chars: int):
+    parser = JSONStreamParser(schema)
+    for i in range(0, len(text), chunk_chars):
+        if parser.feed(text[i:i + chunk_chars]) is not None:
+            return parser.value
+    return parser.close()
+
+def build_corpus(samples: int, seed: int):
+    rng = random.Random(seed)
+    corpus = []
+    for kind, (make_value, schema) in KINDS.items():
+        for mutation, (mutate, complete) in MUTATIONS.items():
+            for _ in range(samples):
+                value = make_value(rng)
+                corpus.append((kind, mutation, complete, value, mutate(json.dumps(value), rng)))
+    return corpus
+
+def run(corpus, parse) -> dict:
+    """Success counts per (kind, mutation) and overall throughput of one parser."""
+    success = {}
+    start = time.perf_counter()
+    outputs = [parse(text, kind) for kind, _, _, _, text in corpus]
+    elapsed = time.perf_counter() - start
+    for (kind, mutation, complete, value, _), parsed in zip(corpus, outputs):
+        ok, total = success.get((kind, mutation), (0, 0))
+        success[(kind, mutation)] = (ok + is_success(parsed, value, KINDS[kind][1], complete), total + 1)
+    chars = sum(len(text) for *_, text in corpus)
+    return {"success": success, "parses_per_s": len(corpus) / elapsed, "mb_per_s": chars / elapsed / 1e6}
+
+def success_rate(result: dict, kind: str = None) -> float:
+    counts = [v for (k, _), v in result["success"].items() if kind in (None, k)]
+    return sum(ok for ok, _ in counts) / sum(total for _, total in counts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuzz benchmark of structured LLM output parsing.")
+    parser.add_argument("--samples", type=int, default=200, help="Samples per kind and mutation.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--chunk-chars", type=int, default=8, help="Chunk size of the streamed run.")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.samples, args.seed)
+    results = {
+        "legacy": run(corpus, legacy_parse),
+        "extract_json": run(corpus, lambda text, kind: extract_json(text, KINDS[kind][1])),
+        "streamed": run(corpus, lambda text, kind: streamed_parse(text, KINDS[kind][1], args.chunk_chars)),
+    }
+
+    print(f"{len(corpus)} samples ({args.samples} per kind and mutation)\n")
+    print(f"{'mutation':<18}" + "".join(f"{name:>14}" for name in results))
+    for mutation in MUTATIONS:
+        rates = []
+        for result in results.values():
+            counts = [v for (_, m), v in result["success"].items() if m == mutation]
+            rates.append(sum(ok for ok, _ in counts) / sum(total for _, total in counts))
+        print(f"{mutation:<18}" + "".join(f"{rate:>13.1%} " for rate in rates))
+    print(f"{'overall':<18}" + "".join(f"{success_rate(r):>13.1%} " for r in results.values()))
+    print(f"{'parses/s':<18}" + "".join(f"{r['parses_per_s']:>14.0f}" for r in results.values()))
+    print(f"{'MB/s':<18}" + "".join(f"{r['mb_per_s']:>14.1f}" for r in results.values()))
+
+    if args.output:
+        report = {
+            name: {
+                "success_rate": success_rate(result),
+                "success_rate_by_kind": {kind: success_rate(result, kind) for kind in KINDS},
+                "parses_per_s": result["parses_per_s"],
+                "mb_per_s": result["mb_per_s"],
+            }
+            for name, result in results.items()
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
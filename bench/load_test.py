@@ -0,0 +1,139 @@
+import sys
+import os
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Add base directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Load tests run against the offline scripted backend unless told otherwise
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "50")
+os.environ.setdefault("FAKE_LLM_LATENCY_JITTER_MS", "10")
+os.environ.setdefault("FAKE_LLM_TOKEN_LATENCY_MS", "1")
+os.environ.setdefault("FAKE_LLM_TOKENS", "120")
+os.environ.setdefault("FAKE_LLM_TOKENS_JITTER", "30")
+os.environ.setdefault("FAKE_LLM_SEED", "7")
+
+from bench.harness import summarize
+from src.config import SERVICE_BATCH_WINDOW_MS
+
+# --- HTTP service load test ---
+# Starts the service in-process on a free port (or targets --url), sends sessions at a
+# fixed concurrency with a share of follow-up turns on the same thread ids, and reports
+# p50/p99 latency, sessions/s, status codes and extraction batching as JSON.
+
+NAMES = ("Ada", "Grace", "Linus", "Guido", "Barbara", "Ken", "Margaret", "Dennis")
+
+def request_text(i: int) -> str:
+    # First-person cues, so every session makes a memory extraction call
+    return f"I'm {NAMES[i % len(NAMES)]} and I prefer Python. Please write a function that adds two numbers, then test it."
+
+def post_session(url: str, message: str, thread_id: str = None, user_id: str = None, timeout: float = 120.0):
+    """POSTs one session turn and returns (status, body, seconds)."""
+    data = json.dumps({"message": message, "thread_id": thread_id, "user_id": user_id}).encode()
+    request = urllib.request.Request(f"{url}/sessions", data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read()), time.perf_counter() - start
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}"), time.perf_counter() - start
+
+def fetch_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+def fetch_metric(url: str, name: str) -> dict:
+    """Series of one metric from the Prometheus text at url, keyed by label string."""
+    with urllib.request.urlopen(url, timeout=10) as response:
+        text = response.read().decode()
+    series = {}
+    for line in text.splitlines():
+        if line.startswith(name):
+            key, _, value = line.rpartition(" ")
+            series[key[len(name):].lstrip("_")] = float(value)
+    return series
+
+def run_load(url: str, sessions: int, concurrency: int, follow_up_every: int) -> dict:
+    """Sends `sessions` first turns (plus a follow-up for every follow_up_every-th one)."""
+    latencies, follow_up_latencies, statuses = [], [], {}
+    lock = threading.Lock()
+
+    def one_session(i: int):
+        # Users recur, so the memory store's fast path skips facts it already extracted
+        user_id = NAMES[i % len(NAMES)].lower()
+        status, body, seconds = post_session(url, request_text(i), user_id=user_id)
+        results = [(status, seconds, False)]
+        if status == 200 and follow_up_every and i % follow_up_every == 0:
+            status, body, seconds = post_session(url, "Now also handle subtraction.", body["thread_id"], user_id)
+            results.append((status, seconds, True))
+        with lock:
+            for status, seconds, follow_up in results:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    (follow_up_latencies if follow_up else latencies).append(seconds)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_session, range(sessions)))
+    elapsed = time.perf_counter() - start
+    completed = len(latencies) + len(follow_up_latencies)
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "sessions_per_s": completed / elapsed if elapsed else 0.0,
+        "status_codes": statuses,
+        "latency_s": summarize(latencies),
+        "follow_up_latency_s": summarize(follow_up_latencies),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the HTTP service.")
+    parser.add_argument("--url", default=None, help="Target a running service instead of starting one.")
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels.")
+    parser.add_argument("--follow-up-every", type=int, default=4, help="Send a follow-up turn for every Nth session (0: none).")
+    parser.add_argument("--max-sessions", type=int, default=32, help="Session slots of the in-process service.")
+    parser.add_argument("--batch-window-ms", type=float, default=SERVICE_BATCH_WINDOW_MS,
+                        help="Extraction batching window of the in-process service (0 disables).")
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        from src.service import AgentService, create_server
+        server = create_server(AgentService(max_sessions=args.max_sessions), "127.0.0.1", 0, args.batch_window_ms)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Target {url}: {fetch_json(url + '/health')}")
+
+    levels = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        result = run_load(url, args.sessions, concurrency, args.follow_up_every)
+        levels.append(result)
+        print(f"concurrency {concurrency:>3}: {result['sessions_per_s']:6.1f} sessions/s  "
+              f"p50 {result['latency_s']['p50'] * 1000:7.1f} ms  p99 {result['latency_s']['p99'] * 1000:7.1f} ms  "
+              f"statuses {result['status_codes']}")
+
+    report = {
+        "url": url,
+        "batch_window_ms": args.batch_window_ms if server else None,
+        "levels": levels,
+        "extraction_batching": fetch_metric(url + "/metrics", "extraction_batching"),
+        "user_memory": fetch_metric(url + "/metrics", "user_memory"),
+    }
+    print(f"extraction batching: {report['extraction_batching']}")
+    print(f"user memory: {report['user_memory']}")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+    if server:
+        server.shutdown()
@@ -0,0 +1,76 @@
+import sys
+import os
+import json
+import argparse
+import subprocess
+import tempfile
+
+# --- Speculative dispatch benchmark ---
+# Runs the end-to-end harness (bench/harness.py, offline backend) with speculative dispatch
+# off and on, without and with a share of PM decisions deviating from the announced plan,
+# and compares session latency and total tokens, with the time saved and the tokens
+# wasted by speculative runs. Each configuration runs in its own interpreter, since the
+# mode is read from the environment at import time.
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def run_harness(sessions: int, concurrency: int, env: dict) -> dict:
+    """Runs one harness level in a fresh interpreter and returns its report."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "report.json")
+        subprocess.run(
+            [sys.executable, "-m", "bench.harness", "--sessions", str(sessions), "--concurrency", str(concurrency),
+             "--output", output, "--no-stream"],
+            cwd=REPO_DIR, env={**os.environ, **env}, check=True, stdout=subprocess.DEVNULL,
+        )
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+def summarize_mode(report: dict, sessions: int) -> dict:
+    level = report["levels"][0]
+    stats = report["metrics"]["gauges"].get("speculation", {})
+    # Speculative calls run outside the session callbacks; their counters include the warm-up session
+    runs = sessions + 1
+    traced_tokens = level["input_tokens_per_session"]["mean"] + level["output_tokens_per_session"]["mean"]
+    speculative_tokens = (stats.get("kept_tokens", 0) + stats.get("wasted_tokens", 0)) / runs
+    return {
+        "session_p50_s": level["session_latency_s"]["p50"],
+        "session_mean_s": level["session_latency_s"]["mean"],
+        "tokens_per_session": traced_tokens + speculative_tokens,
+        "saved_s_per_session": stats.get("saved_seconds", 0.0) / runs,
+        "wasted_s_per_session": stats.get("wasted_seconds", 0.0) / runs,
+        "kept_tokens_per_session": stats.get("kept_tokens", 0) / runs,
+        "wasted_tokens_per_session": stats.get("wasted_tokens", 0) / runs,
+        "keep_rate": stats.get("keep_rate", 0.0),
+        "speculation": stats,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speculative dispatch on the offline benchmark.")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--miss-rate", type=float, default=0.3, help="Share of PM decisions deviating from the plan.")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    # Each miss rate runs with the mode off and on, so the revisions' own cost is in both
+    results = {}
+    for miss_rate in sorted({0.0, args.miss_rate}):
+        for mode in ("off", "on"):
+            env = {"SPECULATIVE_DISPATCH": mode, "FAKE_LLM_PLAN_MISS_RATE": str(miss_rate)}
+            results[f"{mode}, {miss_rate:.0%} plan misses"] = summarize_mode(run_harness(args.sessions, args.concurrency, env), args.sessions)
+
+    print(f"{args.sessions} sessions at concurrency {args.concurrency} (offline backend)\n")
+    print(f"{'mode':<24}{'p50 s':>8}{'mean s':>8}{'vs off':>9}{'tokens':>9}{'vs off':>9}"
+          f"{'saved s':>9}{'wasted s':>10}{'wasted tok':>12}{'keep':>7}")
+    for name, r in results.items():
+        baseline = results["off" + name[name.index(","):]]
+        print(f"{name:<24}{r['session_p50_s']:>8.3f}{r['session_mean_s']:>8.3f}"
+              f"{r['session_mean_s'] / baseline['session_mean_s'] - 1:>+9.1%}"
+              f"{r['tokens_per_session']:>9.0f}{r['tokens_per_session'] / baseline['tokens_per_session'] - 1:>+9.1%}"
+              f"{r['saved_s_per_session']:>9.3f}{r['wasted_s_per_session']:>10.3f}"
+              f"{r['wasted_tokens_per_session']:>12.0f}{r['keep_rate']:>7.0%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -1,27 +1,45 @@
 from langsmith.schemas import Run, Example
 from langsmith.evaluation import EvaluationResult
 from langchain_core.messages import AIMessage
+from langgraph.graph import END
 import re
 
+from src.graph.session import final_reply
+from src.graph.trace import get_trace_index, AGENT_NODES
+
 # --- Custom Evaluator Definitions ---
+# Evaluators that inspect the trace read it through get_trace_index: runs from the local
+# engine carry the index recorded during execution, other run trees are indexed once.
+
+# Request wording that implies the Developer should produce code
+REQUIRES_CODE_PATTERN = re.compile(r"code|function|implement|write|create|rest api|flask|python|javascript")
+
+# Agent hops a run may take before check_hop_count starts deducting (override per example
+# with outputs["max_hops"])
+DEFAULT_MAX_HOPS = 8
 
 def check_task_completion(run: Run, example: Example | None = None) -> EvaluationResult:
     """Checks if the final message indicates task completion."""
     # Check if outputs exist and have the expected structure
     if not run.outputs or 'messages' not in run.outputs or not isinstance(run.outputs['messages'], list) or not run.outputs['messages']:
         return EvaluationResult(key="task_completion", score=0, comment="Output format invalid or missing final message.")
-    
+
+    # Runs stopped by an error or the loop/budget guard did not complete the task
+    if run.outputs.get('error') or run.outputs.get('termination'):
+        return EvaluationResult(key="task_completion", score=0, comment="Run ended early.")
+
     # Get the last message, ensuring it's an AIMessage
     final_message = run.outputs['messages'][-1]
     if isinstance(final_message, AIMessage):
-        final_content = final_message.content.lower()
+        # The rendered reply, not a closing PM decision's JSON (whose "FINISH" would always match)
+        final_content = (final_reply(run.outputs) or "").lower()
         # Simple keyword check for completion indicators
         completion_keywords = ["finish", "complete", "done", "tested successfully", "implemented", "task is complete"]
         if any(keyword in final_content for keyword in completion_keywords):
             return EvaluationResult(key="task_completion", score=1, comment="Final message indicates completion.")
         else:
             return EvaluationResult(key="task_completion", score=0, comment="Final message did not clearly indicate completion.")
-            
+
     # If the last message isn't from the AI, task is likely not complete from agent's perspective
     return EvaluationResult(key="task_completion", score=0, comment="Final message not from AI agent.")
 
@@ -29,51 +47,62 @@ def check_code_generation(run: Run, example: Example | None = None) -> Evaluatio
     """Checks if the Developer node produced a code block if the request likely required it."""
     if not example or 'user_request' not in example.inputs:
         return EvaluationResult(key="code_generation_checked", score=None, comment="Missing example or user_request in example inputs.")
-        
+
     # Basic check: Does the input request mention code/function/implement/write?
-    input_request = example.inputs['user_request'].lower()
-    requires_code_keywords = ["code", "function", "implement", "write", "create", "rest api", "flask", "python", "javascript"]
-    requires_code = any(kw in input_request for kw in requires_code_keywords)
-    
+    requires_code = REQUIRES_CODE_PATTERN.search(example.inputs['user_request'].lower()) is not None
+
     # If code is not expected, skip this evaluation for this run
     if not requires_code:
         return EvaluationResult(key="code_generation_checked", score=None, comment="Code generation not expected for this input.")
 
-    # Check run trace for Developer node output containing a markdown code block
-    developer_produced_code = False
-    # Need to recursively search child runs as the structure might be nested
-    queue = list(run.child_runs) if run.child_runs else []
-    visited_run_ids = set()
-
-    while queue:
-        child_run = queue.pop(0)
-        if not child_run or child_run.id in visited_run_ids:
-            continue
-        visited_run_ids.add(child_run.id)
-
-        # Check if this run is the Developer node
-        # Comparing names, ensure node names in the graph builder match this string
-        if child_run.name == "Developer":
-            if child_run.outputs and isinstance(child_run.outputs, dict) and 'messages' in child_run.outputs:
-                dev_messages = child_run.outputs['messages']
-                # Check if messages list exists and is not empty
-                if dev_messages and isinstance(dev_messages, list) and dev_messages:
-                     # Check the first message (usually the AI response) in the list
-                    if isinstance(dev_messages[0], AIMessage):
-                        # Simple regex for markdown code block (```python ... ``` or ``` ... ```)
-                        if re.search(r"```(python)?\n.*?\n```", dev_messages[0].content, re.DOTALL | re.IGNORECASE):
-                            developer_produced_code = True
-                            break # Found code, no need to search further
-
-        # Add grandchildren to the queue if they exist
-        if child_run.child_runs:
-            queue.extend(child_run.child_runs)
-                        
-    score = 1 if developer_produced_code else 0
+    # Code blocks are extracted per node when the trace is indexed
+    score = 1 if get_trace_index(run).has_code("Developer") else 0
     comment = "Developer produced code as expected." if score == 1 else "Developer did not produce valid code block when expected."
     return EvaluationResult(key="code_generation_checked", score=score, comment=comment)
 
+def check_code_block_presence(run: Run, example: Example | None = None) -> EvaluationResult:
+    """Checks that every Developer turn in the run contained at least one code block."""
+    index = get_trace_index(run)
+    developer_turns = len(index.outputs.get("Developer", ()))
+    if not developer_turns:
+        return EvaluationResult(key="code_block_presence", score=None, comment="Developer did not run.")
+    with_code = index.code_turns.get("Developer", 0)
+    return EvaluationResult(key="code_block_presence", score=with_code / developer_turns,
+                            comment=f"{with_code} of {developer_turns} Developer turns contained code.")
+
+def check_routing_correctness(run: Run, example: Example | None = None) -> EvaluationResult:
+    """Checks that each PM decision was followed by the node it chose (or by the end of the run).
+
+    If the example's outputs list an "expected_route" (worker names in order), the
+    run's worker sequence must match it instead.
+    """
+    index = get_trace_index(run)
+    workers = [hop for hop in index.agent_hops if hop != "ProjectManager"]
+    expected_route = (example.outputs or {}).get("expected_route") if example else None
+    if expected_route is not None:
+        score = 1 if workers == list(expected_route) else 0
+        return EvaluationResult(key="routing_correctness", score=score,
+                                comment=f"Route {' -> '.join(workers) or '(none)'}, expected {' -> '.join(expected_route) or '(none)'}.")
+
+    if not index.pm_routes:
+        return EvaluationResult(key="routing_correctness", score=None, comment="No PM decisions recorded.")
+    hops = index.hops
+    honored = 0
+    for hop_index, route in index.pm_routes:
+        next_agent = next((hop for hop in hops[hop_index + 1:] if hop in AGENT_NODES), END)
+        if next_agent == route:
+            honored += 1
+    total = len(index.pm_routes)
+    return EvaluationResult(key="routing_correctness", score=honored / total,
+                            comment=f"{honored} of {total} PM decisions were followed.")
+
+def check_hop_count(run: Run, example: Example | None = None) -> EvaluationResult:
+    """Scores 1 for runs within the hop budget, decreasing proportionally beyond it."""
+    max_hops = ((example.outputs or {}).get("max_hops") if example else None) or DEFAULT_MAX_HOPS
+    hops = len(get_trace_index(run).agent_hops)
+    score = 1.0 if hops <= max_hops else max_hops / hops
+    return EvaluationResult(key="hop_count", score=score, comment=f"{hops} agent hops (budget {max_hops}).")
+
 # Potential future evaluators:
-# - Correct Routing Check (needs analysis of PM output and next actual node)
 # - Code Correctness (requires execution or LLM-as-judge)
-# - Test Effectiveness (requires analysis of Test node output vs. Dev code) 
\ No newline at end of file
+# - Test Effectiveness (requires analysis of Test node output vs. Dev code)
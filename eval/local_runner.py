@@ -0,0 +1,296 @@
+import contextlib
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Import the single-pass session API shared with run_app.py
+from src.graph.session import create_initial_state, run_session, final_reply, DEFAULT_RUN_CONFIG
+# Import evaluators
+from .evaluators import (
+    check_task_completion, check_code_generation, check_code_block_presence,
+    check_routing_correctness, check_hop_count,
+)
+from src.graph.trace import TraceIndex
+
+# Import LLM config details for metadata (model names only, no clients are created)
+from src.llm_config import MODEL_NAMES
+from src.llm_cache import bypass_cache
+
+# --- Local Evaluation Engine ---
+# Runs a JSONL dataset through the graph on a thread pool, scores the locally captured
+# traces with the evaluators in evaluators.py and writes the results to disk. Nothing here
+# needs a LangSmith account; LangSmithSink can upload the results afterwards.
+
+DEFAULT_DATASET_PATH = os.path.join(os.path.dirname(__file__), "datasets", "default.jsonl")
+DEFAULT_EVALUATORS = [
+    check_task_completion, check_code_generation, check_code_block_presence,
+    check_routing_correctness, check_hop_count,
+]
+
+@dataclass
+class LocalExample:
+    """Dataset example with the attributes the evaluators read from langsmith's Example."""
+    id: str
+    inputs: dict
+    outputs: Optional[dict] = None
+    metadata: dict = field(default_factory=dict)
+
+@dataclass
+class LocalRun:
+    """Locally captured run with the attributes the evaluators read from langsmith's Run.
+
+    The root run holds the final state as outputs, and trace_index the node hops,
+    recorded while the run executes. child_runs stays empty for runs made here; it is
+    only filled for run trees indexed from scratch (see TraceIndex.from_run).
+    """
+    name: str
+    inputs: dict
+    outputs: Optional[dict] = None
+    child_runs: List["LocalRun"] = field(default_factory=list)
+    error: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    trace_index: Optional[TraceIndex] = None
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+def load_dataset(path: str = DEFAULT_DATASET_PATH) -> List[LocalExample]:
+    """Loads examples from a JSONL file.
+
+    Each line is either {"id", "inputs", "outputs"?, "metadata"?} or a bare
+    inputs object such as {"user_request": "..."}.
+    """
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "inputs" not in record:
+                record = {"inputs": record}
+            examples.append(LocalExample(
+                id=str(record.get("id") or f"{os.path.basename(path)}:{line_number}"),
+                inputs=record["inputs"],
+                outputs=record.get("outputs"),
+                metadata=record.get("metadata") or {},
+            ))
+    return examples
+
+class RateLimiter:
+    """Spaces out example starts to at most `rate` per second across all worker threads."""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class UsageCallback(BaseCallbackHandler):
+    """Counts LLM calls and token usage for one run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        with self.lock:
+            self.llm_calls += 1
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    self.input_tokens += usage.get("input_tokens", 0)
+                    self.output_tokens += usage.get("output_tokens", 0)
+
+def summarize(values) -> dict:
+    """Mean/p50/p95/max summary of a list of numbers."""
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(values)
+    def nearest_rank(pct):
+        return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+    return {"count": len(ordered), "mean": statistics.fmean(ordered), "p50": nearest_rank(50),
+            "p95": nearest_rank(95), "max": ordered[-1]}
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class LocalEvaluationRunner:
+    """Runs a local dataset concurrently and scores every run with the given evaluators.
+
+    max_concurrency sets the worker pool size; requests_per_second (optional)
+    caps how fast new examples are started, to stay under provider rate limits.
+    """
+
+    def __init__(self, dataset_path: str = DEFAULT_DATASET_PATH, evaluators: Optional[List[Callable]] = None,
+                 max_concurrency: int = 4, requests_per_second: Optional[float] = None,
+                 output_dir: str = "eval_results", experiment_prefix: str = "sw-dev-agent-eval",
+                 sinks: Optional[list] = None, app=None, use_cache: bool = True):
+        self.dataset_path = dataset_path
+        self.examples = load_dataset(dataset_path)
+        self.evaluators = evaluators or DEFAULT_EVALUATORS
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.experiment_name = f"{experiment_prefix}-{time.strftime('%Y%m%d-%H%M%S')}"
+        self.sinks = [JsonlSink(output_dir)] + list(sinks or [])
+        self.app = app
+        self.use_cache = use_cache
+
+    def _run_example(self, example: LocalExample) -> tuple:
+        """Runs one example through the graph and returns its captured trace and usage."""
+        if 'user_request' not in example.inputs:
+            raise ValueError("Input dictionary must contain 'user_request' key.")
+        self.rate_limiter.wait()
+        usage = UsageCallback()
+        run = LocalRun(name="SoftwareDevTeam", inputs=example.inputs, start_time=_now(), trace_index=TraceIndex())
+
+        start = time.perf_counter()
+        try:
+            # Without the cache every example samples the models afresh
+            with (contextlib.nullcontext() if self.use_cache else bypass_cache()):
+                run.outputs = run_session(
+                    create_initial_state(example.inputs['user_request']),
+                    {**DEFAULT_RUN_CONFIG, "callbacks": [usage]},
+                    app=self.app, trace=run.trace_index,
+                )
+            # Graph-level errors (e.g. an unavailable LLM) end the run without raising
+            state_error = (run.outputs or {}).get("error")
+            if state_error:
+                run.error = f"{state_error['type']} in {state_error['node']}: {state_error['message']}"
+        except Exception as e:
+            run.error = f"{type(e).__name__}: {e}"
+        run.end_time = _now()
+        return run, usage, time.perf_counter() - start
+
+    def _score(self, run: LocalRun, example: LocalExample) -> dict:
+        """Applies every evaluator, recording evaluator failures as unscored results."""
+        scores = {}
+        for evaluator in self.evaluators:
+            try:
+                result = evaluator(run, example)
+                scores[result.key] = {"score": result.score, "comment": result.comment}
+            except Exception as e:
+                scores[evaluator.__name__] = {"score": None, "comment": f"Evaluator failed: {type(e).__name__}: {e}"}
+        return scores
+
+    def evaluate_example(self, example: LocalExample) -> dict:
+        """Runs and scores one example, returning its result record."""
+        run, usage, latency = self._run_example(example)
+        return {
+            "example_id": example.id,
+            "run_id": run.id,
+            "inputs": example.inputs,
+            "error": run.error,
+            "latency_s": latency,
+            "llm_calls": usage.llm_calls,
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "hops": run.trace_index.hops,
+            "termination": (run.outputs or {}).get("termination"),
+            "final_message": final_reply(run.outputs),
+            "scores": self._score(run, example),
+        }
+
+    def aggregate(self, records: List[dict], elapsed: float) -> dict:
+        """Builds the experiment summary: mean scores, latency and token statistics."""
+        score_values = {}
+        for record in records:
+            for key, result in record["scores"].items():
+                if result["score"] is not None:
+                    score_values.setdefault(key, []).append(float(result["score"]))
+        return {
+            "experiment": self.experiment_name,
+            "dataset": self.dataset_path,
+            "timestamp": _now().isoformat(),
+            "metadata": {
+                "agent_model": MODEL_NAMES.get("llm", "Unknown"),
+                "memory_model": MODEL_NAMES.get("utility_llm", "Unknown"),
+                "max_concurrency": self.max_concurrency,
+            },
+            "examples": len(records),
+            "errors": sum(1 for r in records if r["error"]),
+            "terminated_early": sum(1 for r in records if r["termination"]),
+            "elapsed_s": elapsed,
+            "examples_per_s": len(records) / elapsed if elapsed else 0.0,
+            "scores": {key: {"mean": statistics.fmean(v), "scored": len(v)} for key, v in sorted(score_values.items())},
+            "latency_s": summarize([r["latency_s"] for r in records]),
+            "llm_calls": summarize([r["llm_calls"] for r in records]),
+            "input_tokens": summarize([r["input_tokens"] for r in records]),
+            "output_tokens": summarize([r["output_tokens"] for r in records]),
+            "total_tokens": sum(r["input_tokens"] + r["output_tokens"] for r in records),
+        }
+
+    def run(self) -> dict:
+        """Evaluates every example and hands the results to each sink. Returns the summary."""
+        print(f"\n--- Running {len(self.examples)} examples from {self.dataset_path} "
+              f"(concurrency {self.max_concurrency}) ---")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            records = list(pool.map(self.evaluate_example, self.examples))
+        summary = self.aggregate(records, time.perf_counter() - start)
+        for sink in self.sinks:
+            sink.write(self.experiment_name, records, summary)
+        return summary
+
+# --- Result Sinks ---
+
+class JsonlSink:
+    """Writes examples.jsonl (one record per example) and summary.json under output_dir/<experiment>."""
+
+    def __init__(self, output_dir: str = "eval_results"):
+        self.output_dir = output_dir
+
+    def write(self, experiment_name: str, records: List[dict], summary: dict):
+        directory = os.path.join(self.output_dir, experiment_name)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "examples.jsonl"), "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+        with open(os.path.join(directory, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+        print(f"Results written to {directory}")
+
+class LangSmithSink:
+    """Uploads each evaluated example to a LangSmith project as a run with its scores as feedback."""
+
+    def __init__(self, client=None):
+        if client is None:
+            # Imported here so the local engine never needs LangSmith configured
+            from langsmith import Client
+            client = Client()
+        self.client = client
+
+    def write(self, experiment_name: str, records: List[dict], summary: dict):
+        for record in records:
+            self.client.create_run(
+                name="SoftwareDevTeam",
+                inputs=record["inputs"],
+                run_type="chain",
+                project_name=experiment_name,
+                id=record["run_id"],
+                outputs={"final_message": record["final_message"], "hops": record["hops"]},
+                error=record["error"],
+                extra={"metadata": {"example_id": record["example_id"], "latency_s": record["latency_s"]}},
+            )
+            for key, result in record["scores"].items():
+                if result["score"] is not None:
+                    self.client.create_feedback(record["run_id"], key, score=result["score"], comment=result["comment"])
+        print(f"Uploaded {len(records)} runs to LangSmith project '{experiment_name}'.")
@@ -1,24 +1,24 @@
-from langsmith import Client
-from langsmith.evaluation import evaluate
 from langsmith.schemas import Example, Dataset
-from langchain_core.messages import HumanMessage
 import os
 
-# Import the compiled graph application
-# Assuming the graph is built and compiled in src.graph.builder
-from src.graph.builder import compiled_app
+# Import the single-pass session API shared with run_app.py
+from src.graph.session import create_initial_state, run_session, DEFAULT_RUN_CONFIG
 # Import evaluators
 from .evaluators import check_task_completion, check_code_generation
+from .local_runner import load_dataset, DEFAULT_DATASET_PATH
 
-# Import LLM config details for metadata
-from src.llm_config import llm, memory_llm 
+# Import LLM config details for metadata (model names only, no clients are created)
+from src.llm_config import MODEL_NAMES
 
 class EvaluationRunner:
     """Handles the setup and execution of LangSmith evaluations."""
     
-    def __init__(self, dataset_name: str = "Software Dev Agent Evals"):
+    def __init__(self, dataset_name: str = "Software Dev Agent Evals", max_concurrency: int = 4):
+        # Imported here so importing this module does not load or configure LangSmith
+        from langsmith import Client
         self.client = Client()
         self.dataset_name = dataset_name
+        self.max_concurrency = max_concurrency
         self.dataset = self._ensure_dataset()
 
     def _ensure_dataset(self) -> Dataset:
@@ -34,14 +34,8 @@ class EvaluationRunner:
                 description="Evaluating the multi-agent software dev team."
             )
             print(f"Dataset created with ID: {dataset.id}")
-            # Add default examples
-            default_examples = [
-                {"user_request": "Create a Python function `multiply(a, b)` that returns the product of two numbers."}, 
-                {"user_request": "Design a simple REST API endpoint using Flask that takes a name and returns a greeting."}, 
-                {"user_request": "Write a function to calculate the factorial of a number, including basic error handling for negative inputs."}, 
-                {"user_request": "Refactor this code for clarity: def process(d): return d['value'] * 2"}, # Requires PM to ask for code maybe?
-                {"user_request": "Test the `add(a,b)` function previously created."} # Requires context/memory
-            ]
+            # Add default examples (shared with the local engine)
+            default_examples = [example.inputs for example in load_dataset(DEFAULT_DATASET_PATH)]
             self.client.create_examples(
                 inputs=[ex for ex in default_examples],
                 # No outputs needed if using custom evaluators on the run trace
@@ -55,13 +49,9 @@ class EvaluationRunner:
         if 'user_request' not in inputs:
              raise ValueError("Input dictionary must contain 'user_request' key.")
              
-        initial_state = {
-            "messages": [HumanMessage(content=inputs['user_request'])],
-            "user_info": {} 
-        }
-        # Invoke the compiled LangGraph app
-        # Set a recursion limit
-        return compiled_app.invoke(initial_state, {"recursion_limit": 50})
+        initial_state = create_initial_state(inputs['user_request'])
+        # Run the compiled LangGraph app once (default config sets the recursion limit)
+        return run_session(initial_state, DEFAULT_RUN_CONFIG)
 
     def run(self):
         """Executes the evaluation process."""
@@ -76,20 +66,20 @@ class EvaluationRunner:
 
         # Metadata for the experiment
         experiment_metadata = {
-            "agent_model": llm.model_name if llm else "Unknown",
-            "memory_model": memory_llm.model_name if memory_llm else "Unknown",
+            "agent_model": MODEL_NAMES.get("llm", "Unknown"),
+            "memory_model": MODEL_NAMES.get("utility_llm", "Unknown"),
             "graph_structure": "Mem -> PM -> [Arch|Dev|Test] -> Summary? -> PM -> END",
             # Add other relevant metadata like date, version, etc.
         }
         
+        from langsmith.evaluation import evaluate
         evaluation_results = evaluate(
             self._system_under_test, # The SUT function
             dataset_name=self.dataset_name, # The dataset to run evaluation on
             evaluators=evaluators,
             experiment_prefix="sw-dev-agent-eval", # Prefix for experiment name in LangSmith
             metadata=experiment_metadata,
-            # Optional: Add concurrency level, progress bars etc.
-            # max_concurrency=5, 
+            max_concurrency=self.max_concurrency,
         )
         print("--- Evaluation Complete --- Results logged to LangSmith.")
         # The results object contains detailed scores, but they are also viewable in LangSmith UI
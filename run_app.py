@@ -1,56 +1,168 @@
 import sys
 import os
+import contextlib
 
 # Add src directory to the Python path
 # This allows importing modules from src like src.graph.builder
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
-from langchain_core.messages import HumanMessage
-from src.graph.builder import compiled_app # Import the compiled application
+# Settings are read from the environment when src.config is imported, so .env goes first
+from dotenv import load_dotenv
+load_dotenv()
 
-def run_interaction(user_input: str):
-    """Runs a single interaction with the multi-agent system."""
-    initial_state = {
-        "messages": [HumanMessage(content=user_input)],
-        "user_info": {} # Initialize user_info
-    }
+from src.graph.session import create_initial_state, run_session, arun_session, session_config, final_reply, DEFAULT_RUN_CONFIG
+from src.instrumentation import setup_logging, metrics
+from src.graph.routing import parse_pm_decision
+from src.llm_cache import bypass_cache
+from src.config import METRICS_PATH
 
-    print(f"\n--- Running Interaction ---")
-    print(f"Input: {user_input}")
-    print("-------------------------")
-    
-    # Stream the execution for visualization
-    for event in compiled_app.stream(initial_state, {"recursion_limit": 50}): 
-        for node_name, output in event.items():
-            # Print output from each node
-            print(f"--- Node: {node_name} ---")
-            # Output is the state dict update, print messages if available
-            if isinstance(output, dict) and 'messages' in output and output['messages']:
-                print(f"Messages: {output['messages']}")
-            elif isinstance(output, dict) and 'user_info' in output:
-                 print(f"User Info Extracted: {output['user_info']}")
-            else:
-                # Print the raw output if it's not the expected message format
-                print(f"Raw Output: {output}") 
-            print("\n=====================\n")
-    
-    # Get the final state
-    final_state = compiled_app.invoke(initial_state, {"recursion_limit": 50})
+def print_node_event(node_name: str, output: dict):
+    """Prints the state update produced by a single node."""
+    print(f"--- Node: {node_name} ---")
+    # Output is the state dict update, print messages if available
+    if isinstance(output, dict) and 'messages' in output and output['messages']:
+        print(f"Messages: {output['messages']}")
+    elif isinstance(output, dict) and 'user_info' in output:
+         print(f"User Info Extracted: {output['user_info']}")
+    else:
+        # Print the raw output if it's not the expected message format
+        print(f"Raw Output: {output}") 
+    print("\n=====================\n")
+
+class LiveTokenPrinter:
+    """Renders streamed agent output as it arrives, with a header whenever the speaking node changes.
+
+    The PM answers in JSON, so its tokens are not echoed; its decision is shown as the
+    chosen agent and instruction once the node finishes.
+    """
+
+    def __init__(self):
+        self.current_node = None
+
+    def on_token(self, node_name: str, delta: str):
+        if node_name == "ProjectManager":
+            return
+        if node_name != self.current_node:
+            self.end_line()
+            print(f"--- {node_name} ---")
+            self.current_node = node_name
+        print(delta, end="", flush=True)
+
+    def on_event(self, node_name: str, output: dict):
+        # Streamed nodes were already rendered; only show the other updates
+        if node_name == self.current_node:
+            self.end_line()
+            self.current_node = None
+        elif node_name == "ProjectManager" and isinstance(output, dict) and output.get('messages'):
+            self.end_line()
+            self.current_node = None
+            print(f"--- {node_name} ---\n{render_pm_decision(output['messages'][-1].content)}\n")
+        elif isinstance(output, dict) and 'user_info' in output:
+            print(f"User Info Extracted: {output['user_info']}")
+
+    def end_line(self):
+        if self.current_node is not None:
+            print("\n")
+
+def render_pm_decision(content) -> str:
+    """The PM's routing decision as "-> Agent: instruction", or the raw text if it is not one."""
+    decision = parse_pm_decision(content) if isinstance(content, str) else None
+    if decision is None:
+        return str(content)
+    return f"-> {decision['next_agent'].capitalize()}: {decision['instruction']}"
+
+def print_final_state(final_state: dict):
+    """Prints the final message of a finished interaction."""
     print("--- Final State ---")
-    # Ensure the final state message exists and is accessible
-    if final_state and 'messages' in final_state and isinstance(final_state['messages'], list) and final_state['messages']:
-         final_msg_content = final_state['messages'][-1].content
+    if final_state and final_state.get("error"):
+        error = final_state["error"]
+        print(f"Run ended early ({error['type']} in {error['node']}): {error['message']}")
+    if final_state and final_state.get("termination"):
+        termination = final_state["termination"]
+        print(f"Stopped early ({termination['reason']}): {termination['detail']}, "
+              f"{sum(termination['hops'].values())} agent turns, {termination['tokens']} tokens")
+    # A closing PM decision is shown as its instruction rather than as raw JSON
+    final_msg_content = final_reply(final_state)
+    if final_msg_content is not None:
          print(f"Final Message: {final_msg_content}")
     else:
         print("Could not retrieve final message from state.")
     print("-------------------")
+
+def run_interaction(user_input: str, thread_id: str = None, stream: bool = True, user_id: str = None,
+                    use_cache: bool = True):
+    """Runs a single interaction with the multi-agent system.
+
+    With a thread_id (and CHECKPOINT_DB_PATH set) the interaction continues that thread's history.
+    user_id selects whose remembered facts are used and updated (DEFAULT_USER_ID if unset).
+    With stream (the default) agent output is printed token by token as it is generated;
+    otherwise each node's update is printed once the node finishes.
+    use_cache=False bypasses the LLM response cache for this run (fresh samples).
+    """
+    initial_state = create_initial_state(user_input, follow_up=thread_id is not None, user_id=user_id)
+
+    print(f"\n--- Running Interaction ---")
+    print(f"Input: {user_input}")
+    print("-------------------------")
+    
+    # Stream the execution for visualization; the final state comes from the same single run
+    with (contextlib.nullcontext() if use_cache else bypass_cache()):
+        if stream:
+            printer = LiveTokenPrinter()
+            final_state = run_session(initial_state, session_config(thread_id), on_event=printer.on_event, on_token=printer.on_token)
+            printer.end_line()
+        else:
+            final_state = run_session(initial_state, session_config(thread_id), on_event=print_node_event)
+    print_final_state(final_state)
+    return final_state
+
+async def arun_interaction(user_input: str, stream: bool = False):
+    """Async variant of run_interaction; many of these can share one event loop.
+
+    Streaming is off by default since concurrent interactions would interleave their tokens.
+    """
+    initial_state = create_initial_state(user_input)
+
+    print(f"\n--- Running Interaction (async) ---")
+    print(f"Input: {user_input}")
+    print("-------------------------")
+
+    if stream:
+        printer = LiveTokenPrinter()
+        final_state = await arun_session(initial_state, DEFAULT_RUN_CONFIG, on_event=printer.on_event, on_token=printer.on_token)
+        printer.end_line()
+    else:
+        final_state = await arun_session(initial_state, DEFAULT_RUN_CONFIG, on_event=print_node_event)
+    print_final_state(final_state)
     return final_state
 
 if __name__ == "__main__":
+    setup_logging()
+    # Options before the request, in any order: "--thread-id <id>" continues a checkpointed thread,
+    # "--user-id <id>" selects whose remembered facts are used, "--no-stream" prints whole node
+    # outputs and "--no-cache" bypasses the LLM response cache
+    args = sys.argv[1:]
+    thread_id = user_id = None
+    stream = use_cache = True
+    while args:
+        if args[0] == "--no-stream":
+            stream, args = False, args[1:]
+        elif args[0] == "--no-cache":
+            use_cache, args = False, args[1:]
+        elif len(args) >= 2 and args[0] == "--thread-id":
+            thread_id, args = args[1], args[2:]
+        elif len(args) >= 2 and args[0] == "--user-id":
+            user_id, args = args[1], args[2:]
+        else:
+            break
+
     # Example: Get input from command line argument or use default
-    if len(sys.argv) > 1:
-        request = " ".join(sys.argv[1:])
+    if args:
+        request = " ".join(args)
     else:
         request = "Please design and implement a simple Python function that adds two numbers. Then test it."
     
-    run_interaction(request) 
\ No newline at end of file
+    run_interaction(request, thread_id=thread_id, stream=stream, user_id=user_id, use_cache=use_cache)
+    if METRICS_PATH:
+        metrics.dump(METRICS_PATH)
+        print(f"Metrics written to {METRICS_PATH}") 
\ No newline at end of file
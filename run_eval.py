@@ -1,19 +1,51 @@
 import sys
 import os
+import argparse
 
 # Add base directory and src directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
-from eval.runner import EvaluationRunner
+# Settings are read from the environment when src.config is imported, so .env goes first
+from dotenv import load_dotenv
+load_dotenv()
+
+from eval.local_runner import LocalEvaluationRunner, LangSmithSink, DEFAULT_DATASET_PATH
+from src.instrumentation import setup_logging
 
 if __name__ == "__main__":
-    print("Initializing Evaluation Runner...")
-    # Specify a dataset name if you want to use a different one
-    # runner = EvaluationRunner(dataset_name="My Custom Eval Dataset") 
-    runner = EvaluationRunner() 
-    
-    # Run the evaluations
-    runner.run()
-    
-    print("Evaluation process initiated. Check LangSmith for results.") 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the agent graph on a dataset.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET_PATH, help="JSONL dataset to run locally.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Examples run in parallel.")
+    parser.add_argument("--rps", type=float, default=None, help="Maximum examples started per second.")
+    parser.add_argument("--output-dir", default="eval_results", help="Where per-example results and the summary are written.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache, so every example samples afresh.")
+    parser.add_argument("--upload", action="store_true", help="Also upload the local results to LangSmith.")
+    parser.add_argument("--remote", action="store_true", help="Run the evaluation through LangSmith's evaluate() instead.")
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.remote:
+        from eval.runner import EvaluationRunner
+        print("Initializing Evaluation Runner...")
+        # Specify a dataset name if you want to use a different one
+        # runner = EvaluationRunner(dataset_name="My Custom Eval Dataset")
+        runner = EvaluationRunner(max_concurrency=args.concurrency)
+        runner.run()
+        print("Evaluation process initiated. Check LangSmith for results.")
+    else:
+        runner = LocalEvaluationRunner(
+            dataset_path=args.dataset,
+            max_concurrency=args.concurrency,
+            requests_per_second=args.rps,
+            output_dir=args.output_dir,
+            sinks=[LangSmithSink()] if args.upload else None,
+            use_cache=not args.no_cache,
+        )
+        summary = runner.run()
+        print(f"\n--- Evaluation Complete: {summary['examples']} examples, {summary['errors']} errors, "
+              f"{summary['elapsed_s']:.1f} s ---")
+        for key, result in summary["scores"].items():
+            print(f"{key:<24} mean {result['mean']:.2f} over {result['scored']} examples")
+        print(f"latency p50 {summary['latency_s']['p50']:.2f} s, p95 {summary['latency_s']['p95']:.2f} s, "
+              f"{summary['total_tokens']} tokens total")
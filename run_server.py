@@ -0,0 +1,39 @@
+import sys
+import os
+import argparse
+
+# Add base directory and src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
+
+# Settings are read from the environment when src.config is imported, so .env goes first
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.config import SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_SESSIONS, SERVICE_MAX_THREADS, SERVICE_BATCH_WINDOW_MS, EXTRACTION_BATCH_MAX
+from src.instrumentation import setup_logging
+from src.service import AgentService, create_server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the agent graph over HTTP.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--max-sessions", type=int, default=SERVICE_MAX_SESSIONS, help="Sessions run at once.")
+    parser.add_argument("--max-threads", type=int, default=SERVICE_MAX_THREADS,
+                        help="Threads kept by the in-memory checkpointer (without CHECKPOINT_DB_PATH).")
+    parser.add_argument("--batch-window-ms", type=float, default=SERVICE_BATCH_WINDOW_MS,
+                        help="Window for batching memory extraction calls (0 disables).")
+    parser.add_argument("--batch-max", type=int, default=EXTRACTION_BATCH_MAX, help="Largest extraction batch.")
+    args = parser.parse_args()
+    setup_logging()
+
+    server = create_server(AgentService(max_sessions=args.max_sessions, max_threads=args.max_threads), args.host, args.port,
+                           args.batch_window_ms, args.batch_max)
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port} (POST /sessions, GET /health, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
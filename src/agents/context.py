@@ -0,0 +1,118 @@
+import logging
+import re
+from collections import Counter, deque
+from typing import List, Optional, Tuple
+from langchain_core.messages import BaseMessage, SystemMessage
+from ..config import MODEL_CONTEXT_TOKENS, RESPONSE_TOKEN_RESERVE, ROLE_TOKEN_BUDGETS
+from ..tokens import estimate_tokens, count_message_tokens, MESSAGE_OVERHEAD_TOKENS
+from ..graph.routing import parse_pm_decision
+from ..instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Per-Role Context Budgets ---
+# Agent prompts are fitted to a per-role token budget before each call, so long sessions
+# stay inside the model's context window and each role only pays for what it needs.
+
+FENCED_BLOCK_PATTERN = re.compile(r"```[\w+-]*\n.*?```", re.DOTALL)
+
+# Room kept for the note that replaces dropped messages
+OMISSION_NOTE_TOKENS = 24
+# Most recent messages with code that are kept ahead of everything else
+PRIORITY_CODE_MESSAGES = 3
+
+# Counters of budget checks: calls, trimmed, dropped_messages, compacted_messages, saved_tokens
+context_stats = Counter()
+# Most recent per-call reports (role, before, after, budget, dropped, compacted)
+trim_log = deque(maxlen=1000)
+metrics.register_collector("context", lambda: dict(context_stats))
+
+def role_budget(role: Optional[str]) -> int:
+    """Input token budget of a role (system prompt included), capped by the context window."""
+    window = MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE
+    return min(ROLE_TOKEN_BUDGETS.get(role, window), window)
+
+def _is_pm_instruction(message: BaseMessage) -> bool:
+    return message.type == "ai" and parse_pm_decision(message.content) is not None
+
+def _code_only(message: BaseMessage) -> Optional[BaseMessage]:
+    """The message reduced to its fenced code blocks, or None if it has none."""
+    content = message.content if isinstance(message.content, str) else ""
+    blocks = FENCED_BLOCK_PATTERN.findall(content) if "```" in content else []
+    if not blocks:
+        return None
+    return message.model_copy(update={"content": "\n\n".join(blocks)})
+
+def trim_messages(messages: List[BaseMessage], budget: int) -> Tuple[List[BaseMessage], int, int]:
+    """Fits messages into budget tokens, returning (messages, dropped, compacted).
+
+    Always kept: system messages (e.g. the conversation summary), the latest user
+    message and the latest PM instruction. The remaining budget goes first to the
+    newest messages with code blocks, then to all other messages, newest first. A
+    message that does not fit whole is kept as just its code blocks if it has any.
+    Dropped messages are replaced by a short note; the original order is preserved.
+    """
+    if count_message_tokens(messages) <= budget:
+        return list(messages), 0, 0
+
+    kept = {}
+    used = OMISSION_NOTE_TOKENS
+    pinned = [i for i, m in enumerate(messages) if m.type == "system"]
+    for predicate in (lambda m: m.type == "human", _is_pm_instruction):
+        latest = next((i for i in range(len(messages) - 1, -1, -1) if predicate(messages[i])), None)
+        if latest is not None:
+            pinned.append(latest)
+    for i in pinned:
+        if i not in kept:
+            kept[i] = messages[i]
+            used += count_message_tokens([messages[i]])
+
+    compacted = 0
+    def take(i: int) -> None:
+        # Whole message if it fits, otherwise just its code blocks if those fit
+        nonlocal used, compacted
+        for candidate in (messages[i], _code_only(messages[i])):
+            if candidate is None:
+                continue
+            cost = count_message_tokens([candidate])
+            if used + cost <= budget:
+                kept[i] = candidate
+                used += cost
+                compacted += candidate is not messages[i]
+                return
+
+    newest_first = [i for i in range(len(messages) - 1, -1, -1) if i not in kept]
+    with_code = [i for i in newest_first if isinstance(messages[i].content, str) and "```" in messages[i].content]
+    for i in with_code[:PRIORITY_CODE_MESSAGES]:
+        take(i)
+    for i in newest_first:
+        if i not in kept:
+            take(i)
+
+    dropped = len(messages) - len(kept)
+    result = [kept[i] for i in sorted(kept)]
+    if dropped:
+        # Keep leading system messages first, then say what was left out
+        position = next((n for n, m in enumerate(result) if m.type != "system"), len(result))
+        result.insert(position, SystemMessage(content=f"[{dropped} earlier messages omitted to fit the context budget]"))
+    return result, dropped, compacted
+
+def fit_prompt_inputs(inputs: dict, role: Optional[str], system_prompt: str) -> dict:
+    """Trims inputs["messages"] to the role's budget and records the before/after token report."""
+    budget = role_budget(role)
+    system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+    messages = list(inputs.get("messages", []))
+    before = system_tokens + count_message_tokens(messages)
+    trimmed, dropped, compacted = trim_messages(messages, budget - system_tokens)
+    after = system_tokens + count_message_tokens(trimmed)
+
+    context_stats["calls"] += 1
+    if dropped or compacted:
+        context_stats["trimmed"] += 1
+        context_stats["dropped_messages"] += dropped
+        context_stats["compacted_messages"] += compacted
+        context_stats["saved_tokens"] += before - after
+    trim_log.append({"role": role, "before": before, "after": after, "budget": budget, "dropped": dropped, "compacted": compacted})
+    logger.debug("Context (%s): %d -> %d tokens (budget %d, %d dropped, %d compacted)",
+                 role or "agent", before, after, budget, dropped, compacted)
+    return {**inputs, "messages": trimmed}
@@ -1,10 +1,12 @@
 from .utils import create_agent_node
-from ..llm_config import llm
+from ..llm_config import get_llm
 
 developer_prompt = """You are the software developer. You receive tasks from the project manager or guidance from the architect.
 Review the conversation history, focusing on the requirements and design specifications.
 Write the necessary code or implement the required changes.
 If clarification is needed, ask specific questions.
-Output the code within appropriate markdown code blocks (e.g., ```python ... ```)."""
+Output the code within appropriate markdown code blocks (e.g., ```python ... ```).
+Put tests in a separate ```python block as plain test_ functions using assert; they are run against your code.
+If the last message reports a failed code execution, fix the code so the failing tests pass."""
 
-developer_node = create_agent_node(developer_prompt, llm) 
\ No newline at end of file
+developer_node = create_agent_node(developer_prompt, get_llm, role="Developer") 
\ No newline at end of file
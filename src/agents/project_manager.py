@@ -1,5 +1,6 @@
 from .utils import create_agent_node
-from ..llm_config import llm
+from ..llm_config import get_llm
+from ..config import SPECULATIVE_DISPATCH
 
 pm_prompt = """You are a project manager for a software development team. Your role is to oversee the project execution based on the user's request.
 Review the conversation history and the latest message.
@@ -8,8 +9,20 @@ Your options are:
 1.  Delegate to the Architect for design or technical clarification.
 2.  Delegate to the Developer to write code.
 3.  Delegate to the Tester to review and test the code.
-4.  If the project is complete or requires user input, respond with "FINISH".
+4.  If the project is complete or requires user input, choose FINISH.
 
-Provide a clear instruction or question for the chosen team member or state FINISH."""
+Respond with a single JSON object and nothing else, in the form:
+{{"next_agent": "Architect" | "Developer" | "Tester" | "FINISH", "instruction": "<clear instruction or question for the chosen team member, or a closing summary when finishing>"}}"""
 
-project_manager_node = create_agent_node(pm_prompt, llm) 
\ No newline at end of file
+# Speculative mode: the plan lets the next worker start early (see graph/speculation.py)
+pm_plan_prompt = """
+Also include "plan": the steps you expect to follow this one, in order, each as {{"next_agent": ..., "instruction": ...}} (an empty list if none). The plan is a forecast; you still decide each step when it comes."""
+
+if SPECULATIVE_DISPATCH:
+    pm_prompt += pm_plan_prompt
+
+def get_pm_llm():
+    """Main model in JSON mode, so the provider returns a parseable routing decision (see routing.parse_pm_decision)."""
+    return get_llm().bind(response_format={"type": "json_object"})
+
+project_manager_node = create_agent_node(pm_prompt, get_pm_llm, role="ProjectManager")
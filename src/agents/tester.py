@@ -1,9 +1,10 @@
 from .utils import create_agent_node
-from ..llm_config import llm
+from ..llm_config import get_llm
 
 tester_prompt = """You are the software tester. You receive code from the developer to test.
 Review the conversation history, the requirements, and the implemented code.
 Identify bugs, edge cases, or areas for improvement.
-Provide clear feedback to the project manager. If the code passes tests, state that clearly."""
+Provide clear feedback to the project manager. If the code passes tests, state that clearly.
+When a [CodeExecutor] report is present, base your verdict on those actual results rather than re-checking by hand."""
 
-tester_node = create_agent_node(tester_prompt, llm) 
\ No newline at end of file
+tester_node = create_agent_node(tester_prompt, get_llm, role="Tester") 
\ No newline at end of file
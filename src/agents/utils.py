@@ -1,29 +1,176 @@
 import functools
+import json
+import logging
+from typing import Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import SystemMessage, AIMessage
+from langchain_core.runnables import Runnable, RunnableLambda
 from ..state import AgentState # Relative import for AgentState
+from .context import fit_prompt_inputs
+from ..rate_limit import LLMUnavailableError
+from ..tokens import estimate_tokens, count_message_tokens
+from ..config import SPECULATIVE_DISPATCH, SPECULATIVE_ROLES
+from ..graph.routing import record_agent_turn, parse_pm_decision, guard_reason, PM_ROUTES, WORKER_ROLES
+from ..graph import speculation
+
+# Chain and system prompt of every agent node by role, for speculative runs
+AGENT_CHAINS = {}
+
+logger = logging.getLogger(__name__)
 
 # Helper function to create a node
-def create_agent_node(role_prompt: str, llm):
+def create_agent_node(role_prompt: str, llm, role: str = None):
+    """Creates an agent node from a role prompt and a model (or a zero-argument model factory).
+
+    With a factory such as llm_config.get_llm, the model is only resolved when the
+    node first runs, so importing the agent modules creates no LLM clients.
+    The conversation is trimmed to the role's token budget (config.ROLE_TOKEN_BUDGETS)
+    before every call.
+    """
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", role_prompt),
             MessagesPlaceholder(variable_name="messages"),
         ]
     )
-    chain = prompt | llm
-    # Pass the chain explicitly to agent_node_func
-    return functools.partial(agent_node_func, chain=chain) 
+    if isinstance(llm, Runnable):
+        chain = prompt | llm
+    else:
+        def chain():
+            return prompt | llm()
+    if role:
+        AGENT_CHAINS[role] = (chain, role_prompt)
+    # Pass the chain explicitly to agent_node_func; the node runs agent_node_func under
+    # invoke/stream and aagent_node_func under ainvoke/astream
+    return RunnableLambda(
+        functools.partial(agent_node_func, chain=chain, role=role, system_prompt=role_prompt),
+        afunc=functools.partial(aagent_node_func, chain=chain, role=role, system_prompt=role_prompt),
+    )
+
+def _fact_text(value) -> str:
+    return ", ".join(value) if isinstance(value, list) else str(value)
+
+def user_facts_message(state: AgentState) -> Optional[SystemMessage]:
+    """Known user facts the conversation does not already mention, as one system message."""
+    user_info = state.get('user_info') or {}
+    if not user_info:
+        return None
+    conversation = " ".join(m.content for m in state.get('messages', []) if isinstance(m.content, str)).lower()
+    conversation += " " + (state.get('summary') or "").lower()
+    new_facts = [f"{key}: {_fact_text(value)}" for key, value in user_info.items()
+                 if _fact_text(value).lower() not in conversation]
+    if not new_facts:
+        return None
+    return SystemMessage(content="Known facts about the user:\n" + "\n".join(f"- {fact}" for fact in new_facts))
+
+def build_prompt_inputs(state: AgentState) -> dict:
+    """Prepends the running conversation summary and new user facts (if any) to the messages sent to the agent."""
+    summary = state.get('summary')
+    leading = []
+    if summary:
+        leading.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    facts = user_facts_message(state)
+    if facts is not None:
+        leading.append(facts)
+    if not leading:
+        return state
+    return {**state, "messages": leading + list(state.get('messages', []))}
+
+def build_budgeted_inputs(state: AgentState, role: str = None, system_prompt: str = "") -> dict:
+    """Prompt inputs for an agent call, trimmed to the role's token budget."""
+    return fit_prompt_inputs(build_prompt_inputs(state), role, system_prompt)
+
+def resolve_chain(chain):
+    """Returns the chain itself, or builds it if given a zero-argument chain factory."""
+    return chain if isinstance(chain, Runnable) else chain()
 
-def agent_node_func(state: AgentState, chain):
+def prompt_tokens(inputs: dict, system_prompt: str) -> int:
+    """Estimated tokens of the prompt sent for inputs."""
+    return estimate_tokens(system_prompt) + count_message_tokens(inputs.get("messages", []))
+
+def llm_error_update(node: str, error: LLMUnavailableError) -> dict:
+    """State update that ends the run with an error instead of raising out of the graph."""
+    logger.error("%s: %s", node or "agent", error)
+    return {"error": {"node": node, "type": "llm_unavailable", "model": error.model, "message": str(error)}}
+
+def _start_speculation(state: AgentState, response, decision: dict) -> Optional[dict]:
+    """Starts the first planned step after the PM's decision, if it may run ahead."""
+    if not decision["plan"]:
+        return None
+    step = decision["plan"][0]
+    role = PM_ROUTES[step["next_agent"]]
+    allowed = {r.lower() for r in SPECULATIVE_ROLES}
+    if (role not in AGENT_CHAINS or role.lower() not in allowed or role == PM_ROUTES[decision["next_agent"]]
+            or state.get("error") or guard_reason(state, role)):
+        return None
+    # The conversation as the worker would see it if the current step changed nothing
+    handoff = AIMessage(content=json.dumps({"next_agent": role, "instruction": step["instruction"] or decision["instruction"]}))
+    chain, system_prompt = AGENT_CHAINS[role]
+    inputs = build_budgeted_inputs({**state, "messages": list(state.get('messages', [])) + [response, handoff]}, role, system_prompt)
+    speculation_id = speculation.launch(role, lambda: resolve_chain(chain).invoke(inputs), prompt_tokens(inputs, system_prompt))
+    return {"id": speculation_id, "role": role}
+
+def speculation_update(state: AgentState, role: str, response) -> dict:
+    """State update settling the pending speculative run around this turn, or starting one.
+
+    A PM decision routing elsewhere discards the pending run; a PM decision with a plan
+    starts the next planned worker (SPECULATIVE_DISPATCH). A worker turn clears the run it
+    claimed; the worker running beside a pending run leaves it alone.
+    """
+    pending = state.get("speculation")
+    if role != "ProjectManager":
+        return {"speculation": None} if pending and pending["role"] == role else {}
+
+    decision = parse_pm_decision(response.content) if isinstance(response.content, str) else None
+    next_agent = PM_ROUTES[decision["next_agent"]] if decision else None
+    if pending:
+        if next_agent == pending["role"]:
+            return {} # Kept for that worker's turn
+        speculation.discard(pending["id"])
+    started = None
+    if SPECULATIVE_DISPATCH and decision and next_agent in WORKER_ROLES:
+        started = _start_speculation(state, response, decision)
+    return {"speculation": started} if pending or started else {}
+
+def agent_node_func(state: AgentState, chain, role: str = None, system_prompt: str = ""):
     # Make sure state['messages'] exists and is not empty if needed by the LLM/chain
     # The state mechanism usually handles accumulation, but good to be aware
     if not state.get('messages'):
          # Handle case with no messages if necessary, maybe return default response or raise error
          # For now, let's assume messages will be populated by the time an agent node is called
-         print("Warning: agent_node_func called with empty messages state.")
+         logger.warning("agent_node_func called with empty messages state.")
          # Depending on the chain, invoking with empty messages might be okay or might error
          # If it errors frequently, add more robust handling here.
 
-    response = chain.invoke(state) 
-    # Return the standard state update format
-    return {"messages": [response]} 
\ No newline at end of file
+    pending = state.get("speculation")
+    claimed = speculation.claim(pending["id"]) if pending and pending["role"] == role else None
+    if claimed:
+        # The run started ahead of routing is this turn's answer
+        response, tokens = claimed
+    else:
+        inputs = build_budgeted_inputs(state, role, system_prompt)
+        try:
+            response = resolve_chain(chain).invoke(inputs)
+        except LLMUnavailableError as e:
+            return {**llm_error_update(role, e), **speculation_update(state, role, AIMessage(content=""))}
+        tokens = prompt_tokens(inputs, system_prompt)
+    # Return the standard state update format, with the turn counted against the session budget
+    return {"messages": [response], "budget": record_agent_turn(state, role, response, tokens), **speculation_update(state, role, response)}
+
+async def aagent_node_func(state: AgentState, chain, role: str = None, system_prompt: str = ""):
+    """Async variant of agent_node_func, awaiting the chain instead of blocking on it."""
+    if not state.get('messages'):
+         logger.warning("aagent_node_func called with empty messages state.")
+
+    pending = state.get("speculation")
+    claimed = await speculation.aclaim(pending["id"]) if pending and pending["role"] == role else None
+    if claimed:
+        response, tokens = claimed
+    else:
+        inputs = build_budgeted_inputs(state, role, system_prompt)
+        try:
+            response = await resolve_chain(chain).ainvoke(inputs)
+        except LLMUnavailableError as e:
+            return {**llm_error_update(role, e), **speculation_update(state, role, AIMessage(content=""))}
+        tokens = prompt_tokens(inputs, system_prompt)
+    return {"messages": [response], "budget": record_agent_turn(state, role, response, tokens), **speculation_update(state, role, response)}
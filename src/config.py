@@ -0,0 +1,168 @@
+import os
+
+# Settings are read from the environment at import time. The entry points (run_app.py,
+# run_server.py, run_eval.py) load .env before importing this module; library imports don't.
+
+# --- Conversation Summary Settings ---
+# Single source for the summary trigger used by both summary_node and the routing check
+
+# Summarize once the message log exceeds this many (estimated) tokens
+SUMMARY_TOKEN_THRESHOLD = int(os.getenv("SUMMARY_TOKEN_THRESHOLD", "3000"))
+# Number of most recent messages kept verbatim after each summary
+SUMMARY_KEEP_LAST = int(os.getenv("SUMMARY_KEEP_LAST", "4"))
+# Model used for rolling conversation summaries: "utility" (default) or "main"
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "utility").lower()
+
+# --- User Memory Settings ---
+
+# SQLite file of per-user facts (see src/memory_store.py); unset keeps them for the life of the process
+USER_MEMORY_DB_PATH = os.getenv("USER_MEMORY_DB_PATH") or None
+# User id of single-user sessions (CLI, eval) that do not name one; the service uses the thread id
+DEFAULT_USER_ID = os.getenv("DEFAULT_USER_ID", "default")
+# Caps per user: facts kept (least recently seen evicted first), items per list fact,
+# characters per value, and extracted sentence hashes remembered for the fast path
+USER_MEMORY_MAX_FACTS = int(os.getenv("USER_MEMORY_MAX_FACTS", "50"))
+USER_MEMORY_MAX_LIST_ITEMS = int(os.getenv("USER_MEMORY_MAX_LIST_ITEMS", "10"))
+USER_MEMORY_MAX_VALUE_CHARS = int(os.getenv("USER_MEMORY_MAX_VALUE_CHARS", "200"))
+USER_MEMORY_MAX_SEEN = int(os.getenv("USER_MEMORY_MAX_SEEN", "500"))
+
+# --- Context Budget Settings ---
+# Agent prompts are trimmed to a per-role budget (see agents/context.py)
+
+# Context window of the configured models (llama3-*-8192) and the share kept for the reply
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "8192"))
+RESPONSE_TOKEN_RESERVE = int(os.getenv("RESPONSE_TOKEN_RESERVE", "1024"))
+# Input budget per role in estimated tokens, system prompt included
+ROLE_TOKEN_BUDGETS = {
+    "ProjectManager": int(os.getenv("PM_TOKEN_BUDGET", "3000")),
+    "Architect": int(os.getenv("ARCHITECT_TOKEN_BUDGET", "4000")),
+    "Developer": int(os.getenv("DEVELOPER_TOKEN_BUDGET", "6000")),
+    "Tester": int(os.getenv("TESTER_TOKEN_BUDGET", "5000")),
+}
+
+# --- LLM Response Cache Settings ---
+
+# "off" (default), "memory" (in-process LRU) or "sqlite" (LRU backed by a local SQLite file)
+LLM_CACHE_MODE = os.getenv("LLM_CACHE", "off").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+# Entries older than this many seconds are ignored; unset means no expiry
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS")) if os.getenv("LLM_CACHE_TTL_SECONDS") else None
+LLM_CACHE_MAX_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MAX_MEMORY_ENTRIES", "512"))
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "10000"))
+
+# --- Checkpoint Settings ---
+
+# Path of the SQLite checkpoint database; unset disables checkpointing
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH") or None
+# Number of most recent checkpoints kept per thread; threads are pruned after each session
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "50"))
+
+# --- LLM Backend Settings ---
+
+# "groq" (default) or "fake" for the offline scripted model in src/fake_llm.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq").lower()
+GROQ_MODEL_NAME = os.getenv("GROQ_MODEL_NAME", "llama3-70b-8192")
+GROQ_UTILITY_MODEL_NAME = os.getenv("GROQ_UTILITY_MODEL_NAME", "llama3-8b-8192")
+# Fake backend latency (ms before the first token, normal distribution) and per-token streaming delay
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv("FAKE_LLM_LATENCY_JITTER_MS", "0"))
+FAKE_LLM_TOKEN_LATENCY_MS = float(os.getenv("FAKE_LLM_TOKEN_LATENCY_MS", "0"))
+# Fake backend response length in tokens (normal distribution)
+FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "60"))
+FAKE_LLM_TOKENS_JITTER = int(os.getenv("FAKE_LLM_TOKENS_JITTER", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED")) if os.getenv("FAKE_LLM_SEED") else None
+# Optional JSONL file of {"role", "content"} responses to replay before falling back to the script
+FAKE_LLM_REPLAY_PATH = os.getenv("FAKE_LLM_REPLAY_PATH") or None
+# Share of fake backend calls that fail with an injected 429 (0.0 - 1.0)
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+# Share of scripted PM decisions after the Architect that ask for a design revision instead of
+# following the plan, so speculative runs are sometimes discarded (0.0 - 1.0)
+FAKE_LLM_PLAN_MISS_RATE = float(os.getenv("FAKE_LLM_PLAN_MISS_RATE", "0"))
+
+# --- LLM Rate Limit and Retry Settings ---
+# Limits are per provider model and shared by all sessions in the process (see src/rate_limit.py).
+# 0 disables a limit; the defaults follow Groq's free tier and are off for the fake backend.
+
+_DEFAULT_LIMITS_ON = LLM_BACKEND == "groq"
+LLM_RPM = int(os.getenv("LLM_RPM", "30" if _DEFAULT_LIMITS_ON else "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "6000" if _DEFAULT_LIMITS_ON else "0"))
+UTILITY_LLM_RPM = int(os.getenv("UTILITY_LLM_RPM", "30" if _DEFAULT_LIMITS_ON else "0"))
+UTILITY_LLM_TPM = int(os.getenv("UTILITY_LLM_TPM", "20000" if _DEFAULT_LIMITS_ON else "0"))
+# In-flight calls per provider model
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Per-request timeout passed to the provider client
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+# Retries per call, and retries shared by all calls of one session
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_SESSION_RETRY_BUDGET = int(os.getenv("LLM_SESSION_RETRY_BUDGET", "10"))
+# Jittered exponential backoff: a uniform draw up to min(max, base * 2**attempt) seconds
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+
+# --- Loop and Budget Guard Settings ---
+# Checked by the routers after every agent turn (see routing.guard_reason); 0 disables a limit.
+# LangGraph's recursion_limit stays as the last-resort backstop.
+
+# Turns one agent may take per user request, and turns of all agents together (PM included)
+MAX_AGENT_HOPS = int(os.getenv("MAX_AGENT_HOPS", "5"))
+MAX_SESSION_HOPS = int(os.getenv("MAX_SESSION_HOPS", "16"))
+# Estimated prompt + completion tokens of all agent calls per user request
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "60000"))
+SESSION_TIME_BUDGET_SECONDS = float(os.getenv("SESSION_TIME_BUDGET_SECONDS", "300"))
+# Two outputs of one agent whose 64-bit simhashes differ in at most this many bits count as a repeat
+LOOP_SIMILARITY_BITS = int(os.getenv("LOOP_SIMILARITY_BITS", "3"))
+
+# --- Speculative Dispatch Settings ---
+# Opt-in: the PM also lists its upcoming steps, and the next planned worker starts while the
+# current one runs; its answer is used only if the PM then routes to it (see src/graph/speculation.py).
+
+SPECULATIVE_DISPATCH = os.getenv("SPECULATIVE_DISPATCH", "off").lower() in ("1", "true", "yes", "on")
+# Workers that may run ahead. The default Developer-after-Architect step rarely depends on
+# the design details; a Tester run ahead of the Developer would have no code to test.
+SPECULATIVE_ROLES = tuple(r.strip() for r in os.getenv("SPECULATIVE_ROLES", "Developer").split(",") if r.strip())
+# Speculative calls in flight at once across sessions, and unclaimed results kept before the oldest is dropped
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "4"))
+SPECULATION_MAX_PENDING = int(os.getenv("SPECULATION_MAX_PENDING", "64"))
+
+# --- Service Settings ---
+# Long-running HTTP service (run_server.py, src/service.py)
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+# Sessions run at once; further requests wait up to SERVICE_QUEUE_TIMEOUT_SECONDS, then get a 503
+SERVICE_MAX_SESSIONS = int(os.getenv("SERVICE_MAX_SESSIONS", "16"))
+SERVICE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("SERVICE_QUEUE_TIMEOUT_SECONDS", "30"))
+# Threads kept by the in-memory checkpointer (used without CHECKPOINT_DB_PATH); the least
+# recently used thread is dropped beyond this
+SERVICE_MAX_THREADS = int(os.getenv("SERVICE_MAX_THREADS", "1000"))
+# Memory extraction calls arriving within this window are sent as one batched call (0 disables).
+# Off for the single-session entry points; the service uses SERVICE_BATCH_WINDOW_MS instead.
+EXTRACTION_BATCH_WINDOW_MS = float(os.getenv("EXTRACTION_BATCH_WINDOW_MS", "0"))
+SERVICE_BATCH_WINDOW_MS = float(os.getenv("SERVICE_BATCH_WINDOW_MS", "10"))
+EXTRACTION_BATCH_MAX = int(os.getenv("EXTRACTION_BATCH_MAX", "8"))
+
+# --- Code Execution Settings ---
+# Python blocks written by the Developer are run in sandboxed subprocesses (see src/sandbox.py)
+
+# Run Developer code after each Developer turn ("on"); off by default, since the sandbox is
+# not a security boundary and only contains crashes and runaway code (see src/sandbox.py)
+CODE_EXECUTION_ENABLED = os.getenv("CODE_EXECUTION", "off").lower() in ("1", "true", "yes", "on")
+# Wall-clock limit per process, and CPU seconds / address space the process may use
+CODE_EXECUTION_TIMEOUT_SECONDS = float(os.getenv("CODE_EXECUTION_TIMEOUT_SECONDS", "10"))
+CODE_EXECUTION_CPU_SECONDS = float(os.getenv("CODE_EXECUTION_CPU_SECONDS", "5"))
+CODE_EXECUTION_MEMORY_MB = int(os.getenv("CODE_EXECUTION_MEMORY_MB", "512"))
+# Processes run at once, across all sessions
+CODE_EXECUTION_WORKERS = int(os.getenv("CODE_EXECUTION_WORKERS", "4"))
+# Failed runs sent straight back to the Developer before the PM takes over again
+CODE_EXECUTION_MAX_AUTO_FIXES = int(os.getenv("CODE_EXECUTION_MAX_AUTO_FIXES", "2"))
+
+# --- Observability Settings ---
+
+# Root log level for run_app/run_eval; node and routing chatter is logged at DEBUG/INFO
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")
+# Record node/LLM counters and histograms for every session (see src/instrumentation.py)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+# Directory for per-session JSONL trace files; unset disables them
+TRACE_DIR = os.getenv("TRACE_DIR") or None
+# Where run_app writes the metrics after a run (*.prom for Prometheus text, JSON otherwise)
+METRICS_PATH = os.getenv("METRICS_PATH") or None
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from .tokens import estimate_tokens
+
+# --- Offline Scripted Chat Model ---
+# Selected with LLM_BACKEND=fake (see llm_config). Answers every role in the graph with
+# plausible scripted output so the whole workflow can run, be profiled and load-tested
+# without network access or API keys.
+
+# Order in which the scripted PM walks through the team
+SCRIPTED_PLAN = ["Architect", "Developer", "Tester", "FINISH"]
+
+# Worker outputs are tagged so the scripted PM can tell who spoke last
+ROLE_TAG_PATTERN = re.compile(r"^\[(Architect|Developer|Tester)\]")
+
+FILLER_WORDS = ("the", "module", "returns", "value", "input", "handles", "case", "and", "checks", "result")
+
+class FakeRateLimitError(Exception):
+    """Injected provider rate limit (HTTP 429), shaped like the provider SDK errors."""
+
+    status_code = 429
+
+    def __init__(self, message: str = "Rate limit reached (injected by the fake backend)", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def detect_role(messages: List[BaseMessage]) -> str:
+    """Infers which prompt is being answered from the leading system message."""
+    first = messages[0] if messages else None
+    if first is None or first.type != "system" or not isinstance(first.content, str):
+        return "default"
+    system_text = first.content.lower()
+    if system_text.startswith("you are a project manager"):
+        return "pm"
+    if system_text.startswith("you are the software architect"):
+        return "architect"
+    if system_text.startswith("you are the software developer"):
+        return "developer"
+    if system_text.startswith("you are the software tester"):
+        return "tester"
+    if "information extraction" in system_text:
+        return "batch_extractor" if "json array" in system_text else "extractor"
+    if "summary" in system_text:
+        return "summary"
+    return "default"
+
+def _next_scripted_step(messages: List[BaseMessage], revise: bool = False) -> str:
+    """Returns the PM's next step: the plan entry after the last worker that spoke.
+
+    With revise, a first Architect turn is sent back to the Architect instead.
+    """
+    for message in reversed(messages):
+        if message.type == "ai" and isinstance(message.content, str):
+            match = ROLE_TAG_PATTERN.match(message.content)
+            if match:
+                if revise and match.group(1) == "Architect":
+                    design_turns = sum(1 for m in messages if m.type == "ai" and str(m.content).startswith("[Architect]"))
+                    if design_turns == 1:
+                        return "Architect"
+                return SCRIPTED_PLAN[SCRIPTED_PLAN.index(match.group(1)) + 1]
+    return SCRIPTED_PLAN[0]
+
+class ScriptedChatModel(BaseChatModel):
+    """Local chat model with scripted (or replayed) answers and configurable latency/length.
+
+    Latency is drawn from a normal distribution around latency_mean (seconds, truncated
+    at 0) and paid before the first token; streaming then pays token_latency per token.
+    Output length in tokens is drawn around tokens_mean. Responses can be replayed from
+    a JSONL file of {"role": ..., "content": ...} records, falling back to the script
+    once a role's recorded responses run out. A share error_rate of calls fails
+    with FakeRateLimitError (after the latency) to exercise rate limiting and retries.
+    A share plan_miss_rate of PM decisions after a first Architect turn ask for a
+    revision, deviating from the plan the PM announced.
+    """
+
+    model_name: str = "fake-scripted"
+    latency_mean: float = 0.0
+    latency_jitter: float = 0.0
+    token_latency: float = 0.0
+    tokens_mean: int = 60
+    tokens_jitter: int = 0
+    seed: Optional[int] = None
+    replay_path: Optional[str] = None
+    error_rate: float = 0.0
+    plan_miss_rate: float = 0.0
+
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr()
+    _replay: Dict[str, List[str]] = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+        self._replay = {}
+        if self.replay_path:
+            with open(self.replay_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._replay.setdefault(record["role"], []).append(record["content"])
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-scripted"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    # --- Sampling ---
+
+    def _sample_latency(self) -> float:
+        with self._rng_lock:
+            return max(0.0, self._rng.gauss(self.latency_mean, self.latency_jitter))
+
+    def _sample_tokens(self) -> int:
+        with self._rng_lock:
+            return max(1, int(self._rng.gauss(self.tokens_mean, self.tokens_jitter)))
+
+    def _maybe_fail(self):
+        with self._rng_lock:
+            failed = self.error_rate and self._rng.random() < self.error_rate
+        if failed:
+            raise FakeRateLimitError()
+
+    def _padding(self, tokens: int) -> str:
+        """Filler prose of roughly the given token count."""
+        words = []
+        with self._rng_lock:
+            for _ in range(tokens):
+                words.append(self._rng.choice(FILLER_WORDS))
+        return " ".join(words)
+
+    # --- Responses ---
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        """Builds the response text for the detected role."""
+        role = detect_role(messages)
+        with self._rng_lock:
+            replayed = self._replay.get(role)
+            if replayed:
+                return replayed.pop(0)
+
+        padding = self._padding(self._sample_tokens())
+        if role == "pm":
+            with self._rng_lock:
+                revise = bool(self.plan_miss_rate) and self._rng.random() < self.plan_miss_rate
+            next_step = _next_scripted_step(messages, revise)
+            decision = {"next_agent": next_step, "instruction": f"{next_step}: {padding}"}
+            if '"plan"' in messages[0].content:
+                # Speculative mode asks for the upcoming steps as well
+                upcoming = SCRIPTED_PLAN[SCRIPTED_PLAN.index(next_step) + 1:]
+                decision["plan"] = [{"next_agent": step, "instruction": f"{step}: continue the task."} for step in upcoming]
+            return json.dumps(decision)
+        if role == "architect":
+            return f"[Architect] Design: a single module exposing add(a, b). {padding}"
+        if role == "developer":
+            return (f"[Developer] Implementation:\n```python\ndef add(a, b):\n    return a + b\n```\n"
+                    f"Tests:\n```python\ndef test_add():\n    assert add(2, 3) == 5\n```\n{padding}")
+        if role == "tester":
+            return f"[Tester] All tests pass for add(a, b). {padding}"
+        if role == "extractor":
+            return "{}"
+        if role == "batch_extractor":
+            batch = json.loads(messages[-1].content)
+            return json.dumps([{"id": item["id"], "details": {}} for item in batch])
+        if role == "summary":
+            return f"Summary of the work so far: {padding}"
+        return f"OK. {padding}"
+
+    def _message(self, messages: List[BaseMessage], content: str, chunk: bool = False):
+        """Wraps content in an AI message (or chunk) with estimated token usage."""
+        input_tokens = sum(estimate_tokens(m.content if isinstance(m.content, str) else str(m.content)) for m in messages)
+        output_tokens = estimate_tokens(content)
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        cls = AIMessageChunk if chunk else AIMessage
+        return cls(content=content, usage_metadata=usage, response_metadata={"model_name": self.model_name})
+
+    def _split_tokens(self, content: str) -> List[str]:
+        """Splits content into ~token-sized pieces for streaming."""
+        return re.findall(r"\S+\s*|\s+", content) or [content]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._sample_latency())
+        self._maybe_fail()
+        content = self._respond(messages)
+        time.sleep(self.token_latency * len(self._split_tokens(content)))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, content))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._sample_latency())
+        self._maybe_fail()
+        content = self._respond(messages)
+        await asyncio.sleep(self.token_latency * len(self._split_tokens(content)))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, content))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._sample_latency())
+        self._maybe_fail()
+        content = self._respond(messages)
+        pieces = self._split_tokens(content)
+        for index, piece in enumerate(pieces):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            # Usage is reported once, on the last chunk
+            if index == len(pieces) - 1:
+                message = self._message(messages, content, chunk=True)
+                message.content = piece
+            else:
+                message = AIMessageChunk(content=piece)
+            chunk = ChatGenerationChunk(message=message)
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._sample_latency())
+        self._maybe_fail()
+        content = self._respond(messages)
+        pieces = self._split_tokens(content)
+        for index, piece in enumerate(pieces):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            if index == len(pieces) - 1:
+                message = self._message(messages, content, chunk=True)
+                message.content = piece
+            else:
+                message = AIMessageChunk(content=piece)
+            chunk = ChatGenerationChunk(message=message)
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
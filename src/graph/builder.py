@@ -1,5 +1,11 @@
-from langgraph.graph import StateGraph, END
+import logging
+import threading
+from typing import Optional
+from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableLambda
 from ..state import AgentState
+from ..config import CHECKPOINT_DB_PATH
+from .checkpoints import get_checkpointer
 
 # Import agent nodes
 from ..agents.project_manager import project_manager_node
@@ -8,32 +14,54 @@ from ..agents.developer import developer_node
 from ..agents.tester import tester_node
 
 # Import special nodes
-from .nodes import memory_extraction_node, summary_node
+from .nodes import memory_extraction_node, amemory_extraction_node, summary_node, asummary_node, code_execution_node, acode_execution_node, termination_node
 
 # Import routing functions
-from .routing import route_from_project_manager, route_to_summary_or_pm
+from .routing import route_from_project_manager, route_to_summary_or_pm, route_after_developer, route_after_execution
 
-def build_graph():
-    """Builds and compiles the LangGraph workflow."""
+logger = logging.getLogger(__name__)
+
+def build_graph(parallel_extraction: bool = True, checkpointer=None):
+    """Builds and compiles the LangGraph workflow.
+
+    Every node has a sync and an async implementation, so the compiled app
+    supports both invoke/stream and ainvoke/astream.
+
+    With parallel_extraction (the default) MemoryExtractor runs as a side branch
+    next to ProjectManager instead of in front of it, since the PM prompt does
+    not read user_info. Pass False to get the original serial wiring.
+
+    A checkpointer (e.g. from checkpoints.create_checkpointer) persists state
+    per thread id so sessions can be followed up, resumed and replayed.
+    """
     workflow = StateGraph(AgentState)
 
     # Add nodes
-    print("Building Graph: Adding nodes...")
-    workflow.add_node("MemoryExtractor", memory_extraction_node)
+    logger.debug("Building Graph: Adding nodes...")
+    workflow.add_node("MemoryExtractor", RunnableLambda(memory_extraction_node, afunc=amemory_extraction_node))
     workflow.add_node("ProjectManager", project_manager_node)
     workflow.add_node("Architect", architect_node)
     workflow.add_node("Developer", developer_node)
     workflow.add_node("Tester", tester_node)
-    workflow.add_node("Summary", summary_node)
+    workflow.add_node("Summary", RunnableLambda(summary_node, afunc=asummary_node))
+    workflow.add_node("CodeExecutor", RunnableLambda(code_execution_node, afunc=acode_execution_node))
+    workflow.add_node("Terminate", RunnableLambda(termination_node))
 
-    # Set entry point
-    workflow.set_entry_point("MemoryExtractor")
-    print("Building Graph: Entry point set to MemoryExtractor.")
+    # Set entry point(s) and extractor edges
+    if parallel_extraction:
+        workflow.add_edge(START, "MemoryExtractor")
+        workflow.add_edge(START, "ProjectManager")
+        workflow.add_edge("MemoryExtractor", END) # Branch ends once user_info is merged
+        logger.debug("Building Graph: Entry points set to MemoryExtractor and ProjectManager (parallel).")
+    else:
+        workflow.set_entry_point("MemoryExtractor")
+        workflow.add_edge("MemoryExtractor", "ProjectManager")
+        logger.debug("Building Graph: Entry point set to MemoryExtractor.")
 
     # Add edges
-    print("Building Graph: Adding edges...")
-    workflow.add_edge("MemoryExtractor", "ProjectManager")
+    logger.debug("Building Graph: Adding edges...")
     workflow.add_edge("Summary", "ProjectManager") # Summary node goes back to PM
+    workflow.add_edge("Terminate", END) # Loop/budget guard stop
 
     # Add conditional edge from Project Manager
     workflow.add_conditional_edges(
@@ -43,35 +71,82 @@ def build_graph():
             "Architect": "Architect",
             "Developer": "Developer",
             "Tester": "Tester",
+            "Terminate": "Terminate",
             END: END
         }
     )
-    print("Building Graph: Added conditional edges from ProjectManager.")
+    logger.debug("Building Graph: Added conditional edges from ProjectManager.")
 
     # Add conditional edges for Summary check
     # These route from the worker agents (Arch, Dev, Test) to either Summary or PM
     workflow.add_conditional_edges(
         "Architect",
         route_to_summary_or_pm,
-        {"Summary": "Summary", "ProjectManager": "ProjectManager"}
+        {"Summary": "Summary", "ProjectManager": "ProjectManager", "Terminate": "Terminate", END: END}
     )
     workflow.add_conditional_edges(
         "Developer",
-        route_to_summary_or_pm,
-        {"Summary": "Summary", "ProjectManager": "ProjectManager"}
+        route_after_developer,
+        {"CodeExecutor": "CodeExecutor", "Summary": "Summary", "ProjectManager": "ProjectManager", "Terminate": "Terminate", END: END}
+    )
+    # Code runs go back to the Developer on failure, otherwise on to the summary check / PM
+    workflow.add_conditional_edges(
+        "CodeExecutor",
+        route_after_execution,
+        {"Developer": "Developer", "Summary": "Summary", "ProjectManager": "ProjectManager", "Terminate": "Terminate", END: END}
     )
     workflow.add_conditional_edges(
         "Tester",
         route_to_summary_or_pm,
-        {"Summary": "Summary", "ProjectManager": "ProjectManager"}
+        {"Summary": "Summary", "ProjectManager": "ProjectManager", "Terminate": "Terminate", END: END}
     )
-    print("Building Graph: Added conditional edges for summary check.")
+    logger.debug("Building Graph: Added conditional edges for summary check.")
 
     # Compile the graph
-    print("Building Graph: Compiling...")
-    app = workflow.compile()
-    print("Building Graph: Compilation complete.")
+    logger.debug("Building Graph: Compiling...")
+    app = workflow.compile(checkpointer=checkpointer)
+    logger.info("Building Graph: Compilation complete.")
+    return app
+
+# --- Compiled App Factory ---
+# Graphs are compiled on first use rather than at import time.
+
+_apps = {}
+_apps_lock = threading.Lock()
+
+def get_app(config: Optional[dict] = None):
+    """Returns a compiled graph for the given build options, compiling it once per option set.
+
+    Options (all optional):
+        parallel_extraction: run MemoryExtractor beside ProjectManager (default True)
+        checkpoint_db_path: SQLite checkpoint file (default CHECKPOINT_DB_PATH, None disables)
+        async: the app will be driven with ainvoke/astream. The sync SqliteSaver cannot
+            serve those, so async apps are compiled without the SQLite checkpointer
+            (pass an AsyncSqliteSaver to build_graph for async checkpointing).
+    """
+    config = config or {}
+    parallel_extraction = config.get("parallel_extraction", True)
+    checkpoint_db_path = config.get("checkpoint_db_path", CHECKPOINT_DB_PATH)
+    if config.get("async") and checkpoint_db_path:
+        logger.warning("Async runs are not checkpointed: the SQLite checkpointer at %s only serves sync runs.",
+                       checkpoint_db_path)
+        checkpoint_db_path = None
+    key = (parallel_extraction, checkpoint_db_path)
+    app = _apps.get(key)
+    if app is None:
+        with _apps_lock:
+            app = _apps.get(key)
+            if app is None:
+                checkpointer = get_checkpointer(checkpoint_db_path) if checkpoint_db_path else None
+                app = _apps[key] = build_graph(parallel_extraction=parallel_extraction, checkpointer=checkpointer)
     return app
 
-# Compile the app when this module is imported
-compiled_app = build_graph() 
\ No newline at end of file
+def __getattr__(name: str):
+    # Lazy module attributes kept for existing `from src.graph.builder import compiled_app` imports
+    if name == "compiled_app":
+        return get_app()
+    if name == "compiled_async_app":
+        return get_app({"async": True})
+    if name == "checkpointer":
+        return get_checkpointer(CHECKPOINT_DB_PATH) if CHECKPOINT_DB_PATH else None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
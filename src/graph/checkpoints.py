@@ -0,0 +1,95 @@
+import functools
+import sqlite3
+from typing import List, Optional
+from ..config import CHECKPOINT_KEEP_LAST
+
+# --- Checkpoint Helpers ---
+# Local SQLite checkpointing: sessions are keyed by thread id, can be resumed after a
+# failure and replayed from any earlier checkpoint without re-running completed nodes.
+
+def create_checkpointer(path: str) -> "SqliteSaver":
+    """Opens (or creates) a SQLite checkpoint database at path."""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    conn = sqlite3.connect(path, check_same_thread=False)
+    saver = SqliteSaver(conn)
+    saver.setup()
+    return saver
+
+@functools.lru_cache(maxsize=None)
+def get_checkpointer(path: str) -> "SqliteSaver":
+    """Returns the shared checkpointer for a database path, opening it on first use."""
+    return create_checkpointer(path)
+
+def thread_config(thread_id: str, checkpoint_id: Optional[str] = None, base_config: Optional[dict] = None) -> dict:
+    """Builds a run config addressing a thread (and optionally one of its checkpoints)."""
+    config = dict(base_config or {})
+    configurable = {**config.get("configurable", {}), "thread_id": thread_id}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    config["configurable"] = configurable
+    return config
+
+def list_checkpoints(app, thread_id: str) -> List[dict]:
+    """Lists a thread's checkpoints, newest first, with their step and pending nodes."""
+    return [
+        {
+            "checkpoint_id": snapshot.config["configurable"]["checkpoint_id"],
+            "step": snapshot.metadata.get("step") if snapshot.metadata else None,
+            "next": list(snapshot.next),
+        }
+        for snapshot in app.get_state_history(thread_config(thread_id))
+    ]
+
+def prune_checkpoints(saver, keep_last: int = CHECKPOINT_KEEP_LAST, thread_id: Optional[str] = None) -> int:
+    """Deletes all but the newest keep_last checkpoints (and their writes) per thread.
+
+    Works on the SQLite checkpointer and on an InMemorySaver; other savers are left alone.
+    Checkpoint ids are time-ordered, so ordering by id keeps the most recent ones.
+    Returns the number of checkpoints deleted.
+    """
+    from langgraph.checkpoint.memory import InMemorySaver
+    if isinstance(saver, InMemorySaver):
+        return _prune_memory_checkpoints(saver, keep_last, thread_id)
+    if not hasattr(saver, "cursor"):
+        return 0
+    with saver.cursor() as cur:
+        if thread_id is None:
+            thread_ids = [row[0] for row in cur.execute("SELECT DISTINCT thread_id FROM checkpoints").fetchall()]
+        else:
+            thread_ids = [thread_id]
+        deleted = 0
+        for tid in thread_ids:
+            stale = cur.execute(
+                "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (tid, keep_last),
+            ).fetchall()
+            for checkpoint_ns, checkpoint_id in stale:
+                params = (tid, checkpoint_ns, checkpoint_id)
+                cur.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params)
+                cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params)
+            deleted += len(stale)
+    return deleted
+
+def _prune_memory_checkpoints(saver: "InMemorySaver", keep_last: int, thread_id: Optional[str]) -> int:
+    """prune_checkpoints for an InMemorySaver, which also holds channel values per version."""
+    deleted = 0
+    for tid in [thread_id] if thread_id is not None else list(saver.storage):
+        for checkpoint_ns, checkpoints in list(saver.storage.get(tid, {}).items()):
+            stale = sorted(checkpoints, reverse=True)[keep_last:]
+            if not stale:
+                continue
+            for checkpoint_id in stale:
+                del checkpoints[checkpoint_id]
+                saver.writes.pop((tid, checkpoint_ns, checkpoint_id), None)
+            deleted += len(stale)
+            # Drop the channel values no remaining checkpoint of the namespace refers to
+            live = {
+                (channel, version)
+                for serialized, _, _ in checkpoints.values()
+                for channel, version in saver.serde.loads_typed(serialized)["channel_versions"].items()
+            }
+            for key in list(saver.blobs):
+                if key[:2] == (tid, checkpoint_ns) and key[2:] not in live:
+                    del saver.blobs[key]
+    return deleted
@@ -1,107 +1,282 @@
 from ..state import AgentState
-# Import the utility LLM for extraction
-from ..llm_config import utility_llm, llm
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+# Import the utility LLM for extraction (resolved on first use)
+from ..llm_config import get_utility_llm, get_summary_llm
+from ..config import SUMMARY_TOKEN_THRESHOLD, SUMMARY_KEEP_LAST, DEFAULT_USER_ID
+from ..tokens import count_message_tokens
+from ..rate_limit import LLMUnavailableError
+from ..sandbox import extract_python_blocks, execute_code, aexecute_code, format_report
+from .batching import get_extraction_batcher
+from .speculation import discard as discard_speculation
+from ..memory_store import get_memory_store, normalize_facts, split_sentences, memory_stats
+from ..instrumentation import metrics
+from ..json_extract import extract_json
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from langchain_core.prompts import ChatPromptTemplate
-import json # Import json for parsing potentially structured output
+import asyncio
+import logging
+import re
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 # --- Special Node Definitions ---
+# Each node has a sync and an async (a-prefixed) variant sharing the same pre/post-processing.
 
-def memory_extraction_node(state: AgentState):
-    """Extracts user information from the latest message using an LLM call and updates state."""
-    print("---\nEXTRACTING MEMORY")
+extraction_prompt = ChatPromptTemplate.from_messages([
+    # Escape the literal curly braces for the example empty JSON object
+    ("system", "You are an information extraction assistant. Extract key details about the user (name, preferences, location, explicit requests, etc.) from the following message. Output the extracted information as a JSON object. If no specific user details are mentioned, return an empty JSON object {{}}."),
+    ("human", "{user_message}")
+])
+
+EXTRACTION_SCHEMA = {"type": "object"}
+
+def get_extraction_chain():
+    """Extraction prompt piped into the utility_llm, which is used for this task."""
+    return extraction_prompt | get_utility_llm()
+
+# Cheap pre-filter: only messages with first-person or preference cues are worth an extraction call
+MEMORY_CUE_PATTERN = re.compile(
+    r"\b(i|i'm|im|i've|i'd|i'll|me|my|mine|myself|we|our|ours|us|"
+    r"prefer|preferred|preference|favou?rite|love|hate|dislike|"
+    r"call me|name is|live in|based in|work at|work for)\b",
+    re.IGNORECASE,
+)
+
+def has_memory_cues(text: str) -> bool:
+    """Returns True if the text contains first-person or preference cues worth extracting."""
+    return bool(MEMORY_CUE_PATTERN.search(text or ""))
+
+def _extraction_input(state: AgentState):
+    """Returns (user_id, sentences) to extract user details from, or None if there is nothing new.
+
+    Only sentences with memory cues are considered, and the memory store drops the
+    ones already extracted for this user, so known facts never reach the LLM.
+    """
+    logger.debug("EXTRACTING MEMORY")
     # Ensure messages exist and are not empty
     if not state.get('messages'):
-        print("Memory Extractor: No messages in state to process.")
-        return {}
-    
+        logger.debug("Memory Extractor: No messages in state to process.")
+        return None
+
     last_message = state['messages'][-1]
     # Only extract from HumanMessage for now
-    if isinstance(last_message, HumanMessage):
-        try:
-            extraction_prompt = ChatPromptTemplate.from_messages([
-                # Escape the literal curly braces for the example empty JSON object
-                ("system", "You are an information extraction assistant. Extract key details about the user (name, preferences, location, explicit requests, etc.) from the following message. Output the extracted information as a JSON object. If no specific user details are mentioned, return an empty JSON object {{}}."),
-                ("human", "{user_message}")
-            ])
-            
-            # Use the utility_llm for this task
-            extraction_chain = extraction_prompt | utility_llm 
-            extracted_data_str = extraction_chain.invoke({"user_message": last_message.content}).content
-            
-            print(f"Raw Extracted Data String: {extracted_data_str}")
-            
-            # Attempt to parse the JSON output
-            try:
-                # Clean potential markdown code fences
-                if extracted_data_str.startswith("```json"):
-                     extracted_data_str = extracted_data_str[7:-3].strip()
-                elif extracted_data_str.startswith("```"):
-                     extracted_data_str = extracted_data_str[3:-3].strip()
-                
-                extracted_data = json.loads(extracted_data_str)
-                if not isinstance(extracted_data, dict):
-                     print("Extraction Error: Parsed data is not a dictionary.")
-                     extracted_data = {} # Default to empty dict if not a dict
-                     
-            except json.JSONDecodeError as json_e:
-                print(f"Extraction JSON Parsing Error: {json_e}")
-                # Keep the raw string if parsing fails? Or return empty?
-                extracted_data = {"raw_extraction": extracted_data_str} # Store raw if parsing fails
-                
-            print(f"Parsed Extracted Data: {extracted_data}")
-            
-            # Merge with existing user_info if necessary (simple overwrite here)
-            current_info = state.get('user_info', {})
-            # Only update if extracted_data is a dict
-            if isinstance(extracted_data, dict):
-                 current_info.update(extracted_data)
-                 return {"user_info": current_info}
-            else:
-                 # If extraction didn't yield a dict, return no update to user_info
-                 return {}
-                 
-        except Exception as e:
-            print(f"Error during memory extraction LLM call: {e}")
-            return {}
-            
-    return {} # Return empty dict if no extraction or not a human message
+    if not isinstance(last_message, HumanMessage):
+        return None
+    sentences = [s for s in split_sentences(last_message.content) if has_memory_cues(s)]
+    if not sentences:
+        logger.debug("Memory Extractor: No first-person or preference cues, skipping extraction.")
+        return None
+    user_id = state.get("user_id") or DEFAULT_USER_ID
+    sentences = get_memory_store().unseen_sentences(user_id, sentences)
+    if not sentences:
+        logger.debug("Memory Extractor: All cue sentences already extracted for %s, skipping.", user_id)
+        return None
+    return user_id, sentences
 
-def summary_node(state: AgentState):
-    """Checks message length and summarizes if it exceeds the threshold."""
-    print("---\nCHECKING MESSAGE LENGTH FOR SUMMARY")
+def _apply_extraction(extracted_data_str: str, user_id: str, sentences: list):
+    """Parses the extractor output, stores the facts and returns the user_info state update."""
+    logger.debug("Raw Extracted Data String: %s", extracted_data_str)
+
+    # The first complete JSON object in the output, wherever fences or prose put it
+    extracted_data = extract_json(extracted_data_str, EXTRACTION_SCHEMA, repair=False)
+    if extracted_data is None:
+        # Unparseable or cut-off output may have lost facts; the sentences stay unseen for a later retry
+        logger.warning("Extraction Error: No complete JSON object in the extractor output.")
+        return {}
+
+    logger.debug("Parsed Extracted Data: %s", extracted_data)
+    store = get_memory_store()
+    profile, changed = store.merge(user_id, normalize_facts(extracted_data))
+    store.mark_seen(user_id, sentences)
+    if not changed:
+        return {}
+    # A new dict: the state's user_info is shared with checkpoints and must not be mutated
+    return {"user_info": profile}
+
+def _extract(user_message: str) -> str:
+    batcher = get_extraction_batcher()
+    if batcher is not None:
+        return batcher.submit(user_message)
+    return get_extraction_chain().invoke({"user_message": user_message}).content
+
+async def _aextract(user_message: str) -> str:
+    batcher = get_extraction_batcher()
+    if batcher is not None:
+        return await asyncio.wrap_future(batcher.submit_future(user_message))
+    return (await get_extraction_chain().ainvoke({"user_message": user_message})).content
+
+def memory_extraction_node(state: AgentState):
+    """Extracts new user facts from the latest message using an LLM call and updates state."""
+    extraction = _extraction_input(state)
+    if extraction is None:
+        return {} # Return empty dict if no extraction or not a human message
+    user_id, sentences = extraction
+    memory_stats["extraction_calls"] += 1
+    try:
+        return _apply_extraction(_extract(" ".join(sentences)), user_id, sentences)
+    except Exception as e:
+        logger.warning("Error during memory extraction LLM call: %s", e)
+        return {}
+
+async def amemory_extraction_node(state: AgentState):
+    """Async variant of memory_extraction_node."""
+    extraction = _extraction_input(state)
+    if extraction is None:
+        return {}
+    user_id, sentences = extraction
+    memory_stats["extraction_calls"] += 1
+    try:
+        return _apply_extraction(await _aextract(" ".join(sentences)), user_id, sentences)
+    except Exception as e:
+        logger.warning("Error during memory extraction LLM call: %s", e)
+        return {}
+
+def needs_summary(messages) -> bool:
+    """Returns True if the message log is over the token threshold and has messages to fold."""
+    return len(messages) > SUMMARY_KEEP_LAST and count_message_tokens(messages) > SUMMARY_TOKEN_THRESHOLD
+
+def _prepare_summary(state: AgentState):
+    """Returns (summary prompt messages, messages to keep) or None if no summary is needed."""
+    logger.debug("CHECKING MESSAGE LENGTH FOR SUMMARY")
     # Ensure messages exist
     messages = state.get('messages', [])
     if not messages:
-        print("Summary Node: No messages in state to summarize.")
+        logger.debug("Summary Node: No messages in state to summarize.")
+        return None
+
+    if not needs_summary(messages):
+        logger.debug("Message log within threshold (%d tokens). No summary needed.", SUMMARY_TOKEN_THRESHOLD)
+        return None
+
+    # Keep the first message if it's a System prompt, plus the last K messages verbatim
+    first_message = messages[0] if isinstance(messages[0], SystemMessage) else None
+    foldable = messages[1:] if first_message else messages
+    to_fold = foldable[:-SUMMARY_KEEP_LAST] if SUMMARY_KEEP_LAST else foldable
+    kept = foldable[len(to_fold):]
+    logger.info("Folding %d messages into the running summary, keeping the last %d.", len(to_fold), len(kept))
+
+    # Only the messages since the last summary are sent, alongside the previous summary
+    previous_summary = state.get('summary') or "(no summary yet)"
+    summary_prompt_messages = [
+        SystemMessage(content="You maintain a running summary of a software team's conversation. Update the summary with the new messages, keeping the key tasks, decisions, code and outcomes concise."),
+        HumanMessage(content=f"Current summary:\n{previous_summary}\n\nNew messages:\n" + "\n".join([f"{type(m).__name__}: {m.content}" for m in to_fold]))
+    ]
+    # Replace the log with the optional system prompt and the verbatim tail
+    new_messages = ([first_message] if first_message else []) + kept
+    return summary_prompt_messages, new_messages
+
+def _apply_summary(summary: AIMessage, new_messages: list):
+    """Builds the state update replacing the folded messages with the new running summary."""
+    logger.debug("Summary: %s", summary.content)
+    return {
+        "summary": summary.content,
+        "messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + new_messages,
+    }
+
+def summary_node(state: AgentState):
+    """Folds older messages into the running summary once the log exceeds the token threshold."""
+    prepared = _prepare_summary(state)
+    if prepared is None:
+        return {}
+    summary_prompt_messages, new_messages = prepared
+    # Using the configured summary model (utility_llm by default)
+    try:
+        summary = get_summary_llm().invoke(summary_prompt_messages)
+    except LLMUnavailableError as e:
+        # Keep the full log; the next summary check retries the fold
+        logger.warning("Summary skipped: %s", e)
+        return {}
+    return _apply_summary(summary, new_messages)
+
+async def asummary_node(state: AgentState):
+    """Async variant of summary_node."""
+    prepared = _prepare_summary(state)
+    if prepared is None:
         return {}
-        
-    message_count = len(messages)
-    summary_threshold = 25 # Configurable threshold
-
-    if message_count > summary_threshold:
-        print(f"Message count ({message_count}) exceeds threshold ({summary_threshold}). Summarizing.")
-        # Keep the first message if it's a System prompt
-        first_message = messages[0] if messages and isinstance(messages[0], SystemMessage) else None
-        
-        summary_prompt_messages = [
-            SystemMessage(content="Summarize the following conversation history concisely, capturing the key tasks, decisions, and outcomes."),
-            # Maybe include user info? state.get('user_info', {})
-            HumanMessage(content="\n".join([f"{type(m).__name__}: {m.content}" for m in messages]))
-        ]
-        
-        # Using llm imported from llm_config
-        summary_chain = ChatPromptTemplate.from_messages(summary_prompt_messages) | llm
-        summary = summary_chain.invoke({})
-        
-        print(f"Summary: {summary.content}")
-        
-        # Construct new message list with potential system prompt and the summary
-        new_messages = [summary] # Summary is an AIMessage
-        if first_message:
-            new_messages.insert(0, first_message)
-            
-        return {"messages": new_messages}
+    summary_prompt_messages, new_messages = prepared
+    try:
+        summary = await get_summary_llm().ainvoke(summary_prompt_messages)
+    except LLMUnavailableError as e:
+        logger.warning("Summary skipped: %s", e)
+        return {}
+    return _apply_summary(summary, new_messages)
+
+def _execution_input(state: AgentState):
+    """Returns the (solution, test) Python blocks of the latest Developer message, or None."""
+    messages = state.get('messages', [])
+    if not messages or not isinstance(messages[-1].content, str):
+        return None
+    solution, tests = extract_python_blocks(messages[-1].content)
+    if not solution and not tests:
+        logger.debug("Code Executor: No Python code blocks in the last message.")
+        return None
+    return solution, tests
+
+def _apply_execution(state: AgentState, report: dict):
+    """Stores the report and posts its summary, counting consecutive failed runs in "attempt"."""
+    previous = state.get("execution") or {}
+    if report["status"] != "failed":
+        report["attempt"] = 0
+    elif previous.get("status") == "failed":
+        report["attempt"] = previous.get("attempt", 0) + 1
     else:
-        print(f"Message count ({message_count}) is within threshold. No summary needed.")
-        return {} # No change to state 
\ No newline at end of file
+        report["attempt"] = 1
+    return {"execution": report, "messages": [AIMessage(content=format_report(report))]}
+
+def code_execution_node(state: AgentState):
+    """Runs the Developer's latest Python blocks (and any tests among them) in sandboxed processes."""
+    blocks = _execution_input(state)
+    if blocks is None:
+        return {}
+    return _apply_execution(state, execute_code(*blocks))
+
+async def acode_execution_node(state: AgentState):
+    """Async variant of code_execution_node."""
+    blocks = _execution_input(state)
+    if blocks is None:
+        return {}
+    return _apply_execution(state, await aexecute_code(*blocks))
+
+def best_result(messages) -> Optional[AIMessage]:
+    """The most useful worker output so far: the latest code that passed execution, else the
+    latest output with code, else the latest worker output (PM decisions are skipped)."""
+    from .routing import parse_pm_decision
+    passed_after = False
+    latest_code = latest_output = None
+    for message in reversed(messages):
+        if not isinstance(message, AIMessage) or not isinstance(message.content, str):
+            continue
+        if message.content.startswith("[CodeExecutor]"):
+            passed_after = message.content.startswith("[CodeExecutor] Execution PASSED")
+            continue
+        if parse_pm_decision(message.content) is not None:
+            continue
+        if "```" in message.content:
+            if passed_after:
+                return message
+            latest_code = latest_code or message
+        latest_output = latest_output or message
+    return latest_code or latest_output
+
+def termination_node(state: AgentState):
+    """Ends a turn stopped by the loop/budget guard with the best result so far and the reason."""
+    from .routing import guard_reason, pending_route # routing imports this module
+    if state.get("speculation"):
+        discard_speculation(state["speculation"]["id"])
+    reason = guard_reason(state, pending_route(state)) or {"reason": "guard", "detail": "stopped by the loop/budget guard"}
+    budget = state.get("budget") or {}
+    termination = {
+        **reason,
+        "hops": dict(budget.get("hops", {})),
+        "tokens": budget.get("tokens", 0),
+        "elapsed_s": round(time.time() - budget["started_at"], 3) if budget.get("started_at") else None,
+    }
+    metrics.inc("session_terminations_total", reason=reason["reason"])
+    logger.warning("Stopping early (%s): %s", reason["reason"], reason["detail"])
+
+    best = best_result(state.get('messages', []))
+    header = f"[Stopped early: {reason['detail']}]"
+    content = f"{header} Best result so far:\n\n{best.content}" if best else f"{header} No result was produced."
+    return {"termination": termination, "speculation": None, "messages": [AIMessage(content=content)]}
@@ -1,48 +1,249 @@
+from collections import Counter, deque
+import hashlib
+import logging
+import re
+import time
+from typing import Optional
 from langgraph.graph import END
 from ..state import AgentState
 from langchain_core.messages import AIMessage
+from .nodes import needs_summary
+from ..sandbox import extract_python_blocks
+from ..config import (
+    CODE_EXECUTION_ENABLED, CODE_EXECUTION_MAX_AUTO_FIXES, MAX_AGENT_HOPS, MAX_SESSION_HOPS,
+    SESSION_TOKEN_BUDGET, SESSION_TIME_BUDGET_SECONDS, LOOP_SIMILARITY_BITS,
+)
+from ..tokens import estimate_tokens
+from ..instrumentation import metrics
+from ..json_extract import extract_json
+
+logger = logging.getLogger(__name__)
 
 # --- Routing Logic Definitions ---
 
+# Valid values of the PM's "next_agent" field (lower-cased) and the node each one routes to
+PM_ROUTES = {
+    "architect": "Architect",
+    "developer": "Developer",
+    "tester": "Tester",
+    "finish": END,
+}
+
+PM_DECISION_SCHEMA = {
+    "type": "object",
+    "required": ["next_agent"],
+    "properties": {"next_agent": {"type": "string"}},
+}
+
+# Fallback for PM messages without a valid decision: explicit role names only (no generic
+# words like "code" or "test"), and the earliest mention wins
+FALLBACK_ROUTE_PATTERN = re.compile(r"\b(architect|developer|tester|finish|finished|done|complete)\b", re.IGNORECASE)
+
+# Worker roles whose outputs are fingerprinted for loop detection
+WORKER_ROLES = ("Architect", "Developer", "Tester")
+SHINGLE_WORDS = 3
+
+# Counters of how PM decisions were resolved: structured, fallback, misparse, unroutable, error, guard
+routing_stats = Counter()
+# Most recent routing decisions, for measuring wasted hops
+routing_log = deque(maxlen=1000)
+
+def parse_pm_decision(content: str) -> Optional[dict]:
+    """Parses the PM's {"next_agent", "instruction"} JSON decision; returns None if missing or invalid.
+
+    The optional "plan" of upcoming steps (asked for in speculative mode) is returned as a
+    list of {"next_agent", "instruction"} steps in the same form; invalid steps are dropped.
+    """
+    if not isinstance(content, str):
+        return None
+    # Tolerates prose and code fences around the object; a cut-off instruction is dropped
+    decision = extract_json(content, PM_DECISION_SCHEMA)
+    if decision is None or decision["next_agent"].strip().lower() not in PM_ROUTES:
+        return None
+    next_agent = decision["next_agent"]
+    instruction = decision.get("instruction", "")
+    return {
+        "next_agent": next_agent.strip().lower(),
+        "instruction": instruction if isinstance(instruction, str) else str(instruction),
+        "plan": _parse_plan(decision.get("plan")),
+    }
+
+def _parse_plan(plan) -> list:
+    """Valid steps of a PM plan, given as agent names or {"next_agent", "instruction"} objects."""
+    steps = []
+    for step in plan if isinstance(plan, list) else []:
+        if isinstance(step, str):
+            step = {"next_agent": step}
+        agent = step.get("next_agent") if isinstance(step, dict) else None
+        if isinstance(agent, str) and agent.strip().lower() in PM_ROUTES:
+            instruction = step.get("instruction", "")
+            steps.append({"next_agent": agent.strip().lower(), "instruction": instruction if isinstance(instruction, str) else str(instruction)})
+    return steps
+
+def _fallback_route(content: str) -> Optional[str]:
+    """Routes on the first explicit role name or finish keyword in free text."""
+    match = FALLBACK_ROUTE_PATTERN.search(content or "")
+    if not match:
+        return None
+    word = match.group(1).lower()
+    return PM_ROUTES.get(word, END)
+
+def _record_route(route: str, source: str, instruction: str = ""):
+    """Counts and logs a routing decision."""
+    routing_stats[source] += 1
+    routing_log.append({"route": route, "source": source, "instruction": instruction})
+    metrics.inc("routing_decisions_total", route=route, source=source)
+    logger.info("Routing: PM -> %s (%s)", route, source)
+
+def get_routing_stats() -> dict:
+    """Returns routing decision counters, including the share of decisions that needed the fallback."""
+    stats = dict(routing_stats)
+    total = routing_stats["structured"] + routing_stats["fallback"] + routing_stats["unroutable"]
+    stats["fallback_rate"] = (routing_stats["fallback"] + routing_stats["unroutable"]) / total if total else 0.0
+    return stats
+
+metrics.register_collector("routing", get_routing_stats)
+
+# --- Loop and Budget Guard ---
+# Agent nodes report every turn into state["budget"] (record_agent_turn); the routers
+# check it (guard_reason) before handing work to the next agent and send the run to the
+# Terminate node, which ends it with the best result so far and the reason.
+
+def fingerprint(text: str) -> int:
+    """64-bit simhash of the text's word 3-shingles; near-identical texts differ in few bits."""
+    words = re.findall(r"\w+", (text or "").lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def record_agent_turn(state: AgentState, role: str, response, prompt_tokens: int) -> dict:
+    """Budget update for one agent turn: a hop, its tokens and, for workers, a fingerprint.
+
+    Tokens come from the response's usage metadata, or are estimated from the prompt
+    and the output. "repeated" names the role if its output is near-identical to one
+    of its earlier outputs in this turn of the session.
+    """
+    role = role or "agent"
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    usage = getattr(response, "usage_metadata", None) or {}
+    update = {
+        "hops": {role: 1},
+        "tokens": usage.get("total_tokens") or prompt_tokens + estimate_tokens(content),
+        "last_agent": role,
+        "repeated": None,
+    }
+    if role in WORKER_ROLES:
+        value = fingerprint(content)
+        earlier = [h for agent, h in (state.get("budget") or {}).get("fingerprints", []) if agent == role]
+        if any(bin(value ^ h).count("1") <= LOOP_SIMILARITY_BITS for h in earlier):
+            update["repeated"] = role
+        update["fingerprints"] = [[role, value]]
+    return update
+
+def guard_reason(state: AgentState, next_agent: Optional[str] = None) -> Optional[dict]:
+    """Returns {"reason", "detail"} if the run must stop before next_agent's turn, else None."""
+    budget = state.get("budget") or {}
+    hops = budget.get("hops", {})
+    if budget.get("repeated"):
+        return {"reason": "repeated_output", "detail": f"{budget['repeated']} repeated an earlier output"}
+    if SESSION_TOKEN_BUDGET and budget.get("tokens", 0) >= SESSION_TOKEN_BUDGET:
+        return {"reason": "token_budget", "detail": f"{budget['tokens']} tokens used (budget {SESSION_TOKEN_BUDGET})"}
+    started = budget.get("started_at")
+    if SESSION_TIME_BUDGET_SECONDS and started and time.time() - started >= SESSION_TIME_BUDGET_SECONDS:
+        return {"reason": "time_budget", "detail": f"{time.time() - started:.0f} s elapsed (budget {SESSION_TIME_BUDGET_SECONDS:g} s)"}
+    if MAX_SESSION_HOPS and sum(hops.values()) >= MAX_SESSION_HOPS:
+        return {"reason": "session_hop_limit", "detail": f"{sum(hops.values())} agent turns (limit {MAX_SESSION_HOPS})"}
+    if next_agent and MAX_AGENT_HOPS and hops.get(next_agent, 0) >= MAX_AGENT_HOPS:
+        return {"reason": "agent_hop_limit", "detail": f"{next_agent} already took {hops[next_agent]} turns (limit {MAX_AGENT_HOPS})"}
+    return None
+
+def pending_route(state: AgentState) -> Optional[str]:
+    """The agent the PM's latest decision routes to, if the PM spoke last."""
+    messages = state.get('messages', [])
+    if (state.get("budget") or {}).get("last_agent") != "ProjectManager" or not messages:
+        return None
+    decision = parse_pm_decision(messages[-1].content)
+    route = PM_ROUTES[decision["next_agent"]] if decision else _fallback_route(messages[-1].content)
+    return route if route != END else None
+
 def route_from_project_manager(state: AgentState):
-    """Routes from ProjectManager to other agents or END."""
+    """Routes from ProjectManager to other agents or END using the PM's structured decision."""
+    if state.get("error"):
+        _record_route(END, "error")
+        return END
     # Ensure messages exist
     messages = state.get('messages', [])
     if not messages:
-        print("Routing Error: No messages in state to route from Project Manager.")
+        logger.warning("Routing Error: No messages in state to route from Project Manager.")
         return END # Default to end if state is unexpected
         
     last_message = messages[-1]
-    # Assuming the PM's response clearly indicates the next step
-    # Simple routing based on keywords in the PM's message
-    if isinstance(last_message, AIMessage): # PM is an AI agent
-        content = last_message.content.lower()
-        if "architect" in content:
-            print("Routing: PM -> Architect")
-            return "Architect"
-        elif "developer" in content or "code" in content or "implement" in content:
-            print("Routing: PM -> Developer")
-            return "Developer"
-        elif "tester" in content or "test" in content:
-            print("Routing: PM -> Tester")
-            return "Tester"
-        elif "finish" in content or "complete" in content or "done" in content:
-            print("Routing: PM -> END")
+    if not isinstance(last_message, AIMessage): # PM is an AI agent
+        _record_route(END, "unroutable")
+        return END
+
+    decision = parse_pm_decision(last_message.content)
+    if decision is not None:
+        route, source = PM_ROUTES[decision["next_agent"]], "structured"
+    else:
+        # Misparsed decision: one bounded keyword pass, then END
+        routing_stats["misparse"] += 1
+        route, source = _fallback_route(last_message.content), "fallback"
+        if route is None:
+            _record_route(END, "unroutable")
             return END
-            
-    # Default or fallback if no clear routing instruction or not an AIMessage
-    print("Routing: PM -> END (Default/Fallback)")
-    return END 
+
+    if route != END:
+        reason = guard_reason(state, route)
+        if reason:
+            _record_route("Terminate", "guard", reason["detail"])
+            return "Terminate"
+    _record_route(route, source, decision["instruction"] if decision else "")
+    return route
 
 def route_to_summary_or_pm(state: AgentState):
-    """Routes to Summary node if message count exceeds threshold, otherwise to ProjectManager."""
+    """Routes to Summary node if the message log exceeds the token threshold, otherwise to ProjectManager.
+
+    Ends the run instead if the worker recorded an error, or sends it to Terminate
+    if the loop/budget guard trips.
+    """
+    if state.get("error"):
+        logger.info("Routing: -> END (%s error in %s)", state["error"].get("type"), state["error"].get("node"))
+        return END
+    reason = guard_reason(state)
+    if reason:
+        logger.info("Routing: -> Terminate (%s)", reason["detail"])
+        return "Terminate"
     messages = state.get('messages', [])
-    message_count = len(messages)
-    summary_threshold = 25 # Must match the threshold in summary_node
     
-    if message_count > summary_threshold:
-        print(f"Routing: -> Summary (Count: {message_count})")
+    if needs_summary(messages):
+        logger.info("Routing: -> Summary (Count: %d)", len(messages))
         return "Summary"
     else:
-        print(f"Routing: -> ProjectManager (Count: {message_count})")
-        return "ProjectManager" 
\ No newline at end of file
+        logger.debug("Routing: -> ProjectManager (Count: %d)", len(messages))
+        return "ProjectManager"
+
+def route_after_developer(state: AgentState):
+    """Routes Developer output with Python code blocks to CodeExecutor, everything else as usual."""
+    messages = state.get('messages', [])
+    if CODE_EXECUTION_ENABLED and not state.get("error") and not guard_reason(state) and messages and isinstance(messages[-1].content, str):
+        solution, tests = extract_python_blocks(messages[-1].content)
+        if solution or tests:
+            logger.debug("Routing: Developer -> CodeExecutor (%d code, %d test blocks)", len(solution), len(tests))
+            return "CodeExecutor"
+    return route_to_summary_or_pm(state)
+
+def route_after_execution(state: AgentState):
+    """Sends failed code straight back to the Developer (up to CODE_EXECUTION_MAX_AUTO_FIXES
+    times in a row) without a PM or Tester turn; passing code continues to the PM."""
+    execution = state.get("execution") or {}
+    if (execution.get("status") == "failed" and execution.get("attempt", 0) <= CODE_EXECUTION_MAX_AUTO_FIXES
+            and not guard_reason(state, "Developer")):
+        logger.info("Routing: CodeExecutor -> Developer (failed run %d of %d)", execution["attempt"], CODE_EXECUTION_MAX_AUTO_FIXES)
+        metrics.inc("routing_decisions_total", route="Developer", source="execution")
+        return "Developer"
+    return route_to_summary_or_pm(state)
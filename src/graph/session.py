@@ -0,0 +1,233 @@
+import inspect
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple, Union
+from langchain_core.messages import HumanMessage
+from ..state import AgentState
+from .builder import get_app
+from .checkpoints import prune_checkpoints, thread_config
+from .nodes import best_result
+from .routing import parse_pm_decision
+from .trace import TraceIndex, AGENT_NODES
+from ..instrumentation import instrument_config
+from ..rate_limit import retry_budget
+from ..config import LLM_SESSION_RETRY_BUDGET, DEFAULT_USER_ID, CHECKPOINT_KEEP_LAST
+from ..memory_store import get_memory_store
+
+# --- Session Execution Helpers ---
+
+logger = logging.getLogger(__name__)
+
+# Default run config shared by the CLI and the evaluation runner
+DEFAULT_RUN_CONFIG = {"recursion_limit": 50}
+
+# Pseudo node name used by iter_session for the final accumulated state
+FINAL_STATE = "__final__"
+
+# Event kinds yielded by iter_session_events
+TOKEN_EVENT = "token"
+UPDATE_EVENT = "update"
+FINAL_EVENT = "final"
+
+def create_initial_state(user_input: str, follow_up: bool = False, user_id: Optional[str] = None) -> AgentState:
+    """Builds the initial graph state for a single user request.
+
+    user_info starts from the facts the memory store already holds for user_id
+    (DEFAULT_USER_ID if unset, meant for single-user entry points), and every turn
+    gets a fresh budget and cleared error/termination. Only the new message is sent,
+    so on a checkpointed thread (follow_up) the stored history is kept; follow_up no
+    longer changes the keys sent and is kept for existing callers.
+    """
+    user_id = user_id or DEFAULT_USER_ID
+    turn = {
+        "user_id": user_id,
+        "user_info": get_memory_store().profile(user_id),
+        "budget": {"started_at": time.time()},
+        "termination": None,
+        "speculation": None,
+        "error": None,
+    }
+    return {"messages": [HumanMessage(content=user_input)], **turn}
+
+def session_config(thread_id: Optional[str] = None, checkpoint_id: Optional[str] = None) -> dict:
+    """Returns the default run config, addressing a checkpointed thread if thread_id is given."""
+    if thread_id is None:
+        return dict(DEFAULT_RUN_CONFIG)
+    return thread_config(thread_id, checkpoint_id, DEFAULT_RUN_CONFIG)
+
+def final_reply(final_state: Optional[dict]) -> Optional[str]:
+    """The text to show the user for a finished turn, or None if the state has no messages.
+
+    A turn the PM closed ends on its JSON decision; the reply is then the decision's
+    closing instruction, or the best worker result if the instruction is empty.
+    """
+    messages = (final_state or {}).get("messages") or []
+    if not messages:
+        return None
+    content = messages[-1].content
+    if not isinstance(content, str):
+        return str(content)
+    decision = parse_pm_decision(content)
+    if decision is None:
+        return content
+    if decision["instruction"].strip():
+        return decision["instruction"]
+    best = best_result(messages)
+    return best.content if best is not None else None
+
+def _with_thread(app, config: dict) -> dict:
+    """The run config, on a new thread if the app is checkpointed and config names no thread."""
+    if app.checkpointer is None or (config.get("configurable") or {}).get("thread_id"):
+        return config
+    thread_id = str(uuid.uuid4())
+    logger.info("Running on new checkpoint thread %s", thread_id)
+    return thread_config(thread_id, base_config=config)
+
+def _prune_thread(app, config: dict):
+    """Trims the session's thread to its newest CHECKPOINT_KEEP_LAST checkpoints."""
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    if thread_id is not None and app.checkpointer is not None:
+        prune_checkpoints(app.checkpointer, CHECKPOINT_KEEP_LAST, thread_id)
+
+def _token_delta(chunk, token_nodes) -> Optional[Tuple[str, str]]:
+    """Returns (node_name, text) for a "messages" stream chunk from one of token_nodes."""
+    message, metadata = chunk
+    node_name = (metadata or {}).get("langgraph_node")
+    content = getattr(message, "content", None)
+    if node_name in token_nodes and isinstance(content, str) and content:
+        return node_name, content
+    return None
+
+def iter_session_events(initial_state: AgentState, config: Optional[dict] = None, app=None,
+                        tokens: bool = False, token_nodes=AGENT_NODES) -> Iterator[Tuple[str, str, Any]]:
+    """Runs the graph once, yielding (kind, node_name, payload) events.
+
+    kind is TOKEN_EVENT for a text delta streamed by a model inside one of
+    token_nodes (only with tokens=True), UPDATE_EVENT for a node's state update,
+    and FINAL_EVENT (node_name FINAL_STATE) once for the final state. Model calls
+    made during the run share a budget of LLM_SESSION_RETRY_BUDGET retries. A
+    checkpointed thread is pruned to its newest CHECKPOINT_KEEP_LAST checkpoints afterwards;
+    on a checkpointed app, a config without a thread_id runs on a new thread.
+    """
+    app = app or get_app()
+    config = instrument_config(_with_thread(app, config or DEFAULT_RUN_CONFIG))
+    stream_mode = ["messages", "updates", "values"] if tokens else ["updates", "values"]
+    final_state = None
+    with retry_budget(LLM_SESSION_RETRY_BUDGET):
+        for mode, chunk in app.stream(initial_state, config, stream_mode=stream_mode):
+            if mode == "values":
+                final_state = chunk
+            elif mode == "updates":
+                for node_name, update in chunk.items():
+                    yield UPDATE_EVENT, node_name, update
+            else:
+                delta = _token_delta(chunk, token_nodes)
+                if delta:
+                    yield TOKEN_EVENT, delta[0], delta[1]
+    _prune_thread(app, config)
+    yield FINAL_EVENT, FINAL_STATE, final_state
+
+def iter_session(initial_state: AgentState, config: Optional[dict] = None, app=None) -> Iterator[Tuple[str, dict]]:
+    """Runs the graph once, yielding (node_name, update) per node and finally (FINAL_STATE, state).
+
+    Node updates and full state snapshots come from the same stream, so the
+    final state is exactly the one produced by the streamed run.
+    """
+    for _, node_name, payload in iter_session_events(initial_state, config, app):
+        yield node_name, payload
+
+def iter_session_tokens(initial_state: AgentState, config: Optional[dict] = None, app=None,
+                        token_nodes=AGENT_NODES) -> Iterator[Tuple[str, str]]:
+    """Runs the graph once, yielding (node_name, delta) for every streamed model token."""
+    for kind, node_name, payload in iter_session_events(initial_state, config, app, tokens=True, token_nodes=token_nodes):
+        if kind == TOKEN_EVENT:
+            yield node_name, payload
+
+def run_session(initial_state: AgentState, config: Optional[dict] = None,
+                on_event: Optional[Callable[[str, dict], None]] = None, app=None,
+                trace: Optional[TraceIndex] = None,
+                on_token: Optional[Callable[[str, str], None]] = None) -> AgentState:
+    """Runs the graph once and returns the final state, calling on_event(node_name, update) per node.
+
+    Pass a TraceIndex as trace to have every node update recorded into it, and
+    on_token(node_name, delta) to receive agent output token by token as it streams.
+    """
+    final_state = None
+    events = iter_session_events(initial_state, config, app, tokens=on_token is not None)
+    for kind, node_name, payload in events:
+        if kind == FINAL_EVENT:
+            final_state = payload
+        elif kind == TOKEN_EVENT:
+            on_token(node_name, payload)
+        else:
+            if trace is not None:
+                trace.record(node_name, payload)
+            if on_event:
+                on_event(node_name, payload)
+    return final_state
+
+def resume_session(thread_id: str, checkpoint_id: Optional[str] = None,
+                   on_event: Optional[Callable[[str, dict], None]] = None, app=None) -> AgentState:
+    """Continues a checkpointed thread from its latest (or the given) checkpoint.
+
+    After a failure this re-runs only the nodes that had not completed; with a
+    checkpoint_id it replays from that step, reusing every earlier node output.
+    """
+    return run_session(None, session_config(thread_id, checkpoint_id), on_event, app)
+
+async def aiter_session_events(initial_state: AgentState, config: Optional[dict] = None, app=None,
+                               tokens: bool = False, token_nodes=AGENT_NODES) -> AsyncIterator[Tuple[str, str, Any]]:
+    """Async variant of iter_session_events, driving the graph with astream."""
+    app = app or get_app({"async": True})
+    config = instrument_config(_with_thread(app, config or DEFAULT_RUN_CONFIG))
+    stream_mode = ["messages", "updates", "values"] if tokens else ["updates", "values"]
+    final_state = None
+    with retry_budget(LLM_SESSION_RETRY_BUDGET):
+        async for mode, chunk in app.astream(initial_state, config, stream_mode=stream_mode):
+            if mode == "values":
+                final_state = chunk
+            elif mode == "updates":
+                for node_name, update in chunk.items():
+                    yield UPDATE_EVENT, node_name, update
+            else:
+                delta = _token_delta(chunk, token_nodes)
+                if delta:
+                    yield TOKEN_EVENT, delta[0], delta[1]
+    _prune_thread(app, config)
+    yield FINAL_EVENT, FINAL_STATE, final_state
+
+async def aiter_session(initial_state: AgentState, config: Optional[dict] = None, app=None) -> AsyncIterator[Tuple[str, dict]]:
+    """Async variant of iter_session, driving the graph with astream."""
+    async for _, node_name, payload in aiter_session_events(initial_state, config, app):
+        yield node_name, payload
+
+async def aiter_session_tokens(initial_state: AgentState, config: Optional[dict] = None, app=None,
+                               token_nodes=AGENT_NODES) -> AsyncIterator[Tuple[str, str]]:
+    """Async variant of iter_session_tokens."""
+    async for kind, node_name, payload in aiter_session_events(initial_state, config, app, tokens=True, token_nodes=token_nodes):
+        if kind == TOKEN_EVENT:
+            yield node_name, payload
+
+async def _maybe_await(result):
+    if inspect.isawaitable(result):
+        await result
+
+async def arun_session(initial_state: AgentState, config: Optional[dict] = None,
+                       on_event: Optional[Callable[[str, dict], Union[None, Awaitable[None]]]] = None, app=None,
+                       trace: Optional[TraceIndex] = None,
+                       on_token: Optional[Callable[[str, str], Union[None, Awaitable[None]]]] = None) -> AgentState:
+    """Async variant of run_session; on_event and on_token may be plain functions or coroutine functions."""
+    final_state = None
+    events = aiter_session_events(initial_state, config, app, tokens=on_token is not None)
+    async for kind, node_name, payload in events:
+        if kind == FINAL_EVENT:
+            final_state = payload
+        elif kind == TOKEN_EVENT:
+            await _maybe_await(on_token(node_name, payload))
+        else:
+            if trace is not None:
+                trace.record(node_name, payload)
+            if on_event:
+                await _maybe_await(on_event(node_name, payload))
+    return final_state
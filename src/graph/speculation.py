@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+from ..config import SPECULATION_WORKERS, SPECULATION_MAX_PENDING
+from ..tokens import estimate_tokens
+from ..instrumentation import metrics
+
+# --- Speculative Dispatch ---
+# With SPECULATIVE_DISPATCH on, the PM's decision also carries its plan of upcoming steps.
+# When it hands work to one worker, the next planned worker (if in SPECULATIVE_ROLES) is
+# started here at once, on the conversation as it stands plus a hand-off in the PM's
+# format, so it runs beside the current worker instead of after it. The run is recorded in
+# state["speculation"]; if the PM's next decision routes to that worker, its node uses the
+# speculative answer instead of calling the model, otherwise the answer is discarded.
+# Like batched extraction, speculative calls run outside the session's graph callbacks, so
+# their tokens are accounted here rather than in the traces.
+
+logger = logging.getLogger(__name__)
+
+# Counters: launched, kept, discarded, cancelled (dropped before starting), failed,
+# kept_tokens, wasted_tokens, saved_seconds (kept call time overlapped with other work),
+# wasted_seconds (call time of discarded runs)
+speculation_stats = Counter()
+
+def get_speculation_stats() -> dict:
+    """Returns the speculation counters with the keep rate."""
+    stats = dict(speculation_stats)
+    settled = speculation_stats["kept"] + speculation_stats["discarded"] + speculation_stats["cancelled"]
+    stats["keep_rate"] = speculation_stats["kept"] / settled if settled else 0.0
+    return stats
+
+metrics.register_collector("speculation", get_speculation_stats)
+
+class Speculation:
+    """One speculative worker call and its timing."""
+
+    def __init__(self, role: str, future, prompt_tokens: int):
+        self.role = role
+        self.future = future
+        self.prompt_tokens = prompt_tokens
+        self.started = time.perf_counter()
+        self.finished = None
+        future.add_done_callback(self._finish)
+
+    def _finish(self, future):
+        self.finished = time.perf_counter()
+
+    def tokens(self, response) -> int:
+        usage = getattr(response, "usage_metadata", None) or {}
+        content = response.content if isinstance(response.content, str) else str(response.content)
+        return usage.get("total_tokens") or self.prompt_tokens + estimate_tokens(content)
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pending: "OrderedDict[str, Speculation]" = OrderedDict()
+_lock = threading.Lock()
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+    return _pool
+
+def launch(role: str, call: Callable[[], object], prompt_tokens: int) -> str:
+    """Starts call() on the speculation pool and returns the id to claim or discard it by.
+
+    The call runs in a copy of the caller's context, so it draws on the session's retry budget.
+    """
+    context = contextvars.copy_context()
+    speculation_id = str(uuid.uuid4())
+    with _lock:
+        speculation = Speculation(role, _get_pool().submit(context.run, call), prompt_tokens)
+        _pending[speculation_id] = speculation
+        # Runs whose session ended without settling them (e.g. on an error) are dropped oldest first
+        overflow = len(_pending) - SPECULATION_MAX_PENDING
+        evicted = [_pending.popitem(last=False)[1] for _ in range(max(0, overflow))]
+    speculation_stats["launched"] += 1
+    for old in evicted:
+        _settle_discarded(old)
+    logger.debug("Speculation: started %s ahead of routing (%s)", role, speculation_id)
+    return speculation_id
+
+def _take(speculation_id: str) -> Optional[Speculation]:
+    with _lock:
+        return _pending.pop(speculation_id, None)
+
+def _kept(speculation: Speculation, claimed_at: float):
+    response = speculation.future.result()
+    # The part of the call that ran before its node needed it is time saved
+    speculation_stats["saved_seconds"] += min(claimed_at, speculation.finished or claimed_at) - speculation.started
+    speculation_stats["kept"] += 1
+    speculation_stats["kept_tokens"] += speculation.tokens(response)
+    return response, speculation.prompt_tokens
+
+def claim(speculation_id: str) -> Optional[Tuple[object, int]]:
+    """Waits for a speculative call and returns (response, prompt tokens), or None if the
+    run is unknown (dropped) or failed, in which case the caller makes the call itself."""
+    speculation = _take(speculation_id)
+    if speculation is None:
+        return None
+    claimed_at = time.perf_counter()
+    try:
+        speculation.future.result()
+    except Exception as e:
+        speculation_stats["failed"] += 1
+        logger.warning("Speculative %s call failed, running it again: %s", speculation.role, e)
+        return None
+    return _kept(speculation, claimed_at)
+
+async def aclaim(speculation_id: str) -> Optional[Tuple[object, int]]:
+    """Async variant of claim, awaiting the call instead of blocking on it."""
+    speculation = _take(speculation_id)
+    if speculation is None:
+        return None
+    claimed_at = time.perf_counter()
+    try:
+        await asyncio.wrap_future(speculation.future)
+    except Exception as e:
+        speculation_stats["failed"] += 1
+        logger.warning("Speculative %s call failed, running it again: %s", speculation.role, e)
+        return None
+    return _kept(speculation, claimed_at)
+
+def _settle_discarded(speculation: Speculation):
+    if speculation.future.cancel():
+        speculation_stats["cancelled"] += 1
+        return
+
+    def account(future):
+        # A call already under way cannot be recalled; its cost is counted once it ends
+        speculation_stats["discarded"] += 1
+        speculation_stats["wasted_seconds"] += (speculation.finished or time.perf_counter()) - speculation.started
+        if future.exception() is None:
+            speculation_stats["wasted_tokens"] += speculation.tokens(future.result())
+
+    speculation.future.add_done_callback(account)
+
+def discard(speculation_id: str):
+    """Drops a speculative run the routing did not take."""
+    speculation = _take(speculation_id)
+    if speculation is not None:
+        logger.debug("Speculation: discarded %s (%s)", speculation.role, speculation_id)
+        _settle_discarded(speculation)
@@ -0,0 +1,125 @@
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from langgraph.graph import END
+from .routing import PM_ROUTES, parse_pm_decision, _fallback_route
+
+# --- Per-Run Trace Index ---
+# Recorded from the node updates while a session runs (see run_session's `trace`), so
+# evaluators can look up node outputs, code blocks and routing decisions directly
+# instead of walking a run tree and re-scanning message text.
+
+# Nodes that do the team's work; MemoryExtractor, Summary, CodeExecutor and Terminate (no LLM) are bookkeeping
+AGENT_NODES = ("ProjectManager", "Architect", "Developer", "Tester")
+GRAPH_NODES = AGENT_NODES + ("MemoryExtractor", "Summary", "CodeExecutor", "Terminate")
+
+CODE_BLOCK_PATTERN = re.compile(r"```[\w+-]*\n(.*?)```", re.DOTALL)
+
+def _content_text(message) -> str:
+    """Text content of a message object or of its serialized dict form."""
+    if isinstance(message, dict):
+        content = message.get("content", message.get("kwargs", {}).get("content", ""))
+    else:
+        content = getattr(message, "content", message)
+    return content if isinstance(content, str) else str(content)
+
+class TraceIndex:
+    """Compact index of one run: hop order, text outputs and code blocks per node, PM routes.
+
+    hops lists node names in execution order; outputs and code_blocks map a node
+    name to its outputs in order; code_turns counts a node's outputs containing
+    code; pm_routes pairs the hop index of every PM turn with the route that turn
+    resolves to (a node name or END).
+    """
+
+    __slots__ = ("hops", "outputs", "code_blocks", "code_turns", "pm_routes")
+
+    def __init__(self):
+        self.hops: List[str] = []
+        self.outputs: Dict[str, List[str]] = {}
+        self.code_blocks: Dict[str, List[str]] = {}
+        self.code_turns: Dict[str, int] = {}
+        self.pm_routes: List[Tuple[int, str]] = []
+
+    def record(self, node_name: str, update: Optional[dict]):
+        """Adds one node update; matches run_session's on_event signature."""
+        self.hops.append(node_name)
+        messages = (update or {}).get("messages") or []
+        for message in messages:
+            if getattr(message, "type", None) == "remove":
+                continue
+            text = _content_text(message)
+            self.outputs.setdefault(node_name, []).append(text)
+            blocks = CODE_BLOCK_PATTERN.findall(text) if "```" in text else None
+            if blocks:
+                self.code_blocks.setdefault(node_name, []).extend(blocks)
+                self.code_turns[node_name] = self.code_turns.get(node_name, 0) + 1
+        if node_name == "ProjectManager" and messages:
+            text = _content_text(messages[-1])
+            decision = parse_pm_decision(text)
+            route = PM_ROUTES[decision["next_agent"]] if decision else (_fallback_route(text) or END)
+            self.pm_routes.append((len(self.hops) - 1, route))
+
+    @property
+    def agent_hops(self) -> List[str]:
+        """Hops of the agent nodes only, in order."""
+        return [hop for hop in self.hops if hop in AGENT_NODES]
+
+    def has_code(self, node_name: str = "Developer") -> bool:
+        return bool(self.code_blocks.get(node_name))
+
+    def to_dict(self) -> dict:
+        return {
+            "hops": self.hops,
+            "outputs": self.outputs,
+            "code_blocks": self.code_blocks,
+            "code_turns": self.code_turns,
+            "pm_routes": [[index, route] for index, route in self.pm_routes],
+        }
+
+    @classmethod
+    def from_run(cls, run) -> "TraceIndex":
+        """Builds an index from a run tree (e.g. a LangSmith Run) in one pass over its descendants."""
+        node_runs = []
+        queue = deque(run.child_runs or [])
+        visited = set()
+        while queue:
+            child = queue.popleft()
+            if child is None or child.id in visited:
+                continue
+            visited.add(child.id)
+            if child.name in GRAPH_NODES and isinstance(child.outputs, dict):
+                node_runs.append(child)
+            elif child.child_runs:
+                queue.extend(child.child_runs)
+        # Siblings are not guaranteed to be in execution order
+        if all(getattr(child, "start_time", None) for child in node_runs):
+            node_runs.sort(key=lambda child: child.start_time)
+        index = cls()
+        for child in node_runs:
+            index.record(child.name, child.outputs)
+        return index
+
+# Indexes built from run trees, for evaluators scoring the same run several times
+_index_cache: "OrderedDict[str, TraceIndex]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+INDEX_CACHE_SIZE = 1024
+
+def get_trace_index(run) -> TraceIndex:
+    """Returns the run's recorded index, or builds (and caches) one from its run tree."""
+    index = getattr(run, "trace_index", None)
+    if index is not None:
+        return index
+    key = str(run.id)
+    with _index_cache_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = TraceIndex.from_run(run)
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,334 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+
+from .config import LOG_LEVEL, METRICS_ENABLED, TRACE_DIR
+
+# --- Instrumentation ---
+# In-process counters and histograms for graph nodes and LLM calls, filled by a callback
+# handler attached to every session (see instrument_config), with Prometheus-text and JSON
+# dumps and optional per-session JSONL trace files.
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Conditional-edge functions whose output is a routing decision
+ROUTER_NAMES = ("route_from_project_manager", "route_to_summary_or_pm", "route_after_developer", "route_after_execution")
+
+METRIC_HELP = {
+    "node_duration_seconds": "Wall time of graph node runs.",
+    "node_queue_seconds": "Time a node waited between the previous node finishing (or the session starting) and starting.",
+    "node_runs_total": "Graph node runs by status.",
+    "llm_duration_seconds": "Wall time of LLM calls.",
+    "llm_calls_total": "LLM calls by status.",
+    "llm_tokens_total": "LLM tokens by direction (input/output).",
+    "llm_retries_total": "Retried LLM calls.",
+    "llm_provider_retries_total": "LLM provider calls retried by the rate limit layer, by error.",
+    "llm_queue_seconds": "Time LLM calls waited for a concurrency slot and rate limit capacity.",
+    "routing_decisions_total": "Routing decisions by route and source.",
+    "session_terminations_total": "Turns stopped early by the loop/budget guard, by reason.",
+    "http_requests_total": "HTTP requests to the service by method, path and status.",
+    "http_session_seconds": "Wall time of POST /sessions requests, queueing included.",
+    "code_executions_total": "Sandboxed runs of Developer code by status.",
+    "code_execution_seconds": "Wall time of sandboxed code runs, tests included.",
+    "sessions_total": "Graph sessions by status.",
+    "session_duration_seconds": "Wall time of whole graph sessions.",
+}
+
+def setup_logging(level: Optional[str] = None):
+    """Configures the root logger (LOG_LEVEL, WARNING by default, keeps node chatter off)."""
+    logging.basicConfig(
+        level=(level or LOG_LEVEL).upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+def _label_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(label_key, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in label_key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class MetricsRegistry:
+    """Thread-safe labeled counters and histograms, plus collectors for stats kept elsewhere.
+
+    Collectors are zero-argument functions returning a flat dict of numbers (e.g. the
+    LLM cache's stats()); they are read at dump time and exported as gauges.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def register_collector(self, name: str, collector: Callable[[], dict]):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def _collected(self) -> dict:
+        with self._lock:
+            collectors = dict(self._collectors)
+        collected = {}
+        for name, collector in collectors.items():
+            try:
+                collected[name] = {k: v for k, v in collector().items() if isinstance(v, (int, float))}
+            except Exception:
+                logger.exception("Metrics collector %s failed", name)
+        return collected
+
+    def to_json(self) -> dict:
+        """Snapshot of every series, as plain JSON-serializable data."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [{"labels": dict(key), "count": h.count, "sum": h.sum,
+                        "buckets": {("+Inf" if b == float("inf") else str(b)): c for b, c in h.cumulative()}}
+                       for key, h in series.items()]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms, "gauges": self._collected()}
+
+    def to_prometheus(self) -> str:
+        """Every series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    for bound, count in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        bucket_label = 'le="' + le + '"'
+                        lines.append(f"{name}_bucket{_format_labels(key, bucket_label)} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        for group, values in sorted(self._collected().items()):
+            for key, value in sorted(values.items()):
+                lines.append(f"# TYPE {group}_{key} gauge")
+                lines.append(f"{group}_{key} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Writes the metrics to path: Prometheus text for *.prom / *.txt, JSON otherwise."""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith((".prom", ".txt")):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=2)
+
+# Process-wide registry
+metrics = MetricsRegistry()
+
+class GraphInstrumentation(BaseCallbackHandler):
+    """Callback handler recording node and LLM metrics for one session.
+
+    Node queue time is the gap between the previous node finishing (or the session
+    starting) and the node starting, i.e. the graph's scheduling overhead. With a
+    trace_dir the session's events are also written to <trace_dir>/<session_id>.jsonl
+    when it ends.
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics, trace_dir: Optional[str] = None,
+                 session_id: Optional[str] = None):
+        self.registry = registry
+        self.trace_dir = trace_dir
+        self.session_id = session_id or uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._root_run = None
+        self._session_start = None
+        self._ready_at = None
+        self._nodes = {} # node run id -> (node, start)
+        self._routers = {} # router run id -> (node, router)
+        self._llms = {} # llm run id -> (node, model, start)
+        self._run_nodes = {} # any chain run id -> node, for retries
+        self._events = []
+
+    def _event(self, event: str, **fields):
+        if self.trace_dir is not None:
+            self._events.append({"t": round(time.perf_counter() - self._session_start, 6), "event": event, **fields})
+
+    # --- Graph nodes and routing ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        now = time.perf_counter()
+        name = kwargs.get("name")
+        node = (metadata or {}).get("langgraph_node")
+        with self._lock:
+            if parent_run_id is None and self._root_run is None:
+                self._root_run = run_id
+                self._session_start = self._ready_at = now
+                self._event("session_start")
+                return
+            if node:
+                self._run_nodes[run_id] = node
+            if node and name == node:
+                self._nodes[run_id] = (node, now)
+                self.registry.observe("node_queue_seconds", max(0.0, now - self._ready_at), node=node)
+                self._event("node_start", node=node)
+            elif name in ROUTER_NAMES:
+                self._routers[run_id] = (node, name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._chain_finished(run_id, "ok", outputs)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._chain_finished(run_id, "error", None, error)
+
+    def _chain_finished(self, run_id, status: str, outputs, error=None):
+        now = time.perf_counter()
+        with self._lock:
+            self._run_nodes.pop(run_id, None)
+            started = self._nodes.pop(run_id, None)
+            if started:
+                node, start = started
+                self._ready_at = now
+                self.registry.observe("node_duration_seconds", now - start, node=node)
+                self.registry.inc("node_runs_total", node=node, status=status)
+                self._event("node_end", node=node, status=status, duration=round(now - start, 6))
+                return
+            router = self._routers.pop(run_id, None)
+            if router:
+                node, name = router
+                self._event("route", node=node, router=name, route=outputs if isinstance(outputs, str) else None)
+                return
+            if run_id == self._root_run:
+                duration = now - self._session_start
+                self.registry.observe("session_duration_seconds", duration)
+                self.registry.inc("sessions_total", status=status)
+                self._event("session_end", status=status, duration=round(duration, 6),
+                            error=f"{type(error).__name__}: {error}" if error else None)
+                self._write_trace()
+
+    # --- LLM calls ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        with self._lock:
+            self._llms[run_id] = (metadata.get("langgraph_node", "none"), metadata.get("ls_model_name", "unknown"), time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        now = time.perf_counter()
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        with self._lock:
+            started = self._llms.pop(run_id, None)
+            if not started:
+                return
+            node, model, start = started
+            self.registry.observe("llm_duration_seconds", now - start, node=node, model=model)
+            self.registry.inc("llm_calls_total", node=node, model=model, status="ok")
+            self.registry.inc("llm_tokens_total", input_tokens, node=node, model=model, direction="input")
+            self.registry.inc("llm_tokens_total", output_tokens, node=node, model=model, direction="output")
+            self._event("llm_end", node=node, model=model, duration=round(now - start, 6),
+                        input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            started = self._llms.pop(run_id, None)
+            if started:
+                node, model, _ = started
+                self.registry.inc("llm_calls_total", node=node, model=model, status="error")
+                self._event("llm_error", node=node, model=model, error=f"{type(error).__name__}: {error}")
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        with self._lock:
+            node = self._run_nodes.get(run_id, "none")
+            self.registry.inc("llm_retries_total", node=node)
+            self._event("retry", node=node, attempt=getattr(retry_state, "attempt_number", None))
+
+    def _write_trace(self):
+        """Writes the buffered events as JSONL (lock held)."""
+        if self.trace_dir is None:
+            return
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(os.path.join(self.trace_dir, f"{self.session_id}.jsonl"), "w", encoding="utf-8") as f:
+                for event in self._events:
+                    f.write(json.dumps(event, default=str) + "\n")
+        except OSError:
+            logger.exception("Could not write session trace %s", self.session_id)
+
+def instrument_config(config: dict, session_id: Optional[str] = None) -> dict:
+    """Returns a copy of a run config with a GraphInstrumentation handler attached.
+
+    Leaves the config unchanged when both METRICS_ENABLED and TRACE_DIR are off. The
+    session id defaults to the config's thread_id, so trace files line up with threads.
+    """
+    if not METRICS_ENABLED and not TRACE_DIR:
+        return config
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    handler = GraphInstrumentation(trace_dir=TRACE_DIR, session_id=session_id or (f"{thread_id}-{uuid.uuid4().hex[:8]}" if thread_id else None))
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    else:
+        callbacks = list(callbacks) + [handler]
+    return {**config, "callbacks": callbacks}
@@ -0,0 +1,248 @@
+import json
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+from .instrumentation import metrics
+
+# --- Tolerant JSON Extraction ---
+# Structured LLM outputs (memory extraction, PM routing decisions, batched extraction,
+# sandbox test results) rarely arrive as bare JSON: they come wrapped in code fences,
+# surrounded by prose, or cut off by a token limit or a killed process. Instead of
+# re-prompting, the first balanced JSON object/array that parses and matches the
+# caller's schema is taken from the text; a truncated one is closed after dropping its
+# incomplete trailing member. The scanner is incremental, so it can be fed a stream
+# chunk by chunk and reports the value as soon as it is complete.
+
+OPENERS = {"{": "}", "[": "]"}
+# Characters that matter outside and inside JSON strings
+STRUCTURE_PATTERN = re.compile(r'[{}\[\]"]')
+STRING_PATTERN = re.compile(r'["\\]')
+# A number (or its sign/exponent) at the very end of a truncated value may be cut short
+NUMBER_TAIL_PATTERN = re.compile(r"(\d|\d[eE]|[-+.])$")
+
+# Trailing members dropped while repairing one truncated value, and truncated values
+# tried per text (bounds the work on prose full of unbalanced braces)
+MAX_REPAIR_CUTS = 32
+MAX_REPAIR_CANDIDATES = 4
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "null": type(None),
+}
+
+# Counters of how values were obtained: direct (whole text was JSON), extracted (from
+# fences/prose), repaired (truncated), failed
+parse_stats = Counter()
+metrics.register_collector("json_parsing", lambda: dict(parse_stats))
+
+def _is_type(value, name: str) -> bool:
+    if name in ("number", "integer") and isinstance(value, bool):
+        return False
+    return isinstance(value, JSON_TYPES[name])
+
+def matches_schema(value, schema: Optional[dict]) -> bool:
+    """Checks value against a JSON Schema subset: type, enum, required, properties and items."""
+    if not schema:
+        return True
+    expected = schema.get("type")
+    if expected is not None:
+        names = expected if isinstance(expected, list) else [expected]
+        if not any(_is_type(value, name) for name in names):
+            return False
+    if "enum" in schema and value not in schema["enum"]:
+        return False
+    if isinstance(value, dict):
+        if any(key not in value for key in schema.get("required", ())):
+            return False
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value and not matches_schema(value[key], sub_schema):
+                return False
+    if isinstance(value, list) and "items" in schema:
+        return all(matches_schema(item, schema["items"]) for item in value)
+    return True
+
+def _scan_state(text: str) -> Optional[Tuple[List[Tuple[str, int]], bool]]:
+    """(pending (closer, opener position) pairs, ends inside a string) of a fragment
+    starting with an opener, or None if its brackets do not match."""
+    stack, in_string, pos = [], False, 0
+    while True:
+        match = (STRING_PATTERN if in_string else STRUCTURE_PATTERN).search(text, pos)
+        if not match:
+            return stack, in_string
+        char, pos = match.group(), match.end()
+        if in_string:
+            if char == "\\":
+                pos += 1
+            else:
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in OPENERS:
+            stack.append((OPENERS[char], match.start()))
+        elif not stack or stack.pop()[0] != char:
+            return None
+
+def _repair(fragment: str, schema: Optional[dict]):
+    """Closes a truncated value, dropping incomplete trailing members until it parses and
+    matches the schema. Returns (value,) or None.
+
+    A member is incomplete if the text ends inside it: in a string, in a number that may
+    have continued, or inside a nested object/array. Only the outermost value is closed,
+    so no cut-off string, number or container ends up in the result.
+    """
+    end = len(fragment)
+    for _ in range(MAX_REPAIR_CUTS):
+        state = _scan_state(fragment[:end])
+        if state is None:
+            return None
+        stack, in_string = state
+        if len(stack) > 1:
+            # Drop the open nested value with the rest of its member
+            end = stack[1][1]
+            continue
+        cut_short = end == len(fragment) and NUMBER_TAIL_PATTERN.search(fragment)
+        if stack and not in_string and not cut_short:
+            try:
+                value = json.loads(fragment[:end].rstrip().rstrip(",") + stack[0][0])
+            except ValueError:
+                pass
+            else:
+                if matches_schema(value, schema):
+                    return (value,)
+        # Cut back to the previous member separator, or to just after an opener
+        comma = fragment.rfind(",", 1, end)
+        opener = max(fragment.rfind("{", 0, end - 1), fragment.rfind("[", 0, end - 1))
+        if opener >= 0 and opener + 1 > comma:
+            end = opener + 1
+        elif comma > 0:
+            end = comma
+        else:
+            return None
+    return None
+
+class JSONStreamParser:
+    """Finds the first balanced JSON object or array matching a schema in streamed text.
+
+    feed(chunk) returns the value once it is complete (None until then); close() ends
+    the stream and, if a value was cut off, returns its repaired prefix. A schema with a
+    root "type" of "object" or "array" only considers values of that kind. After the
+    value is found, further chunks are ignored.
+    """
+
+    def __init__(self, schema: Optional[dict] = None):
+        self.schema = schema or {}
+        root = self.schema.get("type")
+        openers = "{" if root == "object" else "[" if root == "array" else "{["
+        self._open_pattern = re.compile("[" + re.escape(openers) + "]")
+        self._buffer = ""
+        self._pos = 0
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._repairs_left = MAX_REPAIR_CANDIDATES
+        self.value = None
+        self.done = False
+        self.repaired = False
+
+    def feed(self, chunk: str):
+        if not self.done and chunk:
+            self._buffer += chunk
+            self._scan()
+        return self.value
+
+    def close(self):
+        while not self.done and self._start is not None and self._repairs_left > 0:
+            self._repairs_left -= 1
+            repaired = _repair(self._buffer[self._start:], self.schema)
+            if repaired is not None:
+                self._accept(repaired[0], repaired=True)
+                break
+            self._restart()
+            self._scan()
+        return self.value
+
+    def _accept(self, value, repaired: bool = False):
+        self.value, self.done, self.repaired = value, True, repaired
+
+    def _restart(self):
+        # Drop the current candidate and look for the next opener after its start
+        self._pos = self._start + 1
+        self._start, self._stack, self._in_string = None, [], False
+
+    def _complete(self, text: str):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self._restart()
+            return
+        if matches_schema(value, self.schema):
+            self._accept(value)
+        else:
+            self._restart()
+
+    def _scan(self):
+        buffer = self._buffer
+        while not self.done:
+            if self._start is None:
+                match = self._open_pattern.search(buffer, self._pos)
+                if not match:
+                    # Nothing before here can start a value
+                    self._buffer, self._pos = "", 0
+                    return
+                self._start, self._stack, self._pos = match.start(), [OPENERS[match.group()]], match.end()
+            elif self._in_string:
+                match = STRING_PATTERN.search(buffer, self._pos)
+                if not match:
+                    self._pos = len(buffer)
+                    return
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # Escape split across chunks: resume from the backslash
+                        self._pos = match.start()
+                        return
+                    self._pos = match.end() + 1
+                else:
+                    self._in_string, self._pos = False, match.end()
+            else:
+                match = STRUCTURE_PATTERN.search(buffer, self._pos)
+                if not match:
+                    self._pos = len(buffer)
+                    return
+                char, self._pos = match.group(), match.end()
+                if char == '"':
+                    self._in_string = True
+                elif char in OPENERS:
+                    self._stack.append(OPENERS[char])
+                elif self._stack.pop() != char:
+                    self._restart()
+                elif not self._stack:
+                    self._complete(buffer[self._start:self._pos])
+
+def extract_json(text: str, schema: Optional[dict] = None, repair: bool = True):
+    """Returns the first JSON object or array in text that matches schema, or None.
+
+    Text that is exactly JSON takes the json.loads fast path; otherwise the value is
+    found among fences and prose, and a truncated value is repaired (with repair=False
+    only a complete value is returned).
+    """
+    if not isinstance(text, str):
+        parse_stats["failed"] += 1
+        return None
+    try:
+        value = json.loads(text)
+    except ValueError:
+        pass
+    else:
+        if isinstance(value, (dict, list)) and matches_schema(value, schema):
+            parse_stats["direct"] += 1
+            return value
+    parser = JSONStreamParser(schema)
+    parser.feed(text)
+    value = parser.close() if repair else parser.value
+    parse_stats["failed" if not parser.done else "repaired" if parser.repaired else "extracted"] += 1
+    return value
@@ -0,0 +1,199 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration
+
+# --- LLM Response Cache ---
+# Plugged into the chat models through their `cache=` field, so every chain built on
+# llm / utility_llm (agent nodes, extraction, summary) is served from it transparently.
+
+# Set by bypass_cache() for runs where sampling diversity matters
+_cache_bypassed = contextvars.ContextVar("llm_cache_bypassed", default=False)
+
+@contextlib.contextmanager
+def bypass_cache():
+    """Disables cache lookups and writes for LLM calls made inside this block (per run)."""
+    token = _cache_bypassed.set(True)
+    try:
+        yield
+    finally:
+        _cache_bypassed.reset(token)
+
+def normalize_prompt(prompt: str) -> str:
+    """Reduces a serialized message list to role, content and tool calls.
+
+    Earlier AI turns carry provider metadata (timings, request ids, token usage)
+    that differs on every call and would otherwise make identical prompts miss.
+    """
+    try:
+        messages = json.loads(prompt)
+    except (TypeError, ValueError):
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+    normalized = []
+    for message in messages:
+        kwargs = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        normalized.append([
+            kwargs.get("type") or (message.get("id") or ["?"])[-1],
+            kwargs.get("content"),
+            kwargs.get("tool_calls") or None,
+        ])
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+def _dump_generations(generations: RETURN_VAL_TYPE) -> str:
+    """Serializes chat generations for the SQLite tier."""
+    return json.dumps([
+        {"message": message_to_dict(g.message), "generation_info": g.generation_info}
+        for g in generations
+    ])
+
+def _load_generations(raw_value: str) -> RETURN_VAL_TYPE:
+    """Restores chat generations written by _dump_generations."""
+    return [
+        ChatGeneration(message=messages_from_dict([g["message"]])[0], generation_info=g["generation_info"])
+        for g in json.loads(raw_value)
+    ]
+
+class LLMResponseCache(BaseCache):
+    """Two-tier response cache: an in-memory LRU in front of an optional SQLite file.
+
+    Keys hash the model's llm_string (model name, temperature and other call
+    parameters) together with the normalized message list. Entries older than
+    ttl_seconds are treated as misses; each tier evicts its oldest entries once
+    it holds more than its size limit.
+    """
+
+    def __init__(self, max_memory_entries: int = 512, sqlite_path: Optional[str] = None,
+                 ttl_seconds: Optional[float] = None, max_disk_entries: int = 10000):
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, tuple[float, RETURN_VAL_TYPE]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if sqlite_path:
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, created_at REAL, value TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created_at)")
+            self._conn.commit()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0, "bypassed": 0}
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Hashes the model settings and normalized prompt into a cache key."""
+        return hashlib.sha256(f"{llm_string}\x00{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if _cache_bypassed.get():
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return None
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT created_at, value FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    created_at, raw_value = row
+                    if not self._expired(created_at):
+                        value = _load_generations(raw_value)
+                        self._remember(key, created_at, value) # Promote to the memory tier
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if _cache_bypassed.get():
+            return
+        key = self.make_key(prompt, llm_string)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, return_val)
+            self._stats["writes"] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, created_at, value) VALUES (?, ?, ?)",
+                    (key, created_at, _dump_generations(return_val)),
+                )
+                self._evict_disk()
+                self._conn.commit()
+
+    def _remember(self, key: str, created_at: float, value: RETURN_VAL_TYPE) -> None:
+        """Stores an entry in the memory tier, evicting least recently used entries (lock held)."""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self) -> None:
+        """Drops expired rows and the oldest rows beyond max_disk_entries (lock held)."""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY created_at LIMIT ?)",
+                (excess,),
+            )
+            self._stats["evictions"] += excess
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the overall hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self._memory)
+        return stats
+
+def create_response_cache(mode: str, sqlite_path: str, ttl_seconds: Optional[float],
+                          max_memory_entries: int, max_disk_entries: int) -> Optional[LLMResponseCache]:
+    """Builds the response cache for a mode of "off", "memory" or "sqlite"."""
+    if mode == "off":
+        return None
+    if mode not in ("memory", "sqlite"):
+        raise ValueError(f"Unknown LLM cache mode: {mode!r} (expected off, memory or sqlite)")
+    return LLMResponseCache(
+        max_memory_entries=max_memory_entries,
+        sqlite_path=sqlite_path if mode == "sqlite" else None,
+        ttl_seconds=ttl_seconds,
+        max_disk_entries=max_disk_entries,
+    )
@@ -1,17 +1,131 @@
-from langchain_groq import ChatGroq
 # from langmem import create_memory_from_config # Removed langmem dependency
-from dotenv import load_dotenv
-import os
+import functools
+import threading
+from .config import (
+    LLM_CACHE_MODE, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_MEMORY_ENTRIES, LLM_CACHE_MAX_DISK_ENTRIES,
+    LLM_BACKEND, GROQ_MODEL_NAME, GROQ_UTILITY_MODEL_NAME, SUMMARY_MODEL,
+    FAKE_LLM_LATENCY_MS, FAKE_LLM_LATENCY_JITTER_MS, FAKE_LLM_TOKEN_LATENCY_MS,
+    FAKE_LLM_TOKENS, FAKE_LLM_TOKENS_JITTER, FAKE_LLM_SEED, FAKE_LLM_REPLAY_PATH, FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_PLAN_MISS_RATE,
+    LLM_RPM, LLM_TPM, UTILITY_LLM_RPM, UTILITY_LLM_TPM, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS,
+)
+from .instrumentation import metrics
 
-load_dotenv()
+# --- LLM Clients ---
+# Clients are created on first use (get_llm / get_utility_llm), so importing this module
+# needs neither the provider SDK nor credentials. The module attributes `llm`,
+# `utility_llm`, `summary_llm` and `response_cache` still work and resolve lazily.
 
-# Use a more capable model if possible for the main agent logic
-llm = ChatGroq(model_name=os.getenv("GROQ_MODEL_NAME", "llama3-70b-8192"))
-# Keep a smaller/faster model for potential utility tasks like extraction/summarization if needed
-utility_llm = ChatGroq(model_name=os.getenv("GROQ_UTILITY_MODEL_NAME", "llama3-8b-8192")) 
+# Model names per role: a more capable model for the main agent logic, and a
+# smaller/faster one for utility tasks like extraction/summarization
+MODEL_NAMES = {
+    "llm": GROQ_MODEL_NAME,
+    "utility_llm": GROQ_UTILITY_MODEL_NAME,
+}
+
+_models = {}
+_models_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache():
+    """Returns the shared response cache for both models (None when LLM_CACHE=off); see src/llm_cache.py."""
+    from .llm_cache import create_response_cache
+    cache = create_response_cache(
+        LLM_CACHE_MODE, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS,
+        LLM_CACHE_MAX_MEMORY_ENTRIES, LLM_CACHE_MAX_DISK_ENTRIES,
+    )
+    if cache is not None:
+        metrics.register_collector("llm_cache", cache.stats)
+    return cache
+
+def _model_limiter(model_name: str):
+    """The shared limiter for a provider model, with the limits of the role using it."""
+    from .rate_limit import get_model_limiter
+    if model_name == MODEL_NAMES["utility_llm"] and model_name != MODEL_NAMES["llm"]:
+        rpm, tpm = UTILITY_LLM_RPM, UTILITY_LLM_TPM
+    else:
+        rpm, tpm = LLM_RPM, LLM_TPM
+    return get_model_limiter(model_name, rpm, tpm, LLM_MAX_CONCURRENCY)
+
+def create_chat_model(model_name: str):
+    """Creates a chat model for the configured backend (LLM_BACKEND=groq|fake).
+
+    Provider calls go through the model's shared rate limiter and retry policy
+    (see src/rate_limit.py); the provider client's own retries are turned off.
+    """
+    from .rate_limit import with_rate_limits, attach_limits, RetryPolicy
+    policy = RetryPolicy(LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS)
+    if LLM_BACKEND == "fake":
+        from .fake_llm import ScriptedChatModel
+        model = with_rate_limits(ScriptedChatModel)(
+            model_name=f"fake-{model_name}",
+            latency_mean=FAKE_LLM_LATENCY_MS / 1000,
+            latency_jitter=FAKE_LLM_LATENCY_JITTER_MS / 1000,
+            token_latency=FAKE_LLM_TOKEN_LATENCY_MS / 1000,
+            tokens_mean=FAKE_LLM_TOKENS,
+            tokens_jitter=FAKE_LLM_TOKENS_JITTER,
+            seed=FAKE_LLM_SEED,
+            replay_path=FAKE_LLM_REPLAY_PATH,
+            error_rate=FAKE_LLM_ERROR_RATE,
+            plan_miss_rate=FAKE_LLM_PLAN_MISS_RATE,
+            cache=get_response_cache(),
+        )
+        return attach_limits(model, _model_limiter(model_name), policy)
+    if LLM_BACKEND != "groq":
+        raise ValueError(f"Unknown LLM backend: {LLM_BACKEND!r} (expected groq or fake)")
+    from langchain_groq import ChatGroq
+    model = with_rate_limits(ChatGroq)(
+        model_name=model_name,
+        cache=get_response_cache(),
+        request_timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=0,
+    )
+    return attach_limits(model, _model_limiter(model_name), policy)
+
+def _get_model(role: str):
+    """Returns the model for a role ("llm" or "utility_llm"), creating it on first use."""
+    model = _models.get(role)
+    if model is None:
+        with _models_lock:
+            model = _models.get(role)
+            if model is None:
+                model = _models[role] = create_chat_model(MODEL_NAMES[role])
+    return model
+
+def get_llm():
+    """Returns the main agent model."""
+    return _get_model("llm")
+
+def get_utility_llm():
+    """Returns the utility model used for extraction (and summaries by default)."""
+    return _get_model("utility_llm")
+
+def get_summary_llm():
+    """Returns the model used for rolling conversation summaries (SUMMARY_MODEL=utility|main)."""
+    return get_llm() if SUMMARY_MODEL == "main" else get_utility_llm()
+
+def set_models(llm=None, utility_llm=None):
+    """Replaces the models for a role, e.g. to inject fixed-latency fakes in benchmarks."""
+    with _models_lock:
+        if llm is not None:
+            _models["llm"] = llm
+        if utility_llm is not None:
+            _models["utility_llm"] = utility_llm
+
+def __getattr__(name: str):
+    # Lazy module attributes kept for existing `from ..llm_config import llm` style imports
+    if name in MODEL_NAMES:
+        return _get_model(name)
+    if name == "summary_llm":
+        return get_summary_llm()
+    if name == "response_cache":
+        return get_response_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # # Initialize LangMem Memory - Removed
 # memory_instance = create_memory_from_config({
 #     "memory_type": "basic",
 #     "llm": memory_llm, # Was memory_llm
-# }) 
\ No newline at end of file
+# })
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from .config import (
+    USER_MEMORY_DB_PATH, USER_MEMORY_MAX_FACTS, USER_MEMORY_MAX_LIST_ITEMS,
+    USER_MEMORY_MAX_VALUE_CHARS, USER_MEMORY_MAX_SEEN,
+)
+from .instrumentation import metrics
+
+# --- Per-User Memory Store ---
+# Facts extracted about a user are kept per user id in SQLite (a file at USER_MEMORY_DB_PATH,
+# otherwise in memory for the life of the process), so they carry over between sessions.
+# Keys are normalized to a small typed schema; repeated facts are deduplicated, lists are
+# merged and capped, and the least recently seen facts are evicted past USER_MEMORY_MAX_FACTS.
+# Every extracted sentence is remembered by hash, so a sentence that was already
+# extracted costs no further LLM call until an eviction forgets the user's sentences.
+
+logger = logging.getLogger(__name__)
+
+# Known keys and their value type; anything else is stored as a string fact
+FACT_TYPES = {
+    "name": str,
+    "location": str,
+    "occupation": str,
+    "company": str,
+    "timezone": str,
+    "preferred_language": str,
+    "experience_level": str,
+    "preferences": list,
+    "dislikes": list,
+    "skills": list,
+    "projects": list,
+}
+FACT_ALIASES = {
+    "user_name": "name", "full_name": "name", "first_name": "name",
+    "city": "location", "country": "location", "lives_in": "location",
+    "job": "occupation", "role": "occupation", "job_title": "occupation", "profession": "occupation",
+    "employer": "company", "works_at": "company", "organization": "company",
+    "programming_language": "preferred_language", "language": "preferred_language",
+    "favorite_language": "preferred_language", "favourite_language": "preferred_language",
+    "preference": "preferences", "likes": "preferences", "interests": "preferences",
+    "dislike": "dislikes", "hates": "dislikes",
+    "skill": "skills", "technologies": "skills",
+    "project": "projects",
+}
+# Extractor keys that carry no user fact
+IGNORED_KEYS = {"raw_extraction", "explicit_requests", "requests", "request", "task"}
+
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+CREATE TABLE IF NOT EXISTS seen_sentences (
+    user_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (user_id, hash)
+);
+"""
+
+# Counters: lookups, hits (every sentence known, no LLM call), partial_hits, extraction_calls,
+# calls_saved, facts_added, facts_updated, duplicates, evictions
+memory_stats = Counter()
+
+def get_memory_stats() -> dict:
+    """Returns the memory counters with the lookup hit rate."""
+    stats = dict(memory_stats)
+    stats["hit_rate"] = memory_stats["hits"] / memory_stats["lookups"] if memory_stats["lookups"] else 0.0
+    return stats
+
+metrics.register_collector("user_memory", get_memory_stats)
+
+def normalize_key(key: str) -> str:
+    key = re.sub(r"[^a-z0-9]+", "_", str(key).lower()).strip("_")
+    return FACT_ALIASES.get(key, key)
+
+def _clean_scalar(value) -> Optional[str]:
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    text = " ".join(str(value).split())
+    if not text or text.lower() in ("none", "null", "unknown", "n/a"):
+        return None
+    return text[:USER_MEMORY_MAX_VALUE_CHARS]
+
+def normalize_facts(extracted: dict) -> Dict[str, object]:
+    """Maps raw extractor output to typed facts: str values, or de-duplicated lists of str.
+
+    Nested objects are flattened one level (e.g. {"preferences": {"language": "Python"}}
+    becomes preferences.language); empty values and non-fact keys are dropped.
+    """
+    facts = {}
+    for raw_key, value in (extracted or {}).items():
+        key = normalize_key(raw_key)
+        if not key or key in IGNORED_KEYS:
+            continue
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                text = _clean_scalar(sub_value)
+                if text is not None:
+                    facts[f"{key}.{normalize_key(sub_key)}"] = text
+            continue
+        if FACT_TYPES.get(key) is list or isinstance(value, list):
+            items = value if isinstance(value, list) else [value]
+            cleaned = _merge_list([], [_clean_scalar(i) for i in items])
+            if cleaned:
+                facts[key] = cleaned
+        else:
+            text = _clean_scalar(value)
+            if text is not None:
+                facts[key] = text
+    return facts
+
+def _merge_list(existing: List[str], new: List[Optional[str]]) -> List[str]:
+    """Union preserving order (case-insensitive), keeping the newest USER_MEMORY_MAX_LIST_ITEMS."""
+    merged = list(existing)
+    known = {item.lower() for item in merged}
+    for item in new:
+        if item and item.lower() not in known:
+            merged.append(item)
+            known.add(item.lower())
+    return merged[-USER_MEMORY_MAX_LIST_ITEMS:]
+
+def _sentence_hash(sentence: str) -> str:
+    normalized = " ".join(re.findall(r"\w+", sentence.lower()))
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_SPLIT_PATTERN.split(text or "") if s.strip()]
+
+class MemoryStore:
+    """SQLite-backed per-user fact store with deduplication, caps and LRU eviction."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def profile(self, user_id: str) -> dict:
+        """All facts known about the user, as {key: value}."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM facts WHERE user_id = ? ORDER BY key", (user_id,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def unseen_sentences(self, user_id: str, sentences: List[str]) -> List[str]:
+        """The sentences not extracted for this user before (the fast path before any LLM call)."""
+        if not sentences:
+            return []
+        hashes = [_sentence_hash(s) for s in sentences]
+        with self._lock:
+            placeholders = ",".join("?" * len(hashes))
+            known = {row[0] for row in self._conn.execute(
+                f"SELECT hash FROM seen_sentences WHERE user_id = ? AND hash IN ({placeholders})", (user_id, *hashes))}
+        unseen = [s for s, h in zip(sentences, hashes) if h not in known]
+        memory_stats["lookups"] += 1
+        if not unseen:
+            memory_stats["hits"] += 1
+            memory_stats["calls_saved"] += 1
+        elif len(unseen) < len(sentences):
+            memory_stats["partial_hits"] += 1
+        return unseen
+
+    def mark_seen(self, user_id: str, sentences: List[str]):
+        """Remembers extracted sentences, keeping the newest USER_MEMORY_MAX_SEEN per user."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO seen_sentences (user_id, hash, seen_at) VALUES (?, ?, ?)",
+                [(user_id, _sentence_hash(s), now) for s in sentences])
+            self._conn.execute(
+                "DELETE FROM seen_sentences WHERE user_id = ? AND hash NOT IN "
+                "(SELECT hash FROM seen_sentences WHERE user_id = ? ORDER BY seen_at DESC LIMIT ?)",
+                (user_id, user_id, USER_MEMORY_MAX_SEEN))
+
+    def merge(self, user_id: str, facts: Dict[str, object]) -> Tuple[dict, dict]:
+        """Stores normalized facts, returning (profile, changed facts).
+
+        Identical values only refresh last_seen; lists are merged; a different scalar
+        replaces the old one. Past USER_MEMORY_MAX_FACTS the least recently seen facts
+        are evicted, and the user's seen sentences are forgotten so that a message
+        restating an evicted fact is extracted again.
+        """
+        now = time.time()
+        changed = {}
+        with self._lock, self._conn:
+            current = {key: json.loads(value) for key, value in self._conn.execute(
+                "SELECT key, value FROM facts WHERE user_id = ?", (user_id,))}
+            for key, value in facts.items():
+                old = current.get(key)
+                if isinstance(value, list):
+                    new = _merge_list(old if isinstance(old, list) else ([old] if old else []), value)
+                else:
+                    new = value
+                if old == new or (isinstance(old, str) and isinstance(new, str) and old.lower() == new.lower()):
+                    memory_stats["duplicates"] += 1
+                    self._conn.execute("UPDATE facts SET last_seen = ? WHERE user_id = ? AND key = ?", (now, user_id, key))
+                    continue
+                memory_stats["facts_updated" if key in current else "facts_added"] += 1
+                changed[key] = current[key] = new
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO facts (user_id, key, value, updated_at, last_seen) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, key, json.dumps(new), now, now))
+            overflow = len(current) - USER_MEMORY_MAX_FACTS
+            if overflow > 0:
+                evicted = [row[0] for row in self._conn.execute(
+                    "SELECT key FROM facts WHERE user_id = ? ORDER BY last_seen, updated_at LIMIT ?", (user_id, overflow))]
+                self._conn.executemany("DELETE FROM facts WHERE user_id = ? AND key = ?", [(user_id, k) for k in evicted])
+                # Seen hashes are not tied to facts, so any of them may belong to an evicted one
+                self._conn.execute("DELETE FROM seen_sentences WHERE user_id = ?", (user_id,))
+                for key in evicted:
+                    current.pop(key, None)
+                    changed.pop(key, None)
+                memory_stats["evictions"] += len(evicted)
+        return current, changed
+
+    def forget(self, user_id: str):
+        """Deletes everything stored about a user."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM facts WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM seen_sentences WHERE user_id = ?", (user_id,))
+
+_store: Optional[MemoryStore] = None
+_store_lock = threading.Lock()
+
+def get_memory_store() -> MemoryStore:
+    """The shared store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MemoryStore(USER_MEMORY_DB_PATH or ":memory:")
+        return _store
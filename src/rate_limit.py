@@ -0,0 +1,346 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+from .instrumentation import metrics
+from .tokens import count_message_tokens
+
+# --- LLM Rate Limiting and Retries ---
+# Provider calls of every chat model created by llm_config pass through a per-model
+# ModelLimiter (request and token buckets plus a concurrency cap) and are retried with
+# jittered exponential backoff. Retries are drawn from a per-session budget; once a call
+# cannot be completed it raises LLMUnavailableError, which agent nodes turn into the
+# graph's `error` state. Response cache hits never reach this layer.
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: rate limited, timeouts and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Provider SDK exception names worth retrying when no status code is attached
+RETRYABLE_ERROR_NAMES = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "TimeoutError"}
+
+class LLMUnavailableError(RuntimeError):
+    """A model call failed after exhausting its retries or the session's retry budget."""
+
+    def __init__(self, model: str, attempts: int, last_error: Exception, reason: str):
+        super().__init__(f"{model} unavailable after {attempts} attempt(s) ({reason}): {type(last_error).__name__}: {last_error}")
+        self.model = model
+        self.attempts = attempts
+        self.last_error = last_error
+        self.reason = reason
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` per minute.
+
+    reserve() debits immediately (the balance may go negative) and returns how long
+    the caller must wait before proceeding, so waiting happens outside the lock.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def adjust(self, amount: float):
+        """Debits (or, if negative, refunds) tokens after the fact."""
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+class ModelLimiter:
+    """Requests-per-minute and tokens-per-minute buckets plus a bounded concurrency semaphore.
+
+    A limit of 0 disables that bucket. Tokens are reserved up front from the prompt
+    estimate plus expected_output_tokens and corrected from reported usage afterwards.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, max_concurrency: int = 8,
+                 expected_output_tokens: int = 512):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.expected_output_tokens = expected_output_tokens
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _bucket_wait(self, reserved_tokens: int) -> float:
+        wait = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(reserved_tokens))
+        return wait
+
+    def acquire(self, reserved_tokens: int) -> float:
+        """Blocks until a slot and bucket capacity are available; returns the time waited."""
+        start = time.monotonic()
+        self._slots.acquire()
+        try:
+            time.sleep(self._bucket_wait(reserved_tokens))
+        except BaseException:
+            # Interrupted before the call was made: give the slot and the reservation back
+            self.release(reserved_tokens, 0)
+            raise
+        return time.monotonic() - start
+
+    async def aacquire(self, reserved_tokens: int) -> float:
+        """Async variant of acquire; polls the slot so no event loop thread is blocked."""
+        start = time.monotonic()
+        delay = 0.001
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        try:
+            await asyncio.sleep(self._bucket_wait(reserved_tokens))
+        except BaseException:
+            # Cancelled before the call was made: give the slot and the reservation back
+            self.release(reserved_tokens, 0)
+            raise
+        return time.monotonic() - start
+
+    def release(self, reserved_tokens: int, used_tokens: Optional[int]):
+        self._slots.release()
+        if self.tokens and used_tokens is not None:
+            self.tokens.adjust(used_tokens - reserved_tokens)
+
+# --- Retry policy ---
+
+class RetryBudget:
+    """Retries left for one session, shared by every model call made in it."""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            self.used += 1
+            return True
+
+# Set by retry_budget() for the duration of a session; propagates into node threads/tasks
+_session_budget = contextvars.ContextVar("llm_retry_budget", default=None)
+
+@contextlib.contextmanager
+def retry_budget(retries: int):
+    """Gives the model calls made inside this block a shared budget of `retries` retries."""
+    budget = RetryBudget(retries)
+    token = _session_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        try:
+            _session_budget.reset(token)
+        except ValueError:
+            # Closed from another context (e.g. an abandoned generator); nothing to restore
+            pass
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """The provider's Retry-After hint in seconds, if the error carries one."""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy:
+    """Jittered exponential backoff: a uniform draw up to min(max_delay, base * 2**attempt)."""
+
+    def __init__(self, max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 20.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        hint = _retry_after(error)
+        if hint is not None:
+            return min(self.max_delay, hint)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def next_delay(self, model: str, attempt: int, error: Exception) -> float:
+        """Returns the delay before retry number attempt+1, or raises if no retry is allowed."""
+        if not is_retryable(error):
+            raise error
+        if attempt >= self.max_retries:
+            raise LLMUnavailableError(model, attempt + 1, error, "max retries reached") from error
+        budget = _session_budget.get()
+        if budget is not None and not budget.take():
+            raise LLMUnavailableError(model, attempt + 1, error, "session retry budget exhausted") from error
+        delay = self.delay(attempt, error)
+        metrics.inc("llm_provider_retries_total", model=model, error=type(error).__name__)
+        logger.info("Retrying %s in %.2fs after %s (attempt %d)", model, delay, type(error).__name__, attempt + 1)
+        return delay
+
+def _usage_tokens(result) -> Optional[int]:
+    """Total tokens reported in a ChatResult, or None if the provider reported none."""
+    total = None
+    for generation in getattr(result, "generations", []):
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            total = (total or 0) + usage.get("total_tokens", usage.get("input_tokens", 0) + usage.get("output_tokens", 0))
+    return total
+
+def _chunk_tokens(chunk) -> Optional[int]:
+    usage = getattr(getattr(chunk, "message", None), "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+class RateLimitedChatModelMixin:
+    """Gates a chat model's provider calls (_generate/_stream and async variants).
+
+    Mixed in front of a BaseChatModel subclass by with_rate_limits; the instance gets
+    its limiter and retry policy through attach_limits. Streams are only retried until
+    their first chunk has been delivered.
+    """
+
+    _limiter: Optional[ModelLimiter] = None
+    _retry_policy: Optional[RetryPolicy] = None
+
+    def _limits(self):
+        return self._limiter, self._retry_policy or RetryPolicy(max_retries=0)
+
+    def _reserve(self, limiter: ModelLimiter, messages) -> int:
+        return count_message_tokens(messages) + limiter.expected_output_tokens
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, policy = self._limits()
+        attempt = 0
+        while True:
+            reserved = self._reserve(limiter, messages) if limiter else 0
+            if limiter:
+                metrics.observe("llm_queue_seconds", limiter.acquire(reserved), model=limiter.name)
+            used = None
+            try:
+                result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                used = _usage_tokens(result)
+                return result
+            except Exception as e:
+                delay = policy.next_delay(limiter.name if limiter else type(self).__name__, attempt, e)
+            finally:
+                if limiter:
+                    limiter.release(reserved, used)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, policy = self._limits()
+        attempt = 0
+        while True:
+            reserved = self._reserve(limiter, messages) if limiter else 0
+            if limiter:
+                metrics.observe("llm_queue_seconds", await limiter.aacquire(reserved), model=limiter.name)
+            used = None
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                used = _usage_tokens(result)
+                return result
+            except Exception as e:
+                delay = policy.next_delay(limiter.name if limiter else type(self).__name__, attempt, e)
+            finally:
+                if limiter:
+                    limiter.release(reserved, used)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, policy = self._limits()
+        attempt = 0
+        while True:
+            reserved = self._reserve(limiter, messages) if limiter else 0
+            if limiter:
+                metrics.observe("llm_queue_seconds", limiter.acquire(reserved), model=limiter.name)
+            used = None
+            started = False
+            try:
+                for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    used = _chunk_tokens(chunk) or used
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                delay = policy.next_delay(limiter.name if limiter else type(self).__name__, attempt, e)
+            finally:
+                if limiter:
+                    limiter.release(reserved, used)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, policy = self._limits()
+        attempt = 0
+        while True:
+            reserved = self._reserve(limiter, messages) if limiter else 0
+            if limiter:
+                metrics.observe("llm_queue_seconds", await limiter.aacquire(reserved), model=limiter.name)
+            used = None
+            started = False
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    used = _chunk_tokens(chunk) or used
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                delay = policy.next_delay(limiter.name if limiter else type(self).__name__, attempt, e)
+            finally:
+                if limiter:
+                    limiter.release(reserved, used)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+@functools.lru_cache(maxsize=None)
+def with_rate_limits(model_cls):
+    """Returns a subclass of model_cls whose provider calls go through RateLimitedChatModelMixin."""
+    return type(f"RateLimited{model_cls.__name__}", (RateLimitedChatModelMixin, model_cls), {"__module__": __name__})
+
+def attach_limits(model, limiter: Optional[ModelLimiter], policy: RetryPolicy):
+    """Sets the limiter and retry policy used by a with_rate_limits model instance."""
+    object.__setattr__(model, "_limiter", limiter)
+    object.__setattr__(model, "_retry_policy", policy)
+    return model
+
+# Limiters are shared by every model instance using the same provider model
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_model_limiter(name: str, rpm: int, tpm: int, max_concurrency: int) -> ModelLimiter:
+    """Returns the process-wide limiter for a provider model, creating it on first use."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = ModelLimiter(name, rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+        return limiter
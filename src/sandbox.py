@@ -0,0 +1,310 @@
+import ast
+import asyncio
+import logging
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from .config import (
+    CODE_EXECUTION_TIMEOUT_SECONDS, CODE_EXECUTION_CPU_SECONDS, CODE_EXECUTION_MEMORY_MB,
+    CODE_EXECUTION_WORKERS,
+)
+from .instrumentation import metrics
+from .json_extract import extract_json
+
+# --- Sandboxed Code Execution ---
+# Python blocks from a Developer message are written to a scratch directory and run in
+# separate interpreter processes, each one under CPU, memory, file size and wall-clock
+# limits. Plain code blocks form `solution.py`; blocks that define tests run as test
+# modules against it, one process per module, in parallel on a shared worker pool.
+# This isolates crashes and runaway code from the graph process; it is not a security
+# boundary (the child can still read files and use the network), so execution is off
+# unless CODE_EXECUTION=on, which should only be set where the model output is trusted
+# or the whole process runs inside a container/VM.
+
+logger = logging.getLogger(__name__)
+
+CODE_FENCE_PATTERN = re.compile(r"```([\w+-]*)[ \t]*\n(.*?)```", re.DOTALL)
+PYTHON_FENCE_TAGS = {"python", "py", "python3"}
+TEST_BLOCK_PATTERN = re.compile(r"^\s*(def test_\w+|class \w+\(.*TestCase\))", re.MULTILINE)
+
+TEST_RESULTS_SCHEMA = {
+    "type": "array",
+    "items": {"type": "object", "required": ["name", "status"], "properties": {"status": {"type": "string"}}},
+}
+
+# Output kept per process, from the end
+OUTPUT_TAIL_CHARS = 2000
+# Largest file a child may write
+MAX_FILE_BYTES = 16 * 1024 * 1024
+
+# Runs inside the child: applies the limits, imports solution.py, then runs the test
+# functions and TestCases of the given test module. Results go to a JSON file so the
+# code's own prints cannot corrupt them; each one is written as soon as it is known, so
+# the tests finished before a timeout or crash are still reported.
+RUNNER_SOURCE = r'''
+import json, sys, time, traceback, types, unittest
+cpu_seconds, memory_bytes, file_bytes, module, results_path = sys.argv[1:6]
+try:
+    import resource
+    resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds) + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (int(memory_bytes), int(memory_bytes)))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (int(file_bytes), int(file_bytes)))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+except (ImportError, ValueError, OSError):
+    pass
+sys.path.insert(0, ".")
+results = open(results_path, "w")
+results.write("[")
+results.flush()
+tests = []
+
+def record(name, status, started, error=None, detail=None):
+    if error is not None:
+        lines = traceback.format_exception_only(type(error), error)
+        detail = "".join(lines).strip()
+    entry = {"name": name, "status": status, "duration_s": time.perf_counter() - started, "error": detail}
+    results.write(("," if tests else "") + json.dumps(entry))
+    results.flush()
+    tests.append(entry)
+
+def finish():
+    results.write("]")
+    results.close()
+
+started = time.perf_counter()
+try:
+    import solution
+except BaseException as e:
+    record("import solution", "error", started, e)
+    finish()
+    sys.exit(0)
+if module == "solution":
+    record("import solution", "passed", started)
+    finish()
+    sys.exit(0)
+
+namespace = {k: v for k, v in vars(solution).items() if not k.startswith("__")}
+namespace["__name__"] = module
+started = time.perf_counter()
+try:
+    with open(module + ".py") as f:
+        exec(compile(f.read(), module + ".py", "exec"), namespace)
+except BaseException as e:
+    record("import " + module, "error", started, e)
+    finish()
+    sys.exit(0)
+
+for name, value in list(namespace.items()):
+    if name.startswith("test_") and isinstance(value, types.FunctionType) and value.__code__.co_filename == module + ".py":
+        started = time.perf_counter()
+        if value.__code__.co_argcount:
+            record(name, "error", started, TypeError("test takes arguments (fixtures are not supported)"))
+            continue
+        try:
+            value()
+            record(name, "passed", started)
+        except AssertionError as e:
+            record(name, "failed", started, e)
+        except BaseException as e:
+            record(name, "error", started, e)
+    elif isinstance(value, type) and issubclass(value, unittest.TestCase) and value.__module__ == module:
+        for case in unittest.defaultTestLoader.loadTestsFromTestCase(value):
+            started = time.perf_counter()
+            outcome = unittest.TestResult()
+            case.run(outcome)
+            name = value.__name__ + "." + case._testMethodName
+            if outcome.failures:
+                record(name, "failed", started, detail=outcome.failures[0][1].strip().splitlines()[-1])
+            elif outcome.errors:
+                record(name, "error", started, detail=outcome.errors[0][1].strip().splitlines()[-1])
+            else:
+                record(name, "passed", started)
+finish()
+'''
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_execution_pool() -> ThreadPoolExecutor:
+    """Worker pool shared by all sessions; each worker drives one child process at a time."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=CODE_EXECUTION_WORKERS, thread_name_prefix="code-exec")
+        return _pool
+
+def _is_python(tag: str, code: str) -> bool:
+    if tag.lower() in PYTHON_FENCE_TAGS:
+        return True
+    if tag:
+        return False
+    # Untagged fences count only if they parse as Python
+    try:
+        ast.parse(code)
+        return True
+    except SyntaxError:
+        return False
+
+def extract_python_blocks(text: str) -> Tuple[List[str], List[str]]:
+    """Splits the Python code blocks of a message into (solution blocks, test blocks)."""
+    solution, tests = [], []
+    if "```" not in (text or ""):
+        return solution, tests
+    for tag, code in CODE_FENCE_PATTERN.findall(text):
+        if not code.strip() or not _is_python(tag, code):
+            continue
+        (tests if TEST_BLOCK_PATTERN.search(code) else solution).append(code)
+    return solution, tests
+
+def _read_tail(f) -> str:
+    """The last OUTPUT_TAIL_CHARS characters a child wrote to an output file."""
+    size = f.seek(0, os.SEEK_END)
+    # A UTF-8 character takes at most 4 bytes
+    start = max(0, size - 4 * OUTPUT_TAIL_CHARS)
+    f.seek(start)
+    text = f.read().decode("utf-8", errors="replace")
+    return text if start == 0 and len(text) <= OUTPUT_TAIL_CHARS else "..." + text[-OUTPUT_TAIL_CHARS:]
+
+def _run_module(workdir: str, module: str, timeout: float) -> dict:
+    """Runs one module in a child interpreter and returns its run record."""
+    results_path = os.path.join(workdir, f"{module}.results.json")
+    command = [
+        sys.executable, "-I", "_runner.py",
+        str(int(CODE_EXECUTION_CPU_SECONDS)), str(int(CODE_EXECUTION_MEMORY_MB * 1024 * 1024)),
+        str(MAX_FILE_BYTES), module, results_path,
+    ]
+    env = {"PATH": os.environ.get("PATH", ""), "HOME": workdir, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONHASHSEED": "0"}
+    started = time.perf_counter()
+    # Output goes to unnamed temporary files (capped at MAX_FILE_BYTES by the child's limits);
+    # only the tail is read back, so a noisy child cannot fill the graph process's memory
+    with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            command, cwd=workdir, env=env, stdin=subprocess.DEVNULL,
+            stdout=stdout_file, stderr=stderr_file,
+            start_new_session=os.name == "posix",
+        )
+        status = None
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # Kill the whole process group so children spawned by the code go too
+            try:
+                if os.name == "posix":
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+            except ProcessLookupError:
+                pass # Exited between the timeout and the kill
+            process.wait()
+            status = "timeout"
+        stdout, stderr = _read_tail(stdout_file), _read_tail(stderr_file)
+
+    tests = []
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            # Unterminated if the child was killed; the complete entries are kept
+            tests = extract_json(f.read(), TEST_RESULTS_SCHEMA) or []
+    if status is None:
+        if process.returncode != 0 or not tests:
+            # Killed by a limit (e.g. SIGXCPU), crashed or exited before reporting
+            status = "error"
+        elif any(t["status"] != "passed" for t in tests):
+            status = "failed"
+        else:
+            status = "passed"
+    return {
+        "module": module,
+        "status": status,
+        "returncode": process.returncode,
+        "duration_s": time.perf_counter() - started,
+        "tests": tests,
+        "stdout": stdout,
+        "stderr": stderr,
+    }
+
+def _prepare(solution: List[str], tests: List[str]) -> Tuple[str, List[str]]:
+    """Writes the scratch directory and returns (workdir, modules to run)."""
+    workdir = tempfile.mkdtemp(prefix="sandbox-")
+    with open(os.path.join(workdir, "_runner.py"), "w") as f:
+        f.write(RUNNER_SOURCE)
+    with open(os.path.join(workdir, "solution.py"), "w") as f:
+        f.write("\n\n".join(solution))
+    modules = []
+    for i, code in enumerate(tests, 1):
+        module = f"test_generated_{i}"
+        with open(os.path.join(workdir, f"{module}.py"), "w") as f:
+            f.write(code)
+        modules.append(module)
+    # Without tests, importing the solution is the check
+    return workdir, modules or ["solution"]
+
+def _report(runs: List[dict], started: float) -> dict:
+    tests = [t for run in runs for t in run["tests"]]
+    passed = sum(t["status"] == "passed" for t in tests)
+    status = "passed" if all(run["status"] == "passed" for run in runs) else "failed"
+    report = {
+        "status": status,
+        "tests_passed": passed,
+        "tests_failed": len(tests) - passed,
+        "duration_s": time.perf_counter() - started,
+        "runs": runs,
+    }
+    metrics.inc("code_executions_total", status=status)
+    metrics.observe("code_execution_seconds", report["duration_s"])
+    logger.info("Code execution %s: %d/%d tests passed in %.2fs", status, passed, len(tests), report["duration_s"])
+    return report
+
+def execute_code(solution: List[str], tests: List[str], timeout: Optional[float] = None) -> dict:
+    """Runs the solution and test blocks in sandboxed processes and returns a structured report.
+
+    The report holds the overall status ("passed" or "failed"), test counts, the
+    total duration and one run record per process (status, tests, output tails).
+    """
+    started = time.perf_counter()
+    timeout = timeout or CODE_EXECUTION_TIMEOUT_SECONDS
+    workdir, modules = _prepare(solution, tests)
+    try:
+        pool = get_execution_pool()
+        futures = [pool.submit(_run_module, workdir, module, timeout) for module in modules]
+        runs = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return _report(runs, started)
+
+async def aexecute_code(solution: List[str], tests: List[str], timeout: Optional[float] = None) -> dict:
+    """Async variant of execute_code; the processes run on the same worker pool."""
+    started = time.perf_counter()
+    timeout = timeout or CODE_EXECUTION_TIMEOUT_SECONDS
+    workdir, modules = _prepare(solution, tests)
+    try:
+        pool = get_execution_pool()
+        runs = await asyncio.gather(*(asyncio.wrap_future(pool.submit(_run_module, workdir, module, timeout)) for module in modules))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return _report(list(runs), started)
+
+def format_report(report: dict) -> str:
+    """Short text summary of a report, for the agents reading the message log."""
+    lines = [f"[CodeExecutor] Execution {report['status'].upper()}: "
+             f"{report['tests_passed']} passed, {report['tests_failed']} failed ({report['duration_s']:.2f} s)."]
+    for run in report["runs"]:
+        if run["status"] == "timeout":
+            lines.append(f"- {run['module']}: timed out")
+        elif run["status"] == "error" and not run["tests"]:
+            lines.append(f"- {run['module']}: exited with code {run['returncode']}")
+        for test in run["tests"]:
+            if test["status"] != "passed":
+                lines.append(f"- {test['name']}: {test['status']}: {test['error']}")
+    failing_output = next((run["stderr"] for run in report["runs"] if run["status"] != "passed" and run["stderr"]), "")
+    if failing_output:
+        lines.append("stderr (tail):\n" + failing_output[-500:])
+    return "\n".join(lines)
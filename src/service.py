@@ -0,0 +1,237 @@
+import collections
+import contextlib
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from .config import (
+    CHECKPOINT_DB_PATH, SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_SESSIONS,
+    SERVICE_QUEUE_TIMEOUT_SECONDS, SERVICE_BATCH_WINDOW_MS, EXTRACTION_BATCH_MAX, SERVICE_MAX_THREADS,
+)
+from .graph.builder import build_graph
+from .graph.checkpoints import get_checkpointer, thread_config
+from .graph.session import create_initial_state, run_session, final_reply, DEFAULT_RUN_CONFIG
+from .graph.batching import enable_extraction_batching
+from .llm_cache import bypass_cache
+from .instrumentation import metrics
+
+# --- Multi-Session HTTP Service ---
+# One process, one compiled graph: sessions run concurrently on the server's request
+# threads, follow-ups address a thread id kept by the checkpointer, and concurrent
+# memory extraction calls are micro-batched (see src/graph/batching.py).
+#
+#   POST /sessions            {"message": "...", "thread_id", "user_id", "no_cache": optional} -> final reply
+#   GET  /sessions/<thread>   stored state of a thread
+#   GET  /health              liveness and load
+#   GET  /metrics             Prometheus text format
+
+logger = logging.getLogger(__name__)
+
+# Thread ids a client may pick: exactly those GET /sessions/<thread> can address
+THREAD_ID_PATTERN = r"[\w.-]+"
+SESSION_PATH_PATTERN = re.compile(rf"^/sessions/({THREAD_ID_PATTERN})$")
+
+class ServiceBusy(Exception):
+    """No session slot became free within the queue timeout."""
+
+class AgentService:
+    """Holds the compiled graph and runs sessions on it, at most max_sessions at a time.
+
+    Threads are persisted by the SQLite checkpointer when CHECKPOINT_DB_PATH is set,
+    otherwise in memory, where only the max_threads most recently used threads are kept.
+    Every thread keeps its newest CHECKPOINT_KEEP_LAST checkpoints. Turns of one thread are
+    expected one at a time; concurrent turns on the same thread would start from the same checkpoint.
+    """
+
+    def __init__(self, app=None, max_sessions: int = SERVICE_MAX_SESSIONS,
+                 queue_timeout: float = SERVICE_QUEUE_TIMEOUT_SECONDS, max_threads: int = SERVICE_MAX_THREADS):
+        if app is None:
+            if CHECKPOINT_DB_PATH:
+                checkpointer = get_checkpointer(CHECKPOINT_DB_PATH)
+            else:
+                from langgraph.checkpoint.memory import InMemorySaver
+                checkpointer = InMemorySaver()
+            app = build_graph(checkpointer=checkpointer)
+        self.app = app
+        self.max_sessions = max_sessions
+        self.queue_timeout = queue_timeout
+        self.started = time.time()
+        self._slots = threading.BoundedSemaphore(max_sessions)
+        self._active = 0
+        self._lock = threading.Lock()
+        self.max_threads = max_threads
+        # Thread ids by last use, for evicting threads from an in-memory checkpointer
+        self._threads = collections.OrderedDict()
+
+    @property
+    def active_sessions(self) -> int:
+        return self._active
+
+    def thread_state(self, thread_id: str) -> Optional[dict]:
+        """The stored state of a thread, or None if the thread is unknown."""
+        snapshot = self.app.get_state(thread_config(thread_id))
+        return snapshot.values or None
+
+    def run(self, message: str, thread_id: Optional[str] = None, user_id: Optional[str] = None,
+            no_cache: bool = False) -> dict:
+        """Runs one session turn, continuing thread_id if it exists, and returns the reply.
+
+        user_id selects whose remembered facts the session uses and updates; without one
+        the facts belong to the thread, so callers never share the CLI's default user.
+        no_cache bypasses the LLM response cache for this turn.
+        """
+        thread_id = thread_id or str(uuid.uuid4())
+        user_id = user_id or thread_id
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceBusy(f"No session slot free within {self.queue_timeout:g} s")
+        with self._lock:
+            self._active += 1
+        start = time.perf_counter()
+        try:
+            follow_up = self.thread_state(thread_id) is not None
+            with (bypass_cache() if no_cache else contextlib.nullcontext()):
+                final_state = run_session(
+                    create_initial_state(message, follow_up=follow_up, user_id=user_id),
+                    thread_config(thread_id, base_config=DEFAULT_RUN_CONFIG),
+                    app=self.app,
+                )
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+            self._touch_thread(thread_id)
+        return {
+            "thread_id": thread_id,
+            "user_id": user_id,
+            "follow_up": follow_up,
+            "final_message": final_reply(final_state),
+            "error": final_state.get("error"),
+            "termination": final_state.get("termination"),
+            "execution": (final_state.get("execution") or {}).get("status"),
+            "latency_s": time.perf_counter() - start,
+        }
+
+    def _touch_thread(self, thread_id: str):
+        """Marks thread_id as just used and drops the least recently used in-memory threads."""
+        from langgraph.checkpoint.memory import InMemorySaver
+        checkpointer = self.app.checkpointer
+        if not isinstance(checkpointer, InMemorySaver):
+            return
+        with self._lock:
+            self._threads[thread_id] = None
+            self._threads.move_to_end(thread_id)
+            evicted = []
+            while len(self._threads) > self.max_threads:
+                evicted.append(self._threads.popitem(last=False)[0])
+        for stale_thread in evicted:
+            checkpointer.delete_thread(stale_thread)
+            logger.debug("Evicted thread %s from the in-memory checkpointer", stale_thread)
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """JSON-over-HTTP front end of an AgentService (set as server.service)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: HTTPStatus, body, content_type: str = "application/json"):
+        payload = (json.dumps(body, default=str) if content_type == "application/json" else body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        metrics.inc("http_requests_total", method=self.command, path=self._route, status=int(status))
+
+    def _read_json(self) -> Tuple[Optional[dict], Optional[str]]:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body cannot be delimited, so the connection cannot be reused either
+            self.close_connection = True
+            return None, "Invalid Content-Length header"
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            return None, f"Invalid JSON body: {e}"
+        if not isinstance(body, dict):
+            return None, "Body must be a JSON object"
+        return body, None
+
+    def do_GET(self):
+        service = self.server.service
+        match = SESSION_PATH_PATTERN.match(self.path)
+        if self.path == "/health":
+            self._route = "/health"
+            self._send(HTTPStatus.OK, {
+                "status": "ok",
+                "active_sessions": service.active_sessions,
+                "max_sessions": service.max_sessions,
+                "uptime_s": time.time() - service.started,
+            })
+        elif self.path == "/metrics":
+            self._route = "/metrics"
+            self._send(HTTPStatus.OK, metrics.to_prometheus(), "text/plain; version=0.0.4")
+        elif match:
+            self._route = "/sessions/{thread_id}"
+            state = service.thread_state(match.group(1))
+            if state is None:
+                self._send(HTTPStatus.NOT_FOUND, {"error": "Unknown thread"})
+                return
+            self._send(HTTPStatus.OK, {
+                "thread_id": match.group(1),
+                "messages": [{"type": m.type, "content": m.content} for m in state.get("messages", [])],
+                "user_info": state.get("user_info", {}),
+                "summary": state.get("summary", ""),
+                "error": state.get("error"),
+            })
+        else:
+            self._route = "other"
+            self._send(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/sessions":
+            self._route = "other"
+            self._send(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        self._route = "/sessions"
+        start = time.perf_counter()
+        body, problem = self._read_json()
+        message = (body or {}).get("message")
+        if problem or not isinstance(message, str) or not message.strip():
+            self._send(HTTPStatus.BAD_REQUEST, {"error": problem or "'message' must be a non-empty string"})
+            return
+        thread_id = body.get("thread_id")
+        if thread_id is not None and not (isinstance(thread_id, str) and re.fullmatch(THREAD_ID_PATTERN, thread_id)):
+            self._send(HTTPStatus.BAD_REQUEST, {"error": "'thread_id' may only contain letters, digits, '_', '.' and '-'"})
+            return
+        try:
+            result = self.server.service.run(message, thread_id, body.get("user_id"),
+                                             no_cache=bool(body.get("no_cache")))
+        except ServiceBusy as e:
+            self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.exception("Session failed")
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(HTTPStatus.OK, result)
+        metrics.observe("http_session_seconds", time.perf_counter() - start)
+
+def create_server(service: Optional[AgentService] = None, host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                  batch_window_ms: float = SERVICE_BATCH_WINDOW_MS,
+                  batch_max: int = EXTRACTION_BATCH_MAX) -> ThreadingHTTPServer:
+    """Builds (but does not start) the HTTP server; port 0 picks a free port."""
+    enable_extraction_batching(batch_window_ms, batch_max)
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = service or AgentService()
+    return server
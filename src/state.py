@@ -1,7 +1,77 @@
-from typing import TypedDict, Annotated, List, Union
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import uuid
+from typing import TypedDict, Annotated, List, Optional, Union
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+def merge_message_log(left: list, right) -> list:
+    """Reducer for the message log: appends updates, applying RemoveMessage ops if present.
+
+    - Plain messages are appended in a single list concatenation.
+    - RemoveMessage(id=<message id>) drops that message from the log.
+    - RemoveMessage(id=REMOVE_ALL_MESSAGES) discards everything before it, so
+      [RemoveMessage(id=REMOVE_ALL_MESSAGES), *new_messages] replaces the log.
+
+    The existing list is never mutated: LangGraph shares channel values between
+    the live state, conditional-edge reads and checkpoints, so an in-place
+    append would be applied more than once. Summary compaction keeps the log
+    bounded, which keeps the copy cheap.
+    """
+    if not isinstance(right, list):
+        right = [right]
+    # Give every message an id so it can be targeted by a later RemoveMessage
+    for message in right:
+        if message.id is None:
+            message.id = str(uuid.uuid4())
+
+    if not any(isinstance(m, RemoveMessage) for m in right):
+        return left + right
+
+    # Slow path: the update contains trim/replace operations
+    merged = list(left)
+    for message in right:
+        if not isinstance(message, RemoveMessage):
+            merged.append(message)
+        elif message.id == REMOVE_ALL_MESSAGES:
+            merged = []
+        else:
+            merged = [m for m in merged if m.id != message.id]
+    return merged
+
+# Fingerprints of worker outputs kept per session for loop detection
+MAX_FINGERPRINTS = 64
+
+def merge_budget(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Reducer for the per-session budget (see routing.guard_reason).
+
+    Agent turns send increments: {"hops": {agent: 1}, "tokens": n, "fingerprints":
+    [[agent, hash]], "repeated": agent or None, "last_agent": agent}. Hops and tokens
+    are summed, fingerprints appended (newest MAX_FINGERPRINTS kept) and the other
+    keys overwritten. An update carrying "started_at" starts a fresh budget, which is
+    how create_initial_state resets it for every new turn of a thread.
+    """
+    if right is None:
+        return left or {}
+    if left is None or "started_at" in right:
+        return dict(right)
+    hops = dict(left.get("hops", {}))
+    for agent, count in right.get("hops", {}).items():
+        hops[agent] = hops.get(agent, 0) + count
+    merged = {**left, "hops": hops, "tokens": left.get("tokens", 0) + right.get("tokens", 0)}
+    if right.get("fingerprints"):
+        merged["fingerprints"] = (left.get("fingerprints", []) + right["fingerprints"])[-MAX_FINGERPRINTS:]
+    for key in ("repeated", "last_agent"):
+        if key in right:
+            merged[key] = right[key]
+    return merged
 
 class AgentState(TypedDict):
-    messages: Annotated[List[Union[HumanMessage, AIMessage, SystemMessage]], lambda x, y: x + y]
-    user_info: dict
-    # Add other state variables here as needed, e.g., task_status 
\ No newline at end of file
+    messages: Annotated[List[Union[HumanMessage, AIMessage, SystemMessage]], merge_message_log]
+    user_id: str # Whose facts the memory store reads and writes (config.DEFAULT_USER_ID if unset)
+    user_info: dict # Facts known about the user, loaded from and kept in src/memory_store.py
+    summary: str # Running summary of messages folded out of the log by summary_node
+    execution: Optional[dict] # Report of the last sandboxed run of Developer code (see src/sandbox.py)
+    budget: Annotated[dict, merge_budget] # Hops, tokens and output fingerprints of the current turn
+    termination: Optional[dict] # Why the turn was stopped early by the loop/budget guard, if it was
+    speculation: Optional[dict] # {"id", "role"} of a worker run started ahead of routing (see graph/speculation.py)
+    error: Optional[dict] # Set when a node could not finish (e.g. the LLM stayed unavailable); ends the run
+    # Add other state variables here as needed, e.g., task_status
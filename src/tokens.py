@@ -0,0 +1,20 @@
+# --- Token Estimation Helpers ---
+# A cheap local estimate (no tokenizer dependency) used for budgeting decisions.
+
+CHARS_PER_TOKEN = 4
+# Approximate per-message overhead for role/formatting tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the token count of a string (~4 characters per token)."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def count_message_tokens(messages) -> int:
+    """Estimates the total token count of a list of messages."""
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    return total
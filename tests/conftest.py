@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Add base directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Tests run offline against the scripted backend, without sandboxed code runs or rate
+# limits; src.config reads these at import time, so they are set before any test imports it
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("CODE_EXECUTION", "off")
+os.environ.setdefault("FAKE_LLM_SEED", "7")
@@ -0,0 +1,48 @@
+from langgraph.checkpoint.memory import InMemorySaver
+from src.graph.builder import build_graph
+from src.graph.checkpoints import list_checkpoints, thread_config
+from src.graph.session import create_initial_state, run_session, DEFAULT_RUN_CONFIG
+from src.service import AgentService
+
+KEEP_LAST = 10
+
+def test_threads_keep_only_their_newest_checkpoints(monkeypatch):
+    """Every session prunes its thread, so checkpoints and stored channel values stop growing."""
+    monkeypatch.setattr("src.graph.session.CHECKPOINT_KEEP_LAST", KEEP_LAST)
+    saver = InMemorySaver()
+    app = build_graph(checkpointer=saver)
+    config = thread_config("pruned", base_config=DEFAULT_RUN_CONFIG)
+    blob_counts = []
+    for turn in range(12):
+        state = run_session(create_initial_state(f"Turn {turn}: add feature {turn}."), config, app=app)
+        assert state.get("error") is None
+        assert len(list_checkpoints(app, "pruned")) <= KEEP_LAST
+        blob_counts.append(len(saver.blobs))
+
+    # The thread still resumes from its latest checkpoint
+    assert app.get_state(config).values["messages"] == state["messages"]
+    assert max(blob_counts[6:]) <= 1.5 * max(blob_counts[:6])
+
+def test_service_evicts_least_recently_used_threads():
+    service = AgentService(app=build_graph(checkpointer=InMemorySaver()), max_threads=2)
+    for thread_id in ("a", "b", "a", "c"):
+        service.run("Write a function that adds two numbers.", thread_id)
+
+    assert service.thread_state("b") is None
+    assert service.thread_state("a") is not None and service.thread_state("c") is not None
+
+def test_runs_without_a_thread_id_get_a_new_thread_on_a_checkpointed_app():
+    app = build_graph(checkpointer=InMemorySaver())
+    first = run_session(create_initial_state("Write a function that adds two numbers."), DEFAULT_RUN_CONFIG, app=app)
+    second = run_session(create_initial_state("Write a function that adds two numbers."), DEFAULT_RUN_CONFIG, app=app)
+
+    assert first.get("error") is None and second.get("error") is None
+    # Separate threads: the second run does not continue the first one's history
+    assert len(second["messages"]) == len(first["messages"])
+
+def test_async_app_warns_that_it_is_not_checkpointed(tmp_path, caplog):
+    from src.graph.builder import get_app
+    app = get_app({"async": True, "checkpoint_db_path": str(tmp_path / "checkpoints.sqlite")})
+
+    assert app.checkpointer is None
+    assert "not checkpointed" in caplog.text
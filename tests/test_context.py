@@ -0,0 +1,61 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from src.agents.context import fit_prompt_inputs, role_budget, trim_messages, OMISSION_NOTE_TOKENS
+from src.tokens import count_message_tokens
+
+FILLER = "This paragraph discusses design trade-offs at some length without any code. " * 20
+CODE = "```python\ndef add(a, b):\n    return a + b\n```"
+
+def _session():
+    return [
+        SystemMessage(content="Summary of the conversation so far: the user wants an add function."),
+        HumanMessage(content="Please write add(a, b)."),
+        AIMessage(content=f"[Architect] Design notes. {FILLER}"),
+        AIMessage(content=f"[Developer] First version, explained at length. {FILLER}\n{CODE}"),
+        AIMessage(content=f"[Tester] Review. {FILLER}"),
+        AIMessage(content='{"next_agent": "Developer", "instruction": "Handle floats too."}'),
+        AIMessage(content=f"[Architect] More thoughts. {FILLER}"),
+    ]
+
+def test_messages_within_budget_are_untouched():
+    messages = _session()
+    assert trim_messages(messages, count_message_tokens(messages)) == (messages, 0, 0)
+
+def test_trimmed_prompt_stays_within_budget_and_keeps_pinned_messages():
+    messages = _session()
+    budget = count_message_tokens(messages[:2] + [messages[5]]) + OMISSION_NOTE_TOKENS + 250
+    result, dropped, compacted = trim_messages(messages, budget)
+
+    assert count_message_tokens(result) <= budget
+    assert dropped > 0
+    contents = [m.content for m in result]
+    # Summary, latest user message and latest PM instruction survive, in their original order
+    assert contents[0] == messages[0].content
+    assert messages[1].content in contents and messages[5].content in contents
+    assert contents.index(messages[1].content) < contents.index(messages[5].content)
+
+def test_code_blocks_are_kept_before_prose():
+    messages = _session()
+    budget = count_message_tokens(messages[:2] + [messages[5]]) + OMISSION_NOTE_TOKENS + 60
+    result, dropped, compacted = trim_messages(messages, budget)
+
+    # The Developer's long message only fits as its code, and it wins over the newer prose
+    assert compacted == 1
+    assert any(m.content == CODE for m in result)
+    assert not any("More thoughts" in m.content for m in result)
+
+def test_omission_note_follows_the_leading_system_messages():
+    messages = _session()
+    result, dropped, _ = trim_messages(messages, count_message_tokens(messages) // 2)
+
+    assert dropped > 0
+    assert result[0].content == messages[0].content
+    assert result[1].type == "system" and result[1].content == f"[{dropped} earlier messages omitted to fit the context budget]"
+
+def test_fit_prompt_inputs_respects_the_role_budget():
+    messages = _session() * 20
+    system_prompt = "You are the software developer."
+    fitted = fit_prompt_inputs({"messages": messages, "task": "x"}, "Developer", system_prompt)
+
+    assert fitted["task"] == "x"
+    assert count_message_tokens(fitted["messages"]) < role_budget("Developer")
+    assert len(fitted["messages"]) < len(messages)
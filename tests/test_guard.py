@@ -0,0 +1,88 @@
+import time
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from src.graph import routing
+from src.graph.nodes import best_result, termination_node
+from src.graph.routing import fingerprint, guard_reason, record_agent_turn
+from src.state import merge_budget
+
+DEVELOPER_OUTPUT = (
+    "[Developer] Here is the implementation of the add function. It validates that both arguments are numbers, "
+    "raising a TypeError otherwise, and returns their sum. I also added a docstring describing the parameters and "
+    "the return value, plus unit tests covering integers, floats, negative numbers and the error path for strings. "
+    "The tests use pytest and can be run with python -m pytest. Let me know if the Tester finds any issue.\n"
+    "```python\ndef add(a, b):\n    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):\n"
+    "        raise TypeError('numbers only')\n    return a + b\n```"
+)
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(routing, "MAX_AGENT_HOPS", 3)
+    monkeypatch.setattr(routing, "MAX_SESSION_HOPS", 6)
+    monkeypatch.setattr(routing, "SESSION_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(routing, "SESSION_TIME_BUDGET_SECONDS", 60)
+
+def _budget(**values) -> dict:
+    return {"budget": {"started_at": time.time(), "hops": {}, "tokens": 0, **values}}
+
+def test_fresh_budget_passes(limits):
+    assert guard_reason(_budget(hops={"Developer": 2}, tokens=999), "Developer") is None
+
+@pytest.mark.parametrize("state, next_agent, reason", [
+    (_budget(hops={"Developer": 3}), "Developer", "agent_hop_limit"),
+    (_budget(hops={"Architect": 2, "Developer": 2, "Tester": 2}), None, "session_hop_limit"),
+    (_budget(tokens=1000), None, "token_budget"),
+    ({"budget": {"started_at": time.time() - 61, "hops": {}, "tokens": 0}}, None, "time_budget"),
+    (_budget(repeated="Tester"), None, "repeated_output"),
+])
+def test_each_budget_trips(limits, state, next_agent, reason):
+    assert guard_reason(state, next_agent)["reason"] == reason
+
+def test_agent_hop_limit_only_applies_to_the_next_agent(limits):
+    assert guard_reason(_budget(hops={"Developer": 3}), "Tester") is None
+
+def test_simhash_flags_near_identical_outputs_only():
+    # Same words with other casing and punctuation, plus a closing remark
+    near_copy = DEVELOPER_OUTPUT.upper().replace("pytest and", "pytest, and") + " Thanks!"
+    distinct = "[Developer] Rewrote the parser as a state machine and added streaming support for large inputs."
+
+    assert bin(fingerprint(DEVELOPER_OUTPUT) ^ fingerprint(near_copy)).count("1") <= routing.LOOP_SIMILARITY_BITS
+    assert bin(fingerprint(DEVELOPER_OUTPUT) ^ fingerprint(distinct)).count("1") > routing.LOOP_SIMILARITY_BITS
+
+    first = record_agent_turn({"budget": {}}, "Developer", AIMessage(content=DEVELOPER_OUTPUT), 100)
+    state = {"budget": merge_budget({"started_at": time.time()}, first)}
+    assert first["repeated"] is None
+    assert record_agent_turn(state, "Developer", AIMessage(content=near_copy), 100)["repeated"] == "Developer"
+    assert record_agent_turn(state, "Developer", AIMessage(content=distinct), 100)["repeated"] is None
+    # Outputs are only compared with the same role's earlier outputs
+    assert record_agent_turn(state, "Tester", AIMessage(content=near_copy), 100)["repeated"] is None
+
+def _session_messages():
+    return [
+        HumanMessage(content="Write add(a, b)."),
+        AIMessage(content='{"next_agent": "Developer", "instruction": "Implement add."}'),
+        AIMessage(content="[Developer] First try:\n```python\ndef add(a, b):\n    return a + b\n```"),
+        AIMessage(content="[CodeExecutor] Execution PASSED: 1 passed, 0 failed (0.10 s)."),
+        AIMessage(content="[Developer] Second try:\n```python\ndef add(a, b):\n    return a - b\n```"),
+        AIMessage(content="[CodeExecutor] Execution FAILED: 0 passed, 1 failed (0.10 s)."),
+        AIMessage(content="[Tester] The latest version is wrong."),
+        AIMessage(content='{"next_agent": "Developer", "instruction": "Fix it."}'),
+    ]
+
+def test_best_result_prefers_the_latest_passed_code():
+    assert best_result(_session_messages()).content.startswith("[Developer] First try")
+
+def test_best_result_without_passed_code_takes_the_latest_code():
+    messages = [m for m in _session_messages() if "PASSED" not in m.content]
+    assert best_result(messages).content.startswith("[Developer] Second try")
+
+def test_termination_node_ends_with_the_passed_code(limits):
+    state = {**_budget(hops={"Developer": 3, "ProjectManager": 2}, tokens=500, last_agent="ProjectManager"),
+             "messages": _session_messages()}
+    update = termination_node(state)
+
+    assert update["termination"]["reason"] == "agent_hop_limit"
+    assert update["termination"]["hops"] == {"Developer": 3, "ProjectManager": 2}
+    content = update["messages"][0].content
+    assert content.startswith("[Stopped early: Developer already took 3 turns")
+    assert "First try" in content and "Second try" not in content
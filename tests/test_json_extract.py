@@ -0,0 +1,49 @@
+import pytest
+from src.graph.nodes import EXTRACTION_SCHEMA, _apply_extraction
+from src.graph.routing import PM_DECISION_SCHEMA
+from src.json_extract import extract_json
+from src.memory_store import get_memory_store
+from src.sandbox import TEST_RESULTS_SCHEMA
+
+@pytest.mark.parametrize("text", [
+    '```json\n{"name": "Sam", "city": "Oslo"}\n```',
+    '```\n{"name": "Sam", "city": "Oslo"}\n```',
+    'Here is what I found:\n```json\n{"name": "Sam", "city": "Oslo"}\n```\nLet me know if you need more.',
+    'Sure! The user {as far as I can tell} is {"name": "Sam", "city": "Oslo"} based on the message.',
+    '{\n  "name": "Sam",\n  "city": "Oslo"\n}',
+])
+def test_fenced_and_prose_wrapped_output(text):
+    assert extract_json(text, EXTRACTION_SCHEMA) == {"name": "Sam", "city": "Oslo"}
+
+def test_pm_decision_after_prose():
+    text = 'I will route this next. {"next_agent": "Developer", "instruction": "Implement add(a, b)."}'
+    assert extract_json(text, PM_DECISION_SCHEMA) == {"next_agent": "Developer", "instruction": "Implement add(a, b)."}
+
+@pytest.mark.parametrize("text, schema, expected", [
+    # The cut-off string is dropped with its member, never closed
+    ('{"name":"Sam","location":"San Fr', EXTRACTION_SCHEMA, {"name": "Sam"}),
+    ('[{"status":"pas', None, []),
+    ('[{"name":"a","status":"passed"},{"name":"b","status":"pas', TEST_RESULTS_SCHEMA, [{"name": "a", "status": "passed"}]),
+    ('```json\n{"name": "Sam", "languages": ["Python", "Ru', EXTRACTION_SCHEMA, {"name": "Sam"}),
+    ('{"name": "Sam", "age": 4', EXTRACTION_SCHEMA, {"name": "Sam"}),
+    ('{"name": "Sam", "tags": ["a", "b"]', EXTRACTION_SCHEMA, {"name": "Sam", "tags": ["a", "b"]}),
+    ('{"a": "x", "b": "y, z', None, {"a": "x"}),
+])
+def test_truncated_output_keeps_only_complete_members(text, schema, expected):
+    assert extract_json(text, schema) == expected
+
+def test_truncated_output_without_repair():
+    assert extract_json('{"name":"Sam","location":"San Fr', EXTRACTION_SCHEMA, repair=False) is None
+    assert extract_json('Done: {"name": "Sam"} ok', EXTRACTION_SCHEMA, repair=False) == {"name": "Sam"}
+
+def test_cut_off_extraction_leaves_sentences_unseen():
+    store, user_id = get_memory_store(), "truncated-extraction"
+    sentences = ["I am Sam and I live in San Francisco."]
+
+    assert _apply_extraction('{"name": "Sam", "location": "San Fr', user_id, sentences) == {}
+    assert store.profile(user_id) == {}
+    assert store.unseen_sentences(user_id, sentences) == sentences
+
+    _apply_extraction('{"name": "Sam", "location": "San Francisco"}', user_id, sentences)
+    assert store.unseen_sentences(user_id, sentences) == []
+    assert store.profile(user_id)
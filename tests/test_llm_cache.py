@@ -0,0 +1,85 @@
+import pytest
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+from src import llm_cache
+from src.llm_cache import LLMResponseCache, bypass_cache
+
+LLM_STRING = "fake-model temperature=0"
+
+def _prompt(question: str = "What is 2 + 3?", request_id: str = "req-1") -> str:
+    # Earlier AI turns carry provider metadata that differs per call
+    return dumps([HumanMessage(content="Hi"), AIMessage(content="Hello!", response_metadata={"request_id": request_id}),
+                  HumanMessage(content=question)])
+
+def _answer(text: str = "5") -> list:
+    return [ChatGeneration(message=AIMessage(content=text), generation_info={"finish_reason": "stop"})]
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+def test_keys_ignore_provider_metadata_but_not_content_or_settings():
+    key = LLMResponseCache.make_key(_prompt(request_id="req-1"), LLM_STRING)
+
+    assert LLMResponseCache.make_key(_prompt(request_id="req-2"), LLM_STRING) == key
+    assert LLMResponseCache.make_key(_prompt("What is 2 + 4?"), LLM_STRING) != key
+    assert LLMResponseCache.make_key(_prompt(), "fake-model temperature=1") != key
+
+def test_hit_after_update():
+    cache = LLMResponseCache()
+    assert cache.lookup(_prompt(), LLM_STRING) is None
+    cache.update(_prompt(), LLM_STRING, _answer())
+
+    assert cache.lookup(_prompt(request_id="req-9"), LLM_STRING)[0].message.content == "5"
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_entries_expire_after_the_ttl(clock, tmp_path):
+    cache = LLMResponseCache(sqlite_path=str(tmp_path / "cache.sqlite"), ttl_seconds=60)
+    cache.update(_prompt(), LLM_STRING, _answer())
+    clock[0] += 59
+    assert cache.lookup(_prompt(), LLM_STRING) is not None
+
+    clock[0] += 2
+    assert cache.lookup(_prompt(), LLM_STRING) is None
+    # The expired row is gone from the disk tier as well
+    assert LLMResponseCache(sqlite_path=str(tmp_path / "cache.sqlite"), ttl_seconds=None).lookup(_prompt(), LLM_STRING) is None
+
+def test_memory_tier_evicts_the_least_recently_used_entry():
+    cache = LLMResponseCache(max_memory_entries=2)
+    for question in ("a", "b"):
+        cache.update(_prompt(question), LLM_STRING, _answer(question))
+    cache.lookup(_prompt("a"), LLM_STRING) # "b" is now the least recently used
+    cache.update(_prompt("c"), LLM_STRING, _answer("c"))
+
+    assert cache.lookup(_prompt("b"), LLM_STRING) is None
+    assert cache.lookup(_prompt("a"), LLM_STRING) is not None and cache.lookup(_prompt("c"), LLM_STRING) is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_sqlite_round_trip_and_disk_limit(clock, tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = LLMResponseCache(sqlite_path=path, max_disk_entries=2)
+    for question in ("a", "b", "c"):
+        clock[0] += 1
+        writer.update(_prompt(question), LLM_STRING, _answer(f"answer {question}"))
+
+    reader = LLMResponseCache(sqlite_path=path)
+    value = reader.lookup(_prompt("c"), LLM_STRING)
+    assert value[0].message.content == "answer c" and value[0].generation_info == {"finish_reason": "stop"}
+    assert reader.stats()["disk_hits"] == 1
+    # The oldest row was evicted; the hit was promoted to the memory tier
+    assert reader.lookup(_prompt("a"), LLM_STRING) is None
+    assert reader.lookup(_prompt("c"), LLM_STRING) is not None and reader.stats()["memory_hits"] == 1
+
+def test_bypass_cache_skips_lookups_and_writes_inside_the_block_only():
+    cache = LLMResponseCache()
+    cache.update(_prompt("a"), LLM_STRING, _answer("a"))
+    with bypass_cache():
+        assert cache.lookup(_prompt("a"), LLM_STRING) is None
+        cache.update(_prompt("b"), LLM_STRING, _answer("b"))
+
+    assert cache.stats()["bypassed"] == 1
+    assert cache.lookup(_prompt("a"), LLM_STRING) is not None
+    assert cache.lookup(_prompt("b"), LLM_STRING) is None
@@ -0,0 +1,24 @@
+from src import memory_store
+from src.memory_store import MemoryStore
+
+def test_evicted_fact_can_be_extracted_again(monkeypatch):
+    monkeypatch.setattr(memory_store, "USER_MEMORY_MAX_FACTS", 2)
+    store, user_id = MemoryStore(), "sam"
+    sentence = "I live in Oslo."
+    store.mark_seen(user_id, [sentence])
+    store.merge(user_id, {"location": "Oslo"})
+    assert store.unseen_sentences(user_id, [sentence]) == []
+
+    store.merge(user_id, {"name": "Sam"})
+    profile, _ = store.merge(user_id, {"occupation": "Engineer"})
+
+    assert "location" not in profile
+    # Restating the evicted fact goes back to the extractor instead of being skipped as seen
+    assert store.unseen_sentences(user_id, [sentence]) == [sentence]
+
+def test_seen_sentences_are_kept_without_evictions():
+    store, user_id = MemoryStore(), "sam"
+    store.mark_seen(user_id, ["I live in Oslo."])
+    store.merge(user_id, {"location": "Oslo", "name": "Sam"})
+
+    assert store.unseen_sentences(user_id, ["i live in oslo", "I am Sam."]) == ["I am Sam."]
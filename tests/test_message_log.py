@@ -0,0 +1,36 @@
+from langgraph.checkpoint.memory import InMemorySaver
+from src.config import SUMMARY_TOKEN_THRESHOLD
+from src.agents.context import trim_log
+from src.graph.builder import build_graph
+from src.graph.checkpoints import thread_config
+from src.graph.session import create_initial_state, run_session, DEFAULT_RUN_CONFIG
+from src.tokens import count_message_tokens, estimate_tokens
+
+TURNS = 200
+MAX_MESSAGES = 64
+# A turn adds well under this many tokens on top of the summary threshold
+MAX_PROMPT_TOKENS = SUMMARY_TOKEN_THRESHOLD + 1500
+
+def test_message_log_and_prompts_stay_bounded_over_many_turns():
+    """Summary compaction keeps one thread's log and prompts bounded, however many turns it has."""
+    app = build_graph(checkpointer=InMemorySaver())
+    config = thread_config("bounded-log", base_config=DEFAULT_RUN_CONFIG)
+    message_counts, log_tokens, prompt_tokens = [], [], []
+    for turn in range(TURNS):
+        trim_log.clear()
+        state = run_session(create_initial_state(f"Turn {turn}: now also add feature {turn}."), config, app=app)
+        assert state.get("error") is None and state.get("termination") is None
+        message_counts.append(len(state["messages"]))
+        log_tokens.append(count_message_tokens(state["messages"]) + estimate_tokens(state.get("summary") or ""))
+        # Prompt size of every agent call this turn, before any per-role trimming
+        prompt_tokens.append(max(entry["before"] for entry in trim_log))
+
+    assert state.get("summary"), "the log was never compacted"
+    assert max(message_counts) <= MAX_MESSAGES
+    assert max(log_tokens) <= MAX_PROMPT_TOKENS
+    assert max(prompt_tokens) <= MAX_PROMPT_TOKENS
+    # No growth trend: the second half of the session is no larger than the first
+    # (prompt sizes within 5%, as the scripted outputs vary in length)
+    half = TURNS // 2
+    assert max(message_counts[half:]) <= max(message_counts[:half])
+    assert max(prompt_tokens[half:]) <= 1.05 * max(prompt_tokens[:half])
@@ -0,0 +1,67 @@
+import asyncio
+import contextlib
+import pytest
+from src import llm_config
+from src.fake_llm import ScriptedChatModel
+from src.graph import session
+from src.graph.builder import build_graph
+from src.graph.session import create_initial_state, run_session, DEFAULT_RUN_CONFIG
+from src.llm_cache import bypass_cache
+from src.rate_limit import ModelLimiter, RetryPolicy, attach_limits, retry_budget, with_rate_limits
+
+SESSION_RETRIES = 6
+
+def _failing_model(name: str, error_rate: float):
+    # Per-call retries outlast the session budget, so the budget is what runs out
+    model = with_rate_limits(ScriptedChatModel)(model_name=name, seed=3, error_rate=error_rate)
+    return attach_limits(model, ModelLimiter(name), RetryPolicy(max_retries=2 * SESSION_RETRIES, base_delay=0.0))
+
+@pytest.fixture
+def session_budgets(monkeypatch):
+    """Runs sessions on fakes that inject 429s and records each session's retry budget."""
+    budgets = []
+
+    @contextlib.contextmanager
+    def recording_budget(retries):
+        with retry_budget(retries) as budget:
+            budgets.append(budget)
+            yield budget
+
+    monkeypatch.setattr(session, "LLM_SESSION_RETRY_BUDGET", SESSION_RETRIES)
+    monkeypatch.setattr(session, "retry_budget", recording_budget)
+    monkeypatch.setattr(llm_config, "_models", {})
+    return budgets
+
+def _run(error_rate: float) -> dict:
+    llm_config.set_models(_failing_model("fake-main", error_rate), _failing_model("fake-utility", error_rate))
+    with bypass_cache():
+        return run_session(create_initial_state("Write a function that adds two numbers."),
+                           dict(DEFAULT_RUN_CONFIG), app=build_graph())
+
+def test_injected_429s_are_retried_within_the_session_budget(session_budgets):
+    state = _run(error_rate=0.2)
+
+    budget, = session_budgets
+    assert state.get("error") is None
+    assert 0 < budget.used <= SESSION_RETRIES
+
+def test_session_ends_in_the_error_state_once_the_budget_is_spent(session_budgets):
+    state = _run(error_rate=1.0)
+
+    budget, = session_budgets
+    assert budget.used == SESSION_RETRIES and budget.remaining == 0
+    assert state["error"]["type"] == "llm_unavailable"
+    assert "session retry budget exhausted" in state["error"]["message"]
+
+def test_cancelled_bucket_wait_releases_the_slot():
+    limiter = ModelLimiter("fake", rpm=1, max_concurrency=1)
+
+    async def scenario():
+        await limiter.aacquire(0)
+        limiter.release(0, None)
+        # The bucket is now empty: the next call waits about a minute for it, until cancelled
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.aacquire(0), timeout=0.05)
+
+    asyncio.run(scenario())
+    assert limiter._slots.acquire(blocking=False)
@@ -0,0 +1,49 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END
+from src.graph.routing import parse_pm_decision, route_from_project_manager, routing_stats, _fallback_route
+
+def _pm_state(content: str) -> dict:
+    return {"messages": [HumanMessage(content="Add two numbers."), AIMessage(content=content)],
+            "budget": {"hops": {"ProjectManager": 1}, "tokens": 0}}
+
+def test_valid_json_decision():
+    decision = parse_pm_decision('{"next_agent": "Developer", "instruction": "Implement add(a, b)."}')
+
+    assert decision == {"next_agent": "developer", "instruction": "Implement add(a, b).", "plan": []}
+
+@pytest.mark.parametrize("content", [
+    '```json\n{"next_agent": "Tester", "instruction": "Test add."}\n```',
+    'Next, the tester should check it:\n{"next_agent": "Tester", "instruction": "Test add."}\nThanks!',
+    '```\n{"next_agent": " TESTER ", "instruction": "Test add."}\n```',
+])
+def test_fenced_or_prose_wrapped_decision(content):
+    decision = parse_pm_decision(content)
+
+    assert decision["next_agent"] == "tester" and decision["instruction"] == "Test add."
+
+@pytest.mark.parametrize("content", [
+    '{"next_agent": "Designer", "instruction": "Draw it."}',
+    '{"next_agent": ["Developer"], "instruction": "Implement it."}',
+    '{"instruction": "Implement it."}',
+    "The developer should implement it next.",
+])
+def test_schema_violations_are_not_decisions(content):
+    assert parse_pm_decision(content) is None
+
+def test_fallback_picks_the_earliest_role_mention():
+    content = "The Tester found a bug, so the Developer must fix it before the Architect reviews."
+
+    assert _fallback_route(content) == "Tester"
+    before = routing_stats["misparse"]
+    assert route_from_project_manager(_pm_state(content)) == "Tester"
+    assert routing_stats["misparse"] == before + 1
+
+@pytest.mark.parametrize("content", ["All done, nothing left to do.", "The task is complete.", "We can finish here."])
+def test_finish_keywords_map_to_end(content):
+    assert _fallback_route(content) == END
+    assert route_from_project_manager(_pm_state(content)) == END
+
+def test_structured_finish_and_unroutable_text_end_the_run():
+    assert route_from_project_manager(_pm_state('{"next_agent": "FINISH", "instruction": "Done."}')) == END
+    assert route_from_project_manager(_pm_state("Hmm, let me think about this.")) == END
@@ -0,0 +1,19 @@
+from src.sandbox import execute_code, OUTPUT_TAIL_CHARS
+
+SOLUTION = "def add(a, b):\n    return a + b\n"
+
+def test_child_output_is_kept_as_a_bounded_tail():
+    noisy = "import sys\nprint('x' * 5_000_000)\nsys.stderr.write('é' * 3000 + 'end')\n"
+    report = execute_code([noisy + SOLUTION], ["def test_add():\n    assert add(2, 3) == 5\n"])
+
+    run, = report["runs"]
+    assert report["status"] == "passed"
+    assert len(run["stdout"]) <= OUTPUT_TAIL_CHARS + 3 and run["stdout"].endswith("x\n")
+    assert len(run["stderr"]) <= OUTPUT_TAIL_CHARS + 3 and run["stderr"].endswith("éend")
+
+def test_runaway_process_group_is_killed_on_timeout():
+    sleeper = "import os, time\n\ndef test_sleep():\n    os.fork()\n    time.sleep(30)\n"
+    report = execute_code([SOLUTION], [sleeper], timeout=1)
+
+    run, = report["runs"]
+    assert run["status"] == "timeout" and run["duration_s"] < 10
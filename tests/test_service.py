@@ -0,0 +1,51 @@
+import http.client
+import json
+import threading
+import urllib.request
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from src.graph.builder import build_graph
+from src.service import AgentService
+
+def test_sessions_without_user_id_keep_facts_per_thread():
+    service = AgentService(app=build_graph(checkpointer=InMemorySaver()))
+    first = service.run("I am Sam and I live in Oslo.", "thread-a")
+    other = service.run("Write a function that adds two numbers.", "thread-b")
+    named = service.run("Write a function that adds two numbers.", "thread-c", user_id="sam")
+
+    assert (first["user_id"], other["user_id"], named["user_id"]) == ("thread-a", "thread-b", "sam")
+    assert service.thread_state("thread-b")["user_id"] == "thread-b"
+
+@pytest.fixture
+def server():
+    from src.service import create_server
+    server = create_server(AgentService(app=build_graph(checkpointer=InMemorySaver())), "127.0.0.1", 0, batch_window_ms=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _post(server, body: bytes, content_length: str):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    connection.putrequest("POST", "/sessions")
+    connection.putheader("Content-Type", "application/json")
+    connection.putheader("Content-Length", content_length)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+@pytest.mark.parametrize("content_length", ["abc", "-5"])
+def test_malformed_content_length_is_a_bad_request(server, content_length):
+    status, body = _post(server, b'{"message": "hi"}', content_length)
+    assert status == 400 and "Content-Length" in body["error"]
+
+def test_thread_ids_are_limited_to_readable_ones(server):
+    bad = json.dumps({"message": "Write a function that adds two numbers.", "thread_id": "a/b c"}).encode()
+    status, body = _post(server, bad, str(len(bad)))
+    assert status == 400 and "thread_id" in body["error"]
+
+    good = json.dumps({"message": "Write a function that adds two numbers.", "thread_id": "team.a-1"}).encode()
+    status, body = _post(server, good, str(len(good)))
+    assert status == 200 and body["thread_id"] == "team.a-1"
+    with urllib.request.urlopen(f"http://{server.server_address[0]}:{server.server_address[1]}/sessions/team.a-1") as response:
+        assert json.loads(response.read())["thread_id"] == "team.a-1"
@@ -0,0 +1,82 @@
+import threading
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from src import llm_config
+from src.agents import utils
+from src.agents.developer import developer_node
+from src.agents.project_manager import pm_prompt, pm_plan_prompt
+from src.agents.utils import speculation_update
+from src.fake_llm import ScriptedChatModel, detect_role
+from src.graph import speculation
+
+ARCHITECT_TURN = AIMessage(content="[Architect] Design: a single module exposing add(a, b).")
+
+@pytest.fixture
+def developer_calls(monkeypatch):
+    """Developer model calls as the names of the threads that made them."""
+    calls = []
+    respond = ScriptedChatModel._respond
+
+    def recording_respond(self, messages):
+        if detect_role(messages) == "developer":
+            calls.append(threading.current_thread().name)
+        return respond(self, messages)
+
+    monkeypatch.setattr(ScriptedChatModel, "_respond", recording_respond)
+    monkeypatch.setattr(utils, "SPECULATIVE_DISPATCH", True)
+    monkeypatch.setattr(utils, "SPECULATIVE_ROLES", ("Developer",))
+    monkeypatch.setattr(llm_config, "_models", {})
+    return calls
+
+def _pm(plan_miss_rate: float):
+    """The fake PM asked for its plan, as in speculative mode."""
+    model = ScriptedChatModel(model_name="fake-main", seed=7, plan_miss_rate=plan_miss_rate)
+    llm_config.set_models(model, model)
+    prompt = ChatPromptTemplate.from_messages([("system", pm_prompt + pm_plan_prompt), MessagesPlaceholder(variable_name="messages")])
+    return prompt | model
+
+def _after_architect_turn(pm) -> dict:
+    """State after the PM sent the Architect first, forecasting the Developer next."""
+    state = {"messages": [HumanMessage(content="Write add(a, b).")], "budget": {"hops": {}, "tokens": 0}}
+    decision = pm.invoke(state)
+    update = speculation_update(state, "ProjectManager", decision)
+    assert update["speculation"]["role"] == "Developer"
+    return {**state, **update, "messages": state["messages"] + [decision, ARCHITECT_TURN]}
+
+def _speculative(calls):
+    return [name for name in calls if name.startswith("speculation")]
+
+def test_followed_plan_claims_the_speculative_developer_answer(developer_calls):
+    pm = _pm(plan_miss_rate=0.0)
+    state = _after_architect_turn(pm)
+    decision = pm.invoke(state)
+    before = speculation.get_speculation_stats()
+
+    assert '"next_agent": "Developer"' in decision.content
+    assert speculation_update(state, "ProjectManager", decision) == {} # Kept for the Developer
+    update = developer_node.invoke({**state, "messages": state["messages"] + [decision]})
+
+    assert update["messages"][0].content.startswith("[Developer]")
+    assert update["speculation"] is None
+    # The only Developer call is the one started ahead of routing
+    assert len(developer_calls) == 1 and _speculative(developer_calls) == developer_calls
+    assert speculation.get_speculation_stats()["kept"] == before.get("kept", 0) + 1
+
+def test_missed_plan_discards_the_run_and_the_developer_runs_for_real(developer_calls):
+    pm = _pm(plan_miss_rate=1.0)
+    state = _after_architect_turn(pm)
+    decision = pm.invoke(state)
+    stale = state["speculation"]
+
+    # The PM asks for a revision instead: the Developer run is dropped, and the revised plan forecasts a new one
+    assert '"next_agent": "Architect"' in decision.content
+    update = speculation_update(state, "ProjectManager", decision)
+    assert update["speculation"]["id"] != stale["id"]
+    assert speculation.claim(stale["id"]) is None
+    speculation.discard(update["speculation"]["id"])
+
+    # A Developer turn that still points at the dropped run makes its own call
+    result = developer_node.invoke({**state, "messages": state["messages"] + [decision]})
+    assert result["messages"][0].content.startswith("[Developer]")
+    assert len([name for name in developer_calls if not name.startswith("speculation")]) == 1